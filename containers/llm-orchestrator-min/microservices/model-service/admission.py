@@ -0,0 +1,222 @@
+# model-service/admission.py
+# Ten sam plik jest używany w containers/llm-orchestrator/admission.py - zmiany wprowadzaj w obu miejscach.
+import heapq
+import itertools
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+try:
+    from prometheus_client import Counter, Gauge, Histogram
+except ImportError:  # metryki są opcjonalne
+    Counter = Gauge = Histogram = None
+
+INTERACTIVE = "interactive"  # komendy głosowe, czat - krótkie i pilne
+BACKGROUND = "background"    # generowanie pipeline'ów i inne zadania w tle
+PRIORITIES = {INTERACTIVE: 0, BACKGROUND: 1}
+
+if Gauge is not None:
+    QUEUE_DEPTH = Gauge("llm_admission_queue_depth", "Zapytania LLM czekające na dopuszczenie",
+                        ["service", "priority"], multiprocess_mode="livesum")
+    IN_FLIGHT = Gauge("llm_admission_in_flight", "Generowania LLM w toku",
+                      ["service", "priority"], multiprocess_mode="livesum")
+    WAIT_SECONDS = Histogram("llm_admission_wait_seconds", "Czas oczekiwania zapytania LLM na dopuszczenie",
+                             ["service", "priority"], buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30))
+    REJECTED = Counter("llm_admission_rejected_total", "Zapytania LLM odrzucone przez kontrolę dopuszczenia",
+                       ["service", "priority", "reason"])
+
+
+class AdmissionRejected(Exception):
+    """Kolejka pełna albo zbyt długie oczekiwanie - klient powinien ponowić po retry_after sekundach"""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def resolve_priority(value: Optional[str]) -> str:
+    """Klasa priorytetu z pola żądania lub nagłówka X-Priority; domyślnie interaktywna"""
+    value = (value or "").strip().lower()
+    return value if value in PRIORITIES else INTERACTIVE
+
+
+class Ticket:
+    __slots__ = ("priority", "tokens", "enqueued_at", "granted_at", "released")
+
+    def __init__(self, priority: str, tokens: int):
+        self.priority = priority
+        self.tokens = tokens
+        self.enqueued_at = time.monotonic()
+        self.granted_at: Optional[float] = None
+        self.released = False
+
+
+class _Held:
+    """Odpowiedź strumieniowa trzymająca slot do końca (lub zamknięcia przy rozłączeniu klienta)"""
+
+    def __init__(self, controller: "AdmissionController", iterable: Iterable, ticket: Ticket):
+        self.controller = controller
+        self.iterable = iterable
+        self.ticket = ticket
+
+    def __iter__(self) -> Iterator:
+        try:
+            yield from self.iterable
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        if hasattr(self.iterable, "close"):
+            self.iterable.close()
+        self.controller.release(self.ticket)
+
+
+class AdmissionController:
+    """Kontrola dopuszczenia przed generowaniem LLM: ograniczona współbieżność, kolejka i budżet tokenów.
+
+    Najwyżej max_concurrent generowań naraz, a ich łączne max tokenów nie
+    przekracza token_budget (pojedyncze zapytanie zawsze może ruszyć, gdy nic
+    nie działa). Zapytanie prosi o co najwyżej max_request_tokens tokenów -
+    więcej jest przycinane. Oczekujący są obsługiwani wg priorytetu, w klasie
+    po kolei; zapytania w tle zajmują najwyżej background_share slotów, więc
+    seria długich zadań w tle nie blokuje krótkich komend interaktywnych.
+    Pełna kolejka klasy (max_queue) lub oczekiwanie dłuższe niż queue_timeout
+    kończy się AdmissionRejected (HTTP 429 z Retry-After).
+    """
+
+    def __init__(self, name: str, max_concurrent: int = 2, max_queue: int = 32, token_budget: int = 2048,
+                 max_request_tokens: int = 512, background_share: float = 0.5, queue_timeout: float = 30.0):
+        self.name = name
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queue = max(0, max_queue)
+        self.token_budget = token_budget
+        self.max_request_tokens = max_request_tokens
+        self.queue_timeout = queue_timeout
+        reserved = 1 if self.max_concurrent > 1 else 0  # slot zawsze wolny dla zapytań interaktywnych
+        self.background_slots = max(1, min(self.max_concurrent - reserved, int(self.max_concurrent * background_share)))
+        self._cond = threading.Condition()
+        self._waiting = []  # kopiec (priorytet, kolejność, bilet)
+        self._seq = itertools.count()
+        self._running = {priority: 0 for priority in PRIORITIES}
+        self._tokens_in_flight = 0
+        self._hold_seconds = 1.0  # średnia krocząca czasu generowania, do Retry-After
+        self._stats = {"admitted": 0, "rejected_queue_full": 0, "rejected_timeout": 0, "wait_seconds": 0.0}
+
+    def clamp(self, tokens: int) -> int:
+        return max(1, min(int(tokens), self.max_request_tokens))
+
+    def acquire(self, priority: str = INTERACTIVE, tokens: int = 256) -> Ticket:
+        """Czeka na slot; zwraca bilet, który trzeba oddać przez release() (albo użyć admit()/hold())"""
+        ticket = Ticket(resolve_priority(priority), self.clamp(tokens))
+        with self._cond:
+            if self._queued(ticket.priority) >= self.max_queue and not self._can_run(ticket):
+                self._reject(ticket, "queue_full")
+            heapq.heappush(self._waiting, (PRIORITIES[ticket.priority], next(self._seq), ticket))
+            self._dispatch()
+            deadline = ticket.enqueued_at + self.queue_timeout
+            while ticket.granted_at is None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._waiting = [entry for entry in self._waiting if entry[2] is not ticket]
+                    heapq.heapify(self._waiting)
+                    self._reject(ticket, "timeout")
+                self._cond.wait(remaining)
+            waited = ticket.granted_at - ticket.enqueued_at
+            self._stats["admitted"] += 1
+            self._stats["wait_seconds"] += waited
+            self._update_gauges()
+        if Histogram is not None:
+            WAIT_SECONDS.labels(self.name, ticket.priority).observe(waited)
+        return ticket
+
+    def release(self, ticket: Ticket) -> None:
+        with self._cond:
+            if ticket.released or ticket.granted_at is None:
+                return
+            ticket.released = True
+            self._running[ticket.priority] -= 1
+            self._tokens_in_flight -= ticket.tokens
+            self._hold_seconds = 0.8 * self._hold_seconds + 0.2 * (time.monotonic() - ticket.granted_at)
+            self._dispatch()
+            self._update_gauges()
+
+    @contextmanager
+    def admit(self, priority: str = INTERACTIVE, tokens: int = 256):
+        ticket = self.acquire(priority, tokens)
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    def hold(self, iterable: Iterable, ticket: Ticket) -> _Held:
+        """Owija strumień odpowiedzi - slot jest zwalniany po jego zakończeniu"""
+        return _Held(self, iterable, ticket)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            stats = dict(self._stats)
+            queued = {priority: self._queued(priority) for priority in PRIORITIES}
+            running = dict(self._running)
+            tokens = self._tokens_in_flight
+        stats["avg_wait_seconds"] = round(stats.pop("wait_seconds") / stats["admitted"], 3) if stats["admitted"] else 0
+        stats.update(queued=queued, running=running, tokens_in_flight=tokens, max_concurrent=self.max_concurrent,
+                     background_slots=self.background_slots, max_queue=self.max_queue,
+                     token_budget=self.token_budget, max_request_tokens=self.max_request_tokens)
+        return stats
+
+    def _queued(self, priority: str) -> int:
+        return sum(1 for _, _, ticket in self._waiting if ticket.priority == priority)
+
+    def _can_run(self, ticket: Ticket) -> bool:
+        running = sum(self._running.values())
+        if running >= self.max_concurrent:
+            return False
+        if ticket.priority == BACKGROUND and self._running[BACKGROUND] >= self.background_slots:
+            return False
+        return running == 0 or self._tokens_in_flight + ticket.tokens <= self.token_budget
+
+    def _dispatch(self) -> None:
+        """Dopuszcza oczekujących w kolejności priorytetu, do pierwszego, który musi czekać"""
+        granted = False
+        while self._waiting and self._can_run(self._waiting[0][2]):
+            _, _, ticket = heapq.heappop(self._waiting)
+            ticket.granted_at = time.monotonic()
+            self._running[ticket.priority] += 1
+            self._tokens_in_flight += ticket.tokens
+            granted = True
+        if granted:
+            self._cond.notify_all()
+
+    def _reject(self, ticket: Ticket, reason: str) -> None:
+        self._stats[f"rejected_{reason}"] += 1
+        self._update_gauges()
+        if Counter is not None:
+            REJECTED.labels(self.name, ticket.priority, reason).inc()
+        retry_after = max(1, math.ceil(self._hold_seconds * (len(self._waiting) + 1) / self.max_concurrent))
+        raise AdmissionRejected(
+            "Kolejka generowania jest pełna" if reason == "queue_full" else "Przekroczono czas oczekiwania w kolejce",
+            retry_after
+        )
+
+    def _update_gauges(self) -> None:
+        if Gauge is None:
+            return
+        for priority in PRIORITIES:
+            QUEUE_DEPTH.labels(self.name, priority).set(self._queued(priority))
+            IN_FLIGHT.labels(self.name, priority).set(self._running[priority])
+
+
+def admission_from_env(name: str, max_concurrent: int = 2) -> AdmissionController:
+    """Limity z ADMISSION_*; ADMISSION_CONCURRENCY domyślnie max_concurrent"""
+    return AdmissionController(
+        name,
+        max_concurrent=int(os.getenv("ADMISSION_CONCURRENCY", str(max_concurrent))),
+        max_queue=int(os.getenv("ADMISSION_QUEUE", "32")),
+        token_budget=int(os.getenv("ADMISSION_TOKEN_BUDGET", "2048")),
+        max_request_tokens=int(os.getenv("ADMISSION_MAX_TOKENS", "512")),
+        background_share=float(os.getenv("ADMISSION_BACKGROUND_SHARE", "0.5")),
+        queue_timeout=float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "30"))
+    )
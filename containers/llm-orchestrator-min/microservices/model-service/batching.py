@@ -0,0 +1,386 @@
+# model-service/batching.py
+import json
+import queue
+import threading
+import time
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import torch
+from transformers import StoppingCriteria, StoppingCriteriaList, TextIteratorStreamer
+from transformers.generation.streamers import BaseStreamer
+
+from prefix_cache import PrefixCache, prefill
+
+try:
+    from prometheus_client import Histogram
+except ImportError:  # metryki są opcjonalne (np. llm-orchestrator-min)
+    Histogram = None
+
+if Histogram is not None:
+    TIME_TO_FIRST_TOKEN = Histogram(
+        "model_time_to_first_token_seconds", "Czas od przyjęcia zapytania do pierwszego tokenu", ["mode"],
+        buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60)
+    )
+    INTER_TOKEN_LATENCY = Histogram(
+        "model_inter_token_seconds", "Czas między kolejnymi tokenami", ["mode"],
+        buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+    )
+
+CHAT_TEMPLATE = "<human>: {prompt}\n<assistant>:"
+
+
+def chat_prompt(prompt: str) -> str:
+    """Formatowanie promptu dla modelu czatowego"""
+    return CHAT_TEMPLATE.format(prompt=prompt)
+
+
+def assistant_response(text: str) -> str:
+    """Wyodrębnienie odpowiedzi asystenta z wygenerowanego tekstu"""
+    return text.split("<assistant>:")[-1].strip()
+
+
+class GenerationRequest:
+    """Pojedyncze zapytanie czekające na miejsce w partii.
+
+    max_length obejmuje prompt (jak w API); max_new_tokens dodatkowo ogranicza
+    same nowe tokeny (budżet kontroli dopuszczenia).
+    """
+
+    def __init__(self, prompt: str, max_length: int = 256, temperature: float = 0.7, top_p: float = 0.9,
+                 max_new_tokens: Optional[int] = None):
+        self.prompt = prompt
+        self.max_length = int(max_length)
+        self.max_new_tokens = max_new_tokens
+        self.temperature = float(temperature)
+        self.top_p = float(top_p)
+        self.enqueued_at = time.monotonic()
+        self.result: Optional[str] = None
+        self.error: Optional[BaseException] = None
+        self.new_tokens = 0
+        self._done = threading.Event()
+        self._callbacks: List[Callable[[], None]] = []
+        self._callbacks_lock = threading.Lock()
+
+    @property
+    def do_sample(self) -> bool:
+        # temperature 0 oznacza dekodowanie zachłanne (HF nie przyjmuje temperature=0 przy próbkowaniu)
+        return self.temperature > 0
+
+    def sampling_key(self) -> Tuple:
+        """Zapytania z tym samym kluczem mogą iść jednym wywołaniem generate()"""
+        if not self.do_sample:
+            return (False,)
+        return (True, round(self.temperature, 3), round(self.top_p, 3))
+
+    def new_token_limit(self, prompt_tokens: int) -> int:
+        limit = max(1, self.max_length - prompt_tokens)
+        return min(limit, self.max_new_tokens) if self.max_new_tokens else limit
+
+    def add_done_callback(self, callback: Callable[[], None]) -> None:
+        """Wywołuje callback po zakończeniu generowania (od razu, jeśli już się zakończyło)"""
+        with self._callbacks_lock:
+            if not self._done.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def set_result(self, text: str, new_tokens: int) -> None:
+        self.result = text
+        self.new_tokens = new_tokens
+        self._finish()
+
+    def set_error(self, error: BaseException) -> None:
+        self.error = error
+        self._finish()
+
+    def _finish(self) -> None:
+        with self._callbacks_lock:
+            self._done.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback()
+
+    def wait(self, timeout: Optional[float] = None) -> str:
+        if not self._done.wait(timeout):
+            raise TimeoutError("Przekroczono czas oczekiwania na generowanie")
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class _StepTimes:
+    """Czasy kolejnych kroków dekodowania; pierwsze put() z generate() to prompt"""
+
+    def __init__(self):
+        self.times: List[float] = []
+        self._prompt_seen = False
+
+    def mark(self) -> None:
+        if self._prompt_seen:
+            self.times.append(time.monotonic())
+        else:
+            self._prompt_seen = True
+
+    def observe(self, mode: str, enqueued_at: Iterable[float]) -> None:
+        if Histogram is None or not self.times:
+            return
+        for start in enqueued_at:
+            TIME_TO_FIRST_TOKEN.labels(mode).observe(self.times[0] - start)
+        for prev, cur in zip(self.times, self.times[1:]):
+            INTER_TOKEN_LATENCY.labels(mode).observe(cur - prev)
+
+
+class _BatchTimer(BaseStreamer):
+    """Streamer generate() zbierający tylko czasy kroków partii"""
+
+    def __init__(self):
+        self.steps = _StepTimes()
+
+    def put(self, value) -> None:
+        self.steps.mark()
+
+    def end(self) -> None:
+        pass
+
+
+class _TimedTextStreamer(TextIteratorStreamer):
+    def __init__(self, tokenizer, timeout: Optional[float] = None):
+        super().__init__(tokenizer, skip_prompt=True, timeout=timeout, skip_special_tokens=True)
+        self.steps = _StepTimes()
+
+    def put(self, value) -> None:
+        self.steps.mark()
+        super().put(value)
+
+
+class _Cancelled(StoppingCriteria):
+    """Przerywa generate() po anulowaniu zapytania (np. klient się rozłączył)"""
+
+    def __init__(self, event: threading.Event):
+        self.event = event
+
+    def __call__(self, input_ids, scores, **kwargs):
+        return torch.full((input_ids.shape[0],), self.event.is_set(), dtype=torch.bool)
+
+
+class StreamRequest(GenerationRequest):
+    """Zapytanie, którego odpowiedź jest oddawana fragmentami tekstu w miarę generowania"""
+
+    def __init__(self, tokenizer, prompt: str, max_length: int = 256, temperature: float = 0.7,
+                 top_p: float = 0.9, timeout: Optional[float] = None, max_new_tokens: Optional[int] = None):
+        super().__init__(prompt, max_length, temperature, top_p, max_new_tokens)
+        self.timeout = timeout
+        self.cancelled = threading.Event()
+        self.streamer = _TimedTextStreamer(tokenizer, timeout=timeout)
+
+    def cancel(self) -> None:
+        self.cancelled.set()
+
+    def __iter__(self) -> Iterator[str]:
+        for chunk in self.streamer:
+            if chunk:
+                yield chunk
+        # Strumień kończy się także po błędzie - wtedy wait() go zgłosi
+        self.wait(self.timeout)
+
+
+def format_sse(event: str, payload: Dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+
+def stream_events(stream: StreamRequest, on_done: Optional[Callable[[str], None]] = None) -> Iterator[str]:
+    """Zdarzenia SSE: token (fragment tekstu), na końcu done albo error"""
+    parts = []
+    try:
+        for chunk in stream:
+            parts.append(chunk)
+            yield format_sse("token", {"text": chunk})
+        response = assistant_response("".join(parts))
+        if on_done is not None:
+            on_done(response)
+        yield format_sse("done", {"response": response, "tokens": stream.new_tokens, "success": True})
+    except Exception as e:
+        yield format_sse("error", {"error": str(e), "success": False})
+    finally:
+        # Klient się rozłączył albo odpowiedź jest kompletna - nie generuj dalej
+        stream.cancel()
+
+
+def cached_events(response: str) -> Iterator[str]:
+    """Odpowiedź z cache w tym samym formacie SSE co generowanie strumieniowane"""
+    yield format_sse("token", {"text": response})
+    yield format_sse("done", {"response": response, "cached": True, "success": True})
+
+
+class BatchScheduler:
+    """Łączy współbieżne zapytania /api/generate w partie dla jednego wywołania generate().
+
+    Wątek planisty czeka na pierwsze zapytanie, potem jeszcze `batch_window`
+    sekund (lub do `max_batch_size` zapytań) i dzieli zebrane zapytania według
+    parametrów próbkowania. Każda grupa jest dopełniana z lewej (modele
+    dekoderowe) i generowana razem; wyniki wracają do wątków, które je zleciły.
+    Zapytania strumieniowane idą pojedynczo (streamer tekstu obsługuje jedną
+    sekwencję), ale nadal przez ten sam wątek - model ma jednego wywołującego.
+    Pojedyncze sekwencje biorą wspólny początek promptu z `prefix_cache`
+    (w partii dopełnianej z lewej te same początki leżą na różnych pozycjach).
+    """
+
+    def __init__(self, model, tokenizer, max_batch_size: int = 8, batch_window: float = 0.01,
+                 prefix_cache: Optional[PrefixCache] = None):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.prefix_cache = prefix_cache
+        self.max_batch_size = max(1, max_batch_size)
+        self.batch_window = batch_window
+        self._queue: "queue.Queue[GenerationRequest]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "batches": 0, "generated_tokens": 0, "generate_seconds": 0.0,
+                       "max_batch": 0}
+
+        self.tokenizer.padding_side = "left"
+        if self.tokenizer.pad_token is None:
+            self.tokenizer.pad_token = self.tokenizer.eos_token
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="batch-scheduler", daemon=True)
+            self._thread.start()
+
+    def submit(self, prompt: str, max_length: int = 256, temperature: float = 0.7,
+               top_p: float = 0.9, max_new_tokens: Optional[int] = None) -> GenerationRequest:
+        request = GenerationRequest(prompt, max_length, temperature, top_p, max_new_tokens)
+        self._queue.put(request)
+        return request
+
+    def submit_stream(self, prompt: str, max_length: int = 256, temperature: float = 0.7, top_p: float = 0.9,
+                      timeout: Optional[float] = None, max_new_tokens: Optional[int] = None) -> StreamRequest:
+        """Zleca generowanie strumieniowane; iteracja po wyniku zwraca fragmenty tekstu"""
+        request = StreamRequest(self.tokenizer, prompt, max_length, temperature, top_p, timeout, max_new_tokens)
+        self._queue.put(request)
+        return request
+
+    def generate(self, prompt: str, max_length: int = 256, temperature: float = 0.7, top_p: float = 0.9,
+                 timeout: Optional[float] = None) -> str:
+        """Zleca generowanie i czeka na odpowiedź asystenta"""
+        return self.submit(prompt, max_length, temperature, top_p).wait(timeout)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["queue_depth"] = self._queue.qsize()
+        stats["avg_batch"] = round(stats["requests"] / stats["batches"], 2) if stats["batches"] else 0
+        stats["tokens_per_second"] = (round(stats["generated_tokens"] / stats["generate_seconds"], 1)
+                                      if stats["generate_seconds"] else 0)
+        if self.prefix_cache is not None:
+            stats["prefix_cache"] = self.prefix_cache.stats()
+        return stats
+
+    def _collect(self) -> List[GenerationRequest]:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.batch_window
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _loop(self) -> None:
+        while True:
+            batch = self._collect()
+            groups: Dict[Tuple, List[GenerationRequest]] = {}
+            streams: List[StreamRequest] = []
+            for request in batch:
+                if isinstance(request, StreamRequest):
+                    streams.append(request)
+                else:
+                    groups.setdefault(request.sampling_key(), []).append(request)
+            for group in groups.values():
+                try:
+                    self._run_batch(group)
+                except Exception as e:
+                    for request in group:
+                        request.set_error(e)
+            for stream in streams:
+                try:
+                    self._run_stream(stream)
+                except Exception as e:
+                    stream.set_error(e)
+                    stream.streamer.end()
+
+    def _generate_options(self, request: GenerationRequest, input_ids) -> Dict:
+        options = {"do_sample": request.do_sample}
+        if request.do_sample:
+            options.update(temperature=request.temperature, top_p=request.top_p)
+        if self.prefix_cache is not None:
+            past = prefill(self.model, input_ids, self.prefix_cache)
+            if past is not None:
+                options["past_key_values"] = past
+        return options
+
+    def _run_batch(self, group: List[GenerationRequest]) -> None:
+        start = time.monotonic()
+        inputs = self.tokenizer([chat_prompt(r.prompt) for r in group], return_tensors="pt", padding=True)
+        prompt_lengths = inputs.attention_mask.sum(dim=1).tolist()
+        # max_length w API obejmuje prompt - każde zapytanie ma własny limit nowych tokenów
+        limits = [r.new_token_limit(int(n)) for r, n in zip(group, prompt_lengths)]
+        timer = _BatchTimer()
+
+        with torch.no_grad():
+            outputs = self.model.generate(
+                inputs.input_ids,
+                attention_mask=inputs.attention_mask,
+                max_new_tokens=max(limits),
+                pad_token_id=self.tokenizer.pad_token_id,
+                streamer=timer,
+                **self._generate_options(group[0], inputs.input_ids)
+            )
+
+        width = inputs.input_ids.shape[1]
+        eos = self.tokenizer.eos_token_id
+        generated = 0
+        for i, (request, limit) in enumerate(zip(group, limits)):
+            tokens = outputs[i, width:width + limit].tolist()
+            if eos in tokens:
+                tokens = tokens[:tokens.index(eos)]
+            generated += len(tokens)
+            text = self.tokenizer.decode(tokens, skip_special_tokens=True)
+            request.set_result(assistant_response(text), len(tokens))
+
+        timer.steps.observe("batch", (r.enqueued_at for r in group))
+        self._record(len(group), generated, time.monotonic() - start)
+
+    def _run_stream(self, request: StreamRequest) -> None:
+        if request.cancelled.is_set():
+            request.set_error(RuntimeError("Zapytanie anulowane"))
+            request.streamer.end()
+            return
+        start = time.monotonic()
+        inputs = self.tokenizer(chat_prompt(request.prompt), return_tensors="pt")
+        width = inputs.input_ids.shape[1]
+
+        with torch.no_grad():
+            outputs = self.model.generate(
+                inputs.input_ids,
+                attention_mask=inputs.attention_mask,
+                max_new_tokens=request.new_token_limit(width),
+                pad_token_id=self.tokenizer.pad_token_id,
+                streamer=request.streamer,
+                stopping_criteria=StoppingCriteriaList([_Cancelled(request.cancelled)]),
+                **self._generate_options(request, inputs.input_ids)
+            )
+
+        generated = outputs.shape[1] - width
+        request.set_result("", generated)
+        request.streamer.steps.observe("stream", [request.enqueued_at])
+        self._record(1, generated, time.monotonic() - start)
+
+    def _record(self, requests: int, generated: int, seconds: float) -> None:
+        with self._lock:
+            self._stats["requests"] += requests
+            self._stats["batches"] += 1
+            self._stats["generated_tokens"] += generated
+            self._stats["generate_seconds"] += seconds
+            self._stats["max_batch"] = max(self._stats["max_batch"], requests)
@@ -0,0 +1,86 @@
+# model-service/benchmarks/bench_batching.py
+"""Przepustowość generowania (tokeny/s) przy 1-32 współbieżnych klientach.
+
+Ładuje model w procesie (bez HTTP) i dla każdej liczby klientów uruchamia
+tyle wątków, każdy wysyła po kilka zapytań przez BatchScheduler:
+  - bez łączenia: max_batch_size=1 (jak dawne threaded=False - jedno generate() na zapytanie),
+  - z łączeniem: max_batch_size=--batch, okno --window-ms.
+
+Temperatura 0 (dekodowanie zachłanne) - wyniki nie zależą od losowania.
+
+Użycie: python benchmarks/bench_batching.py --model /app/models/tinyllama --clients 1,4,8,16,32
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import torch  # noqa: E402
+from transformers import AutoModelForCausalLM, AutoTokenizer  # noqa: E402
+
+from batching import BatchScheduler  # noqa: E402
+
+PROMPTS = [
+    "Napisz krótkie powitanie dla nowego pracownika.",
+    "What are three tips for a job interview?",
+    "Wymień trzy cechy dobrego CV.",
+    "Summarize the benefits of remote work in one sentence.",
+    "Jak przygotować się do rozmowy rekrutacyjnej?",
+    "Write a short thank-you note after an interview.",
+]
+
+
+def run(scheduler, clients, requests_per_client, max_length):
+    def client(idx):
+        for n in range(requests_per_client):
+            scheduler.generate(PROMPTS[(idx + n) % len(PROMPTS)], max_length=max_length, temperature=0)
+
+    before = scheduler.stats()
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    after = scheduler.stats()
+    tokens = after["generated_tokens"] - before["generated_tokens"]
+    batches = after["batches"] - before["batches"]
+    return tokens / elapsed, clients * requests_per_client / elapsed, clients * requests_per_client / max(batches, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark łączenia zapytań w partie")
+    parser.add_argument("--model", default=os.environ.get("MODEL_PATH", "/app/models/tinyllama"))
+    parser.add_argument("--clients", default="1,2,4,8,16,32")
+    parser.add_argument("--requests", type=int, default=2, help="zapytań na klienta")
+    parser.add_argument("--max-length", type=int, default=96)
+    parser.add_argument("--batch", type=int, default=32)
+    parser.add_argument("--window-ms", type=float, default=10)
+    args = parser.parse_args()
+
+    torch.set_grad_enabled(False)
+    tokenizer = AutoTokenizer.from_pretrained(args.model)
+    model = AutoModelForCausalLM.from_pretrained(args.model, torch_dtype=torch.float32)
+    model.eval()
+
+    single = BatchScheduler(model, tokenizer, max_batch_size=1, batch_window=0)
+    batched = BatchScheduler(model, tokenizer, max_batch_size=args.batch, batch_window=args.window_ms / 1000)
+    single.start()
+    batched.start()
+    # Rozgrzewka - pierwsze wywołanie alokuje bufory
+    single.generate(PROMPTS[0], max_length=32, temperature=0)
+
+    print(f"Model: {args.model}, wątki torch: {torch.get_num_threads()}, max_length: {args.max_length}")
+    print(f"{'klienci':>8} {'bez łączenia tok/s':>20} {'z łączeniem tok/s':>19} {'przyspieszenie':>15} {'śr. partia':>11}")
+    for clients in (int(c) for c in args.clients.split(",")):
+        base_tps, _, _ = run(single, clients, args.requests, args.max_length)
+        tps, _, avg_batch = run(batched, clients, args.requests, args.max_length)
+        print(f"{clients:>8} {base_tps:>20.1f} {tps:>19.1f} {tps / base_tps:>14.2f}x {avg_batch:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+# model-service/benchmarks/bench_fast_load.py
+"""Zimny start i pamięć replik: from_pretrained vs migawka safetensors mapowana do pamięci (fast_load).
+
+Dla każdego trybu uruchamia --replicas procesów naraz, każdy ładuje model
+i wykonuje krótkie generowanie (rozgrzewka). Raportowane są: czas do
+gotowości, RSS oraz USS (pamięć prywatna procesu - to, co replika naprawdę
+dokłada; strony mmap z page cache są wspólne i nie wchodzą do USS).
+Pierwsze uruchomienie trybu mmap tworzy migawkę, jeśli jej brak.
+
+Użycie: python benchmarks/bench_fast_load.py --model /app/models/tinyllama --replicas 2
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+
+def _replica(mode, model_path, results):
+    import psutil
+    import torch
+    from transformers import AutoModelForCausalLM, AutoTokenizer
+
+    from fast_load import load_model
+
+    start = time.perf_counter()
+    tokenizer = AutoTokenizer.from_pretrained(model_path)
+    if mode == "mmap":
+        model = load_model(model_path)
+    else:
+        model = AutoModelForCausalLM.from_pretrained(model_path, torch_dtype=torch.float32,
+                                                     low_cpu_mem_usage=True).eval()
+    load_seconds = time.perf_counter() - start
+    with torch.no_grad():
+        model.generate(**tokenizer("Hello", return_tensors="pt"), max_new_tokens=8)
+    ready_seconds = time.perf_counter() - start
+    memory = psutil.Process().memory_full_info()
+    results.put((load_seconds, ready_seconds, memory.rss / 2 ** 20, memory.uss / 2 ** 20))
+
+
+def run(mode, model_path, replicas):
+    ctx = multiprocessing.get_context("spawn")
+    results = ctx.Queue()
+    workers = [ctx.Process(target=_replica, args=(mode, model_path, results)) for _ in range(replicas)]
+    for worker in workers:
+        worker.start()
+    outcomes = [results.get() for _ in workers]
+    for worker in workers:
+        worker.join()
+    return outcomes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark zimnego startu model-service")
+    parser.add_argument("--model", default=os.getenv("MODEL_PATH", "/app/models/tinyllama"))
+    parser.add_argument("--replicas", type=int, default=2)
+    args = parser.parse_args()
+
+    print(f"{'tryb':16} {'ładowanie s':>12} {'gotowość s':>11} {'RSS MB':>9} {'USS MB':>9}")
+    # Migawka musi istnieć przed pomiarem, inaczej repliki mmap zmierzą jej tworzenie
+    run("mmap", args.model, 1)
+    for mode in ("from_pretrained", "mmap"):
+        for load_s, ready_s, rss, uss in run(mode, args.model, args.replicas):
+            print(f"{mode:16} {load_s:12.1f} {ready_s:11.1f} {rss:9.0f} {uss:9.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+# model-service/benchmarks/bench_prefix_cache.py
+"""Czas prefillu długich promptów z szablonu: pełny prefill vs wspólny początek z PrefixCache.
+
+Prompty wyglądają jak te z PipelineGenerator: długa, stała instrukcja
+i różny adres portalu na końcu. Mierzony jest czas do pierwszego tokenu
+(generate z max_new_tokens=1) dla:
+  - bez cache: cały prompt liczony za każdym razem,
+  - z cache: początek wspólny dla szablonu liczony raz, potem tylko końcówka.
+
+Użycie: python benchmarks/bench_prefix_cache.py --model /app/models/tinyllama --prompts 20
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import torch  # noqa: E402
+from transformers import AutoModelForCausalLM, AutoTokenizer  # noqa: E402
+
+from batching import chat_prompt  # noqa: E402
+from prefix_cache import PrefixCache, prefill  # noqa: E402
+
+TEMPLATE = """Jesteś asystentem automatyzującym aplikowanie o pracę. Analizujesz stronę internetową,
+która wydaje się być portalem pracy, i przygotowujesz pipeline kroków do wykonania w przeglądarce.
+
+Proszę o sugestię kroków, które należy wykonać, aby:
+1. Znaleźć formularze aplikacyjne i przyciski "Aplikuj" na stronie oferty
+2. Wypełnić je danymi z CV: imię, nazwisko, email, telefon, doświadczenie, wykształcenie
+3. Przesłać CV i inne wymagane dokumenty (list motywacyjny, portfolio)
+4. Zaakceptować wymagane zgody RODO i regulamin portalu
+5. Potwierdzić wysłanie aplikacji i zapisać numer referencyjny
+
+Sugeruj konkretne selektory CSS lub XPath, które mogą być używane do identyfikacji elementów formularza.
+Odpowiedź zwróć jako JSON z polami name, url i steps (type, action, selector, value).
+
+Strona do analizy: {url}"""
+
+
+def time_to_first_token(model, tokenizer, prompt, cache=None):
+    inputs = tokenizer(chat_prompt(prompt), return_tensors="pt")
+    start = time.perf_counter()
+    with torch.no_grad():
+        options = {}
+        if cache is not None:
+            past = prefill(model, inputs.input_ids, cache)
+            if past is not None:
+                options["past_key_values"] = past
+        model.generate(inputs.input_ids, attention_mask=inputs.attention_mask, max_new_tokens=1,
+                       do_sample=False, pad_token_id=tokenizer.eos_token_id, **options)
+    return time.perf_counter() - start, inputs.input_ids.shape[1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark cache wspólnych początków promptów")
+    parser.add_argument("--model", default=os.environ.get("MODEL_PATH", "/app/models/tinyllama"))
+    parser.add_argument("--prompts", type=int, default=20)
+    args = parser.parse_args()
+
+    tokenizer = AutoTokenizer.from_pretrained(args.model)
+    model = AutoModelForCausalLM.from_pretrained(args.model, torch_dtype=torch.float32)
+    model.eval()
+    prompts = [TEMPLATE.format(url=f"https://kariera{i}.example.com/oferty/{1000 + i}") for i in range(args.prompts)]
+    time_to_first_token(model, tokenizer, prompts[0])  # rozgrzewka
+
+    plain = [time_to_first_token(model, tokenizer, p)[0] for p in prompts]
+    cache = PrefixCache(max_tokens=4096, min_tokens=32)
+    cached = [time_to_first_token(model, tokenizer, p, cache)[0] for p in prompts]
+    length = time_to_first_token(model, tokenizer, prompts[0])[1]
+
+    # Pierwsze dwa prompty z cache liczą pełny prefill (drugi zapisuje wspólny początek)
+    steady = cached[2:] or cached
+    print(f"Model: {args.model}, prompt: {length} tokenów, promptów: {len(prompts)}")
+    print(f"bez cache:  średnio {sum(plain) / len(plain) * 1000:8.1f} ms do pierwszego tokenu")
+    print(f"z cache:    średnio {sum(steady) / len(steady) * 1000:8.1f} ms (po zapisaniu początku)")
+    print(f"przyspieszenie: {sum(plain) / len(plain) / (sum(steady) / len(steady)):.1f}x, {cache.stats()}")
+
+
+if __name__ == "__main__":
+    main()
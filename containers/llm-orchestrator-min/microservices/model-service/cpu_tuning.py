@@ -0,0 +1,153 @@
+# model-service/cpu_tuning.py
+# Ten sam plik jest używany w containers/llm-orchestrator/cpu_tuning.py - zmiany wprowadzaj w obu miejscach.
+import json
+import os
+from typing import Any, Dict, List, Optional
+
+DEFAULT_PROFILE_PATH = "/app/config/hardware-info.json"
+# Mały model na CPU przestaje przyspieszać powyżej kilku wątków - więcej rdzeni lepiej dać kolejnej replice
+THREADS_PER_REPLICA_CAP = 8
+
+
+def _read(path: str) -> str:
+    with open(path) as f:
+        return f.read().strip()
+
+
+def cgroup_cpu_quota() -> Optional[float]:
+    """Limit CPU kontenera (liczba rdzeni) z cgroup v2 lub v1; None = bez limitu"""
+    try:
+        quota, period = _read("/sys/fs/cgroup/cpu.max").split()
+        return None if quota == "max" else int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+    try:
+        quota = int(_read("/sys/fs/cgroup/cpu/cpu.cfs_quota_us"))
+        period = int(_read("/sys/fs/cgroup/cpu/cpu.cfs_period_us"))
+        return None if quota <= 0 else quota / period
+    except (OSError, ValueError):
+        return None
+
+
+def cpu_topology() -> Dict[str, Any]:
+    """Dostępne procesory logiczne (cpuset procesu) pogrupowane w rdzenie fizyczne"""
+    try:
+        allowed = sorted(os.sched_getaffinity(0))
+    except AttributeError:  # poza Linuksem
+        allowed = list(range(os.cpu_count() or 1))
+    cores: Dict[tuple, List[int]] = {}
+    for cpu in allowed:
+        base = f"/sys/devices/system/cpu/cpu{cpu}/topology"
+        try:
+            key = (int(_read(f"{base}/physical_package_id")), int(_read(f"{base}/core_id")))
+        except (OSError, ValueError):
+            key = (0, cpu)
+        cores.setdefault(key, []).append(cpu)
+    return {
+        "logical_cpus": allowed,
+        "cores": [cpus for _, cpus in sorted(cores.items())],
+        "sockets": len({socket for socket, _ in cores}),
+        "cpu_quota": cgroup_cpu_quota(),
+    }
+
+
+def usable_cores(topology: Dict[str, Any]) -> int:
+    cores = len(topology["cores"])
+    quota = topology.get("cpu_quota")
+    return max(1, min(cores, int(quota))) if quota else max(1, cores)
+
+
+def suggest_replicas(topology: Dict[str, Any], memory_gb: Optional[float] = None,
+                     model_ram_gb: Optional[float] = None) -> int:
+    """Liczba replik modelu na hosta: rdzenie / limit wątków na replikę, ograniczone pamięcią"""
+    replicas = max(1, usable_cores(topology) // THREADS_PER_REPLICA_CAP)
+    if memory_gb and model_ram_gb:
+        replicas = min(replicas, max(1, int(memory_gb * 0.8 // model_ram_gb)))
+    return replicas
+
+
+def plan_profile(topology: Dict[str, Any], replicas: int = 1, threads: Optional[int] = None) -> Dict[str, Any]:
+    """Profil wykonania: wątki intra/inter-op na replikę i rozłączne zestawy rdzeni dla replik.
+
+    Każda replika dostaje po jednym procesorze logicznym z `threads` rdzeni
+    fizycznych (rodzeństwo SMT pomijane), więc repliki nie walczą o te same
+    rdzenie, a wątki jednej repliki nie dzielą rdzenia między sobą.
+    """
+    cores = topology["cores"][:usable_cores(topology)]
+    replicas = max(1, min(replicas, len(cores)))
+    threads = max(1, min(threads or len(cores) // replicas, len(cores) // replicas))
+    core_sets = [[cpus[0] for cpus in cores[i * threads:(i + 1) * threads]] for i in range(replicas)]
+    return {
+        "replicas": replicas,
+        "intra_op_threads": threads,
+        "inter_op_threads": 1,
+        "core_sets": core_sets,
+    }
+
+
+def apply_profile(profile: Dict[str, Any], replica_index: int = 0, pin: bool = False) -> Dict[str, Any]:
+    """Ustawia wątki torch/OpenMP i (opcjonalnie) przypina proces do zestawu rdzeni repliki.
+
+    Wołać przy starcie procesu, przed załadowaniem modelu - liczbę wątków
+    inter-op torch przyjmuje tylko przed pierwszą operacją równoległą,
+    a nowe wątki dziedziczą przypisanie rdzeni.
+    """
+    threads = int(profile["intra_op_threads"])
+    interop = int(profile.get("inter_op_threads", 1))
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ[var] = str(threads)
+    applied: Dict[str, Any] = {"intra_op_threads": threads, "inter_op_threads": interop, "cpus": None}
+
+    core_sets = profile.get("core_sets") or []
+    if pin and core_sets and hasattr(os, "sched_setaffinity"):
+        cpus = core_sets[replica_index % len(core_sets)]
+        try:
+            os.sched_setaffinity(0, cpus)
+            applied["cpus"] = cpus
+        except OSError:
+            pass
+
+    try:
+        import torch
+    except ImportError:
+        return applied
+    torch.set_num_threads(threads)
+    try:
+        torch.set_num_interop_threads(interop)
+    except RuntimeError:
+        pass  # pula inter-op już wystartowała
+    return applied
+
+
+def load_profile(path: str) -> Optional[Dict[str, Any]]:
+    """Profil zapisany przez detect-hardware.py lub benchmark (klucz inference_profile)"""
+    try:
+        with open(path) as f:
+            return json.load(f).get("inference_profile")
+    except (OSError, ValueError):
+        return None
+
+
+def profile_from_env() -> Dict[str, Any]:
+    profile = load_profile(os.getenv("INFERENCE_PROFILE", DEFAULT_PROFILE_PATH))
+    if profile is None:
+        profile = plan_profile(cpu_topology(), replicas=int(os.getenv("INFERENCE_REPLICAS", "1")))
+    if os.getenv("INFERENCE_THREADS"):
+        profile["intra_op_threads"] = int(os.environ["INFERENCE_THREADS"])
+    return profile
+
+
+def configure_from_env() -> Optional[Dict[str, Any]]:
+    """Stosuje profil z INFERENCE_PROFILE (albo wyliczony z topologii); INFERENCE_TUNING=false wyłącza.
+
+    Przypinanie do rdzeni (INFERENCE_PIN=true) ma sens, gdy każda replika
+    zna swój numer (INFERENCE_REPLICA_INDEX) - inaczej wszystkie trafiłyby
+    na ten sam zestaw rdzeni.
+    """
+    if os.getenv("INFERENCE_TUNING", "true").lower() != "true":
+        return None
+    return apply_profile(
+        profile_from_env(),
+        replica_index=int(os.getenv("INFERENCE_REPLICA_INDEX", "0")),
+        pin=os.getenv("INFERENCE_PIN", "false").lower() == "true"
+    )
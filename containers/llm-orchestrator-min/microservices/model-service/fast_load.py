@@ -0,0 +1,139 @@
+# model-service/fast_load.py
+import json
+import mmap
+import os
+import struct
+import time
+from typing import Dict, Optional, Tuple
+
+import torch
+
+SNAPSHOT_NAME = "model-float32.safetensors"
+
+_DTYPES = {
+    "F64": torch.float64, "F32": torch.float32, "F16": torch.float16, "BF16": torch.bfloat16,
+    "I64": torch.int64, "I32": torch.int32, "I16": torch.int16, "I8": torch.int8, "U8": torch.uint8,
+    "BOOL": torch.bool,
+}
+
+
+def _source_stamp(model_path: str) -> str:
+    """Identyfikator wersji modelu źródłowego - zmiana plików unieważnia migawkę"""
+    stamps = []
+    for name in sorted(os.listdir(model_path)):
+        if name.startswith(SNAPSHOT_NAME) or os.path.isdir(os.path.join(model_path, name)):
+            continue
+        stat = os.stat(os.path.join(model_path, name))
+        stamps.append(f"{name}:{stat.st_size}:{int(stat.st_mtime)}")
+    return ";".join(stamps)
+
+
+def read_header(path: str) -> Tuple[Dict, int]:
+    """Nagłówek safetensors (JSON) i pozycja początku danych w pliku"""
+    with open(path, "rb") as f:
+        (length,) = struct.unpack("<Q", f.read(8))
+        return json.loads(f.read(length)), 8 + length
+
+
+def mmap_state_dict(path: str) -> Dict[str, torch.Tensor]:
+    """Tensory z pliku safetensors jako widoki na mmap (bez kopiowania danych)"""
+    header, data_start = read_header(path)
+    with open(path, "rb") as f:
+        # ACCESS_COPY = MAP_PRIVATE: strony współdzielone z page cache, dopóki nikt ich nie zapisze
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+    tensors = {}
+    for name, meta in header.items():
+        if name == "__metadata__":
+            continue
+        dtype = _DTYPES[meta["dtype"]]
+        begin, end = meta["data_offsets"]
+        shape = meta["shape"]
+        if end == begin:
+            tensors[name] = torch.empty(shape, dtype=dtype)
+            continue
+        count = (end - begin) // torch.tensor([], dtype=dtype).element_size()
+        tensors[name] = torch.frombuffer(buffer, dtype=dtype, count=count, offset=data_start + begin).view(shape)
+    return tensors
+
+
+def write_snapshot(model, path: str, source_stamp: str) -> None:
+    """Zapisuje wagi modelu do migawki; wagi współdzielone (np. lm_head) tylko raz - odtwarza je tie_weights()"""
+    from safetensors.torch import save_file
+    state = {}
+    seen = set()
+    for name, tensor in model.state_dict().items():
+        if tensor.data_ptr() in seen:
+            continue
+        seen.add(tensor.data_ptr())
+        state[name] = tensor.contiguous()
+    tmp_path = f"{path}.tmp"
+    save_file(state, tmp_path, metadata={"format": "pt", "source": source_stamp})
+    os.replace(tmp_path, path)  # inne repliki nie zobaczą niedopisanego pliku
+
+
+def _snapshot_valid(path: str, source_stamp: str) -> bool:
+    try:
+        header, _ = read_header(path)
+    except (OSError, ValueError, struct.error):
+        return False
+    return header.get("__metadata__", {}).get("source") == source_stamp
+
+
+def load_from_snapshot(model_path: str, snapshot_path: str):
+    from accelerate import init_empty_weights
+    from transformers import AutoConfig, AutoModelForCausalLM
+
+    config = AutoConfig.from_pretrained(model_path)
+    # Parametry na urządzeniu meta (bez alokacji), bufory (np. tablice RoPE) liczone normalnie
+    with init_empty_weights():
+        model = AutoModelForCausalLM.from_config(config, torch_dtype=torch.float32)
+    for name, tensor in mmap_state_dict(snapshot_path).items():
+        module_name, _, attr = name.rpartition(".")
+        module = model.get_submodule(module_name)
+        if attr in module._parameters:
+            module._parameters[attr] = torch.nn.Parameter(tensor, requires_grad=False)
+        else:
+            module._buffers[attr] = tensor
+    model.tie_weights()
+    missing = [name for name, param in model.named_parameters() if param.device.type == "meta"]
+    if missing:
+        raise ValueError(f"Migawka {snapshot_path} nie zawiera wag: {', '.join(missing[:5])}")
+    return model.eval()
+
+
+def load_model(model_path: str, snapshot_path: Optional[str] = None):
+    """Model float32 na CPU z migawki safetensors mapowanej do pamięci.
+
+    Pierwszy start ładuje model przez from_pretrained i zapisuje wagi float32
+    do jednego pliku safetensors (migawka, domyślnie obok modelu). Kolejne
+    starty - i repliki na tym samym hoście, które widzą ten plik na wolumenie -
+    tworzą pusty model i podpinają tensory pod mmap pliku. Strony wag pochodzą
+    z page cache: są wspólne dla procesów i wczytywane przy pierwszym dostępie,
+    więc start nie kopiuje wag, a RSS repliki nie zawiera prywatnej kopii modelu.
+    """
+    from transformers import AutoModelForCausalLM
+
+    if not os.path.isdir(model_path):  # nazwa z HuggingFace Hub - bez migawki
+        return AutoModelForCausalLM.from_pretrained(model_path, torch_dtype=torch.float32,
+                                                    low_cpu_mem_usage=True).eval()
+    snapshot_path = snapshot_path or os.path.join(model_path, SNAPSHOT_NAME)
+    stamp = _source_stamp(model_path)
+    start = time.perf_counter()
+    if _snapshot_valid(snapshot_path, stamp):
+        try:
+            model = load_from_snapshot(model_path, snapshot_path)
+            print(f"Model z migawki mmap {snapshot_path} w {time.perf_counter() - start:.1f} s")
+            return model
+        except Exception as e:
+            print(f"Nie udało się użyć migawki {snapshot_path}: {e}")
+
+    model = AutoModelForCausalLM.from_pretrained(model_path, torch_dtype=torch.float32, low_cpu_mem_usage=True)
+    print(f"Model z from_pretrained w {time.perf_counter() - start:.1f} s")
+    try:
+        write_snapshot(model, snapshot_path, stamp)
+    except Exception as e:  # np. wolumen tylko do odczytu - działa dalej bez migawki
+        print(f"Nie udało się zapisać migawki {snapshot_path}: {e}")
+        return model.eval()
+    # Przeładowanie z migawki: ta replika też korzysta ze wspólnych stron zamiast prywatnej kopii wag
+    del model
+    return load_from_snapshot(model_path, snapshot_path)
@@ -0,0 +1,155 @@
+# model-service/llama_backend.py
+import os
+import queue
+import threading
+import time
+from typing import Dict, Iterator, Optional
+
+import psutil
+
+from batching import GenerationRequest, chat_prompt, assistant_response
+
+try:
+    from llama_cpp import Llama
+except ImportError:  # llama-cpp-python jest potrzebny tylko dla modeli GGUF
+    Llama = None
+
+
+def is_gguf(model_path: str) -> bool:
+    return model_path.endswith(".gguf")
+
+
+class LlamaStreamRequest(GenerationRequest):
+    """Odpowiedź llama.cpp oddawana fragmentami; interfejs jak batching.StreamRequest"""
+
+    def __init__(self, prompt: str, max_length: int = 256, temperature: float = 0.7, top_p: float = 0.9,
+                 timeout: Optional[float] = None, max_new_tokens: Optional[int] = None):
+        super().__init__(prompt, max_length, temperature, top_p, max_new_tokens)
+        self.timeout = timeout
+        self.cancelled = threading.Event()
+        self.chunks: "queue.Queue[Optional[str]]" = queue.Queue()
+
+    def cancel(self) -> None:
+        self.cancelled.set()
+
+    def __iter__(self) -> Iterator[str]:
+        while True:
+            chunk = self.chunks.get(timeout=self.timeout)
+            if chunk is None:
+                break
+            yield chunk
+        self.wait(self.timeout)
+
+
+class LlamaCppScheduler:
+    """Zamiennik BatchScheduler dla skwantyzowanych modeli GGUF (llama.cpp).
+
+    Model jest mapowany do pamięci (use_mmap), wątki i rozmiar partii prefillu
+    ustawia się przez LLAMA_THREADS i LLAMA_BATCH. Kontekst llama.cpp obsługuje
+    jedną sekwencję, więc zapytania są wykonywane po kolei przez jeden wątek;
+    API (/api/generate, stream, statystyki) pozostaje takie samo.
+    """
+
+    def __init__(self, model_path: str, n_ctx: int = 2048, n_threads: Optional[int] = None,
+                 n_batch: int = 512, use_mlock: bool = False):
+        if Llama is None:
+            raise RuntimeError("Model GGUF wymaga pakietu llama-cpp-python")
+        self.model_path = model_path
+        # Domyślnie rdzenie fizyczne - wątki SMT tylko konkurują o te same jednostki obliczeniowe
+        self.n_threads = n_threads or psutil.cpu_count(logical=False) or os.cpu_count() or 1
+        self.n_batch = n_batch
+        self.llm = Llama(model_path=model_path, n_ctx=n_ctx, n_threads=self.n_threads, n_batch=n_batch,
+                         use_mmap=True, use_mlock=use_mlock, verbose=False)
+        self._queue: "queue.Queue[GenerationRequest]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "batches": 0, "generated_tokens": 0, "generate_seconds": 0.0,
+                       "max_batch": 0}
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="llama-scheduler", daemon=True)
+            self._thread.start()
+
+    def submit(self, prompt: str, max_length: int = 256, temperature: float = 0.7,
+               top_p: float = 0.9, max_new_tokens: Optional[int] = None) -> GenerationRequest:
+        request = GenerationRequest(prompt, max_length, temperature, top_p, max_new_tokens)
+        self._queue.put(request)
+        return request
+
+    def submit_stream(self, prompt: str, max_length: int = 256, temperature: float = 0.7, top_p: float = 0.9,
+                      timeout: Optional[float] = None, max_new_tokens: Optional[int] = None) -> LlamaStreamRequest:
+        request = LlamaStreamRequest(prompt, max_length, temperature, top_p, timeout, max_new_tokens)
+        self._queue.put(request)
+        return request
+
+    def generate(self, prompt: str, max_length: int = 256, temperature: float = 0.7, top_p: float = 0.9,
+                 timeout: Optional[float] = None) -> str:
+        return self.submit(prompt, max_length, temperature, top_p).wait(timeout)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["queue_depth"] = self._queue.qsize()
+        stats["avg_batch"] = 1 if stats["batches"] else 0
+        stats["tokens_per_second"] = (round(stats["generated_tokens"] / stats["generate_seconds"], 1)
+                                      if stats["generate_seconds"] else 0)
+        stats["backend"] = {"name": "llama_cpp", "model": self.model_path, "n_threads": self.n_threads,
+                            "n_batch": self.n_batch}
+        return stats
+
+    def _loop(self) -> None:
+        while True:
+            request = self._queue.get()
+            try:
+                self._run(request)
+            except Exception as e:
+                request.set_error(e)
+                if isinstance(request, LlamaStreamRequest):
+                    request.chunks.put(None)
+
+    def _run(self, request: GenerationRequest) -> None:
+        stream = isinstance(request, LlamaStreamRequest)
+        if stream and request.cancelled.is_set():
+            raise RuntimeError("Zapytanie anulowane")
+        start = time.monotonic()
+        prompt = chat_prompt(request.prompt)
+        tokens = self.llm.tokenize(prompt.encode("utf-8"))
+        # max_length w API obejmuje prompt, jak w wersji transformers
+        max_tokens = request.new_token_limit(len(tokens))
+        # temperature 0 w llama.cpp oznacza dekodowanie zachłanne
+        options = dict(max_tokens=max_tokens, temperature=request.temperature if request.do_sample else 0,
+                       top_p=request.top_p)
+
+        if stream:
+            generated = 0
+            for part in self.llm(prompt, stream=True, **options):
+                if request.cancelled.is_set():
+                    break
+                generated += 1
+                text = part["choices"][0]["text"]
+                if text:
+                    request.chunks.put(text)
+            request.set_result("", generated)
+            request.chunks.put(None)
+        else:
+            output = self.llm(prompt, **options)
+            generated = output["usage"]["completion_tokens"]
+            request.set_result(assistant_response(output["choices"][0]["text"]), generated)
+
+        with self._lock:
+            self._stats["requests"] += 1
+            self._stats["batches"] += 1
+            self._stats["generated_tokens"] += generated
+            self._stats["generate_seconds"] += time.monotonic() - start
+            self._stats["max_batch"] = 1
+
+
+def scheduler_from_env(model_path: str, n_threads: Optional[int] = None) -> LlamaCppScheduler:
+    return LlamaCppScheduler(
+        model_path,
+        n_ctx=int(os.getenv("LLAMA_CTX", "2048")),
+        n_threads=int(os.getenv("LLAMA_THREADS", "0")) or n_threads,
+        n_batch=int(os.getenv("LLAMA_BATCH", "512")),
+        use_mlock=os.getenv("LLAMA_MLOCK", "false").lower() == "true"
+    )
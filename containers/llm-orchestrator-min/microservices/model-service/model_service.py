@@ -1,16 +1,23 @@
 import os
+import threading
+import time
 import torch
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from transformers import AutoModelForCausalLM, AutoTokenizer
 
-app = Flask(__name__)
+from admission import AdmissionRejected, admission_from_env, resolve_priority
+from batching import BatchScheduler, cached_events, stream_events
+from cpu_tuning import configure_from_env
+from fast_load import load_model
+from llama_backend import is_gguf, scheduler_from_env as llama_scheduler_from_env
+from prefix_cache import prefix_cache_from_env
+from prefork import serve_prefork, worker_profile
+from response_cache import cache_from_env
 
-@app.route("/health", methods=["GET"])
-def health_check():
-    return jsonify({"status": "ok"}), 200
+app = Flask(__name__)
 
 # Ścieżka do modelu
-MODEL_PATH = "/app/models/tinyllama"
+MODEL_PATH = os.environ.get('MODEL_PATH', "/app/models/tinyllama")
 
 # Konfiguracja optymalizacji
 USE_INT8 = os.environ.get('USE_INT8', 'true').lower() == 'true'
@@ -18,63 +25,207 @@ DEVICE = "cpu"
 # Konfiguracja portu API z możliwością zmiany przez zmienną środowiskową
 API_PORT = int(os.environ.get('API_PORT', '5000'))
 
-print("Ładowanie modelu TinyLlama-1.1B...")
-print(f"Optymalizacje: USE_INT8={USE_INT8}, DEVICE={DEVICE}")
+# Backend: llama.cpp dla skwantyzowanych plików GGUF (MODEL_PATH=/app/models/*.gguf), transformers dla reszty
+MODEL_BACKEND = os.environ.get('MODEL_BACKEND', 'llama_cpp' if is_gguf(MODEL_PATH) else 'hf')
+
+# Współbieżne zapytania są łączone w partie dla jednego wywołania generate()
+MAX_BATCH_SIZE = int(os.environ.get('MAX_BATCH_SIZE', '8'))
+BATCH_WINDOW_MS = float(os.environ.get('BATCH_WINDOW_MS', '10'))
+GENERATE_TIMEOUT = float(os.environ.get('GENERATE_TIMEOUT', '300'))
+
+# Wątki torch/OpenMP wg profilu CPU (INFERENCE_PROFILE lub topologia i limit cgroup kontenera),
+# ustawiane przed załadowaniem modelu
+CPU_PROFILE = configure_from_env()
+print(f"Profil CPU: {CPU_PROFILE}")
+
+# Wagi z migawki float32 safetensors mapowanej do pamięci (fast_load.py); FAST_LOAD=false - zwykłe from_pretrained
+FAST_LOAD = os.environ.get('FAST_LOAD', 'true').lower() == 'true'
+MODEL_SNAPSHOT = os.environ.get('MODEL_SNAPSHOT') or None
+WARMUP = os.environ.get('WARMUP', 'true').lower() == 'true'
+
+print(f"Ładowanie modelu {MODEL_PATH} (backend: {MODEL_BACKEND})...")
 print(f"API będzie dostępne na porcie: {API_PORT}")
 
-# Ładowanie tokenizera
-tokenizer = AutoTokenizer.from_pretrained(MODEL_PATH)
+# Stan startu: /health (liveness) odpowiada od razu, /ready (readiness) dopiero po załadowaniu i rozgrzewce
+startup = {"stage": "starting", "ready": False, "load_seconds": None, "warmup_seconds": None, "error": None}
+scheduler = None
+
+
+def create_scheduler():
+    if MODEL_BACKEND == 'llama_cpp':
+        # Model mapowany z pliku (mmap): LLAMA_THREADS, LLAMA_BATCH, LLAMA_CTX, LLAMA_MLOCK
+        profile = WORKER_PROFILE or CPU_PROFILE  # w trybie prefork wątki na workera
+        threads = profile["intra_op_threads"] if profile else None
+        return llama_scheduler_from_env(MODEL_PATH, n_threads=threads)
+
+    # bitsandbytes (load_in_8bit) działa tylko z CUDA - na CPU model zostaje w float32
+    load_in_8bit = USE_INT8 and torch.cuda.is_available()
+    print(f"Optymalizacje: USE_INT8={USE_INT8} (aktywne: {load_in_8bit}), DEVICE={DEVICE}, FAST_LOAD={FAST_LOAD}")
+
+    # Ładowanie tokenizera
+    tokenizer = AutoTokenizer.from_pretrained(MODEL_PATH)
+
+    if FAST_LOAD and not load_in_8bit:
+        model = load_model(MODEL_PATH, MODEL_SNAPSHOT)
+    else:
+        # Ładowanie modelu z optymalizacjami
+        model = AutoModelForCausalLM.from_pretrained(
+            MODEL_PATH,
+            torch_dtype=torch.float32,  # Używamy float32 dla CPU
+            low_cpu_mem_usage=True,
+            load_in_8bit=load_in_8bit,  # Kwantyzacja int8 dla mniejszego zużycia pamięci
+            device_map=DEVICE
+        )
+        model.eval()
+
+    # Optymalizacja pamięci po załadowaniu modelu
+    torch.cuda.empty_cache() if torch.cuda.is_available() else None
+
+    # Stan KV wspólnych początków promptów (szablony): PREFIX_CACHE_MAX_TOKENS, PREFIX_CACHE_MIN_TOKENS
+    return BatchScheduler(model, tokenizer, max_batch_size=MAX_BATCH_SIZE,
+                          batch_window=BATCH_WINDOW_MS / 1000, prefix_cache=prefix_cache_from_env())
+
+
+def load_scheduler():
+    startup["stage"] = "loading"
+    start = time.monotonic()
+    try:
+        loaded = create_scheduler()
+    except Exception as e:
+        startup.update(stage="failed", error=str(e))
+        raise
+    startup["load_seconds"] = round(time.monotonic() - start, 2)
+    return loaded
+
+
+def warm_up(loaded):
+    """Startuje planistę i rozgrzewa model; zapytania trafiają do modelu dopiero potem"""
+    global scheduler
+    loaded.start()
+    if WARMUP:
+        # Jedno krótkie generowanie wczytuje strony wag i inicjuje pule wątków przed pierwszym zapytaniem
+        startup["stage"] = "warmup"
+        start = time.monotonic()
+        loaded.generate("Hello", max_length=48, temperature=0, timeout=GENERATE_TIMEOUT)
+        startup["warmup_seconds"] = round(time.monotonic() - start, 2)
+    scheduler = loaded
+    startup.update(stage="ready", ready=True)
+    print(f"Model gotowy (ładowanie {startup['load_seconds']} s, rozgrzewka {startup['warmup_seconds']} s)")
+
+
+def start_model():
+    """Ładuje model i rozgrzewa go w tle (tryb jednoprocesowy)"""
+    try:
+        warm_up(load_scheduler())
+    except Exception as e:
+        startup.update(stage="failed", error=str(e))
+        print(f"Błąd ładowania modelu: {e}")
 
-# Ładowanie modelu z optymalizacjami
-model = AutoModelForCausalLM.from_pretrained(
-    MODEL_PATH,
-    torch_dtype=torch.float32,  # Używamy float32 dla CPU
-    low_cpu_mem_usage=True,
-    load_in_8bit=USE_INT8,  # Kwantyzacja int8 dla mniejszego zużycia pamięci
-    device_map=DEVICE
-)
 
-# Optymalizacja pamięci po załadowaniu modelu
-torch.cuda.empty_cache() if torch.cuda.is_available() else None
-print("Model załadowany i zoptymalizowany!")
+def start_worker(loaded, index, cpu_profile):
+    """Worker prefork: własne połączenie cache (połączenie SQLite nie może przejść przez fork) i rozgrzewka"""
+    global response_cache, CPU_PROFILE
+    startup["worker"] = index
+    CPU_PROFILE = cpu_profile
+    response_cache = cache_from_env("model-service")
+    warm_up(loaded)
+
+
+# Tryb prefork (prefork.py): MODEL_WORKERS procesów dzieli model załadowany raz; auto - wg profilu CPU i rdzeni
+WORKER_PROFILE = worker_profile(os.environ.get('MODEL_WORKERS', '1'))
+
+if WORKER_PROFILE is None:
+    threading.Thread(target=start_model, name="model-startup", daemon=True).start()
+
+
+def _not_ready():
+    response = jsonify({"error": f"Model nie jest gotowy ({startup['stage']})", "success": False})
+    response.headers["Retry-After"] = "5"
+    return response, 503
+
+
+@app.route("/health", methods=["GET"])
+def health_check():
+    """Liveness: proces działa (500 tylko gdy ładowanie modelu się nie powiodło)"""
+    if startup["stage"] == "failed":
+        return jsonify({"status": "failed", "error": startup["error"]}), 500
+    return jsonify({"status": "ok", "stage": startup["stage"]}), 200
+
+
+@app.route("/ready", methods=["GET"])
+def ready_check():
+    """Readiness: model załadowany i rozgrzany - można kierować ruch"""
+    return jsonify(startup), 200 if startup["ready"] else 503
+
+# Cache odpowiedzi (domyślnie tylko temperature 0): LLM_CACHE_SIZE, LLM_CACHE_TTL, LLM_CACHE_DB
+response_cache = cache_from_env("model-service")
+
+# Kontrola dopuszczenia (admission.py): najwyżej ADMISSION_CONCURRENCY generowań (domyślnie rozmiar partii),
+# kolejka ADMISSION_QUEUE na klasę priorytetu (interactive/background), pełna kolejka -> 429 z Retry-After
+admission = admission_from_env("model-service", max_concurrent=MAX_BATCH_SIZE)
 
 @app.route('/api/generate', methods=['POST'])
 def generate():
+    if scheduler is None:
+        return _not_ready()
     try:
         data = request.json
         prompt = data.get('prompt', '')
-        max_length = data.get('max_length', 256)
+        max_length = int(data.get('max_length', 256))
         temperature = data.get('temperature', 0.7)
         top_p = data.get('top_p', 0.9)
-        
-        # Formatowanie promptu dla modelu czatowego
-        chat_prompt = f"<human>: {prompt}\n<assistant>:"
-        
-        # Generowanie odpowiedzi z optymalizacją pamięci
-        with torch.no_grad():  # Wyłączamy gradient dla oszczędności pamięci
-            inputs = tokenizer(chat_prompt, return_tensors="pt")
-            outputs = model.generate(
-                inputs.input_ids,
-                max_length=max_length,
-                temperature=temperature,
-                top_p=top_p,
-                do_sample=True
-            )
-        
-        # Dekodowanie odpowiedzi
-        response = tokenizer.decode(outputs[0], skip_special_tokens=True)
-        
-        # Wyodrębnienie odpowiedzi asystenta
-        assistant_response = response.split("<assistant>:")[-1].strip()
-        
-        # Zwolnienie pamięci
-        del inputs, outputs
-        torch.cuda.empty_cache() if torch.cuda.is_available() else None
-        
+        stream = data.get('stream') or request.args.get('stream') == 'true'
+        priority = resolve_priority(data.get('priority') or request.headers.get('X-Priority'))
+
+        params = {"max_length": max_length, "temperature": temperature, "top_p": top_p}
+        cached = response_cache.get(MODEL_PATH, prompt, params)
+        if cached is not None:
+            if stream:
+                return Response(cached_events(cached), mimetype='text/event-stream')
+            return jsonify({
+                "response": cached,
+                "cached": True,
+                "success": True
+            })
+
+        # Czeka na slot generowania; zapytania interaktywne wyprzedzają te w tle.
+        # max_length obejmuje prompt - ADMISSION_MAX_TOKENS ogranicza tylko nowe tokeny
+        ticket = admission.acquire(priority, max_length)
+        options = dict(max_length=max_length, temperature=temperature, top_p=top_p,
+                       max_new_tokens=admission.max_request_tokens)
+
+        # stream=true: tokeny wysyłane na bieżąco jako Server-Sent Events
+        try:
+            if stream:
+                generation = scheduler.submit_stream(prompt, timeout=GENERATE_TIMEOUT, **options)
+            else:
+                generation = scheduler.submit(prompt, **options)
+        except Exception:
+            admission.release(ticket)
+            raise
+        # Slot zwalnia koniec generowania, a nie klient - po przekroczeniu czasu planista wciąż pracuje
+        generation.add_done_callback(lambda: admission.release(ticket))
+
+        if stream:
+            def store(response):
+                response_cache.put(MODEL_PATH, prompt, params, response)
+
+            return Response(stream_events(generation, on_done=store),
+                            mimetype='text/event-stream',
+                            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+        # Zapytanie trafia do planisty partii; wątek czeka na swój wynik
+        assistant_response = generation.wait(GENERATE_TIMEOUT)
+        response_cache.put(MODEL_PATH, prompt, params, assistant_response)
+
         return jsonify({
             "response": assistant_response,
             "success": True
         })
+    except AdmissionRejected as e:
+        response = jsonify({"error": str(e), "success": False})
+        response.headers["Retry-After"] = str(e.retry_after)
+        return response, 429
     except Exception as e:
         return jsonify({
             "error": str(e),
@@ -93,16 +244,17 @@ def health():
     
     return jsonify({
         "status": "ok",
-        "memory_info": memory_info
+        "pid": os.getpid(),
+        "startup": startup,
+        "memory_info": memory_info,
+        "batching": scheduler.stats() if scheduler is not None else None,
+        "cache": response_cache.stats(),
+        "admission": admission.stats(),
+        "cpu_profile": CPU_PROFILE
     })
 
-if __name__ == '__main__':
-    # Używamy threaded=False dla mniejszego zużycia pamięci w przypadku małych modeli
-    app.run(host='0.0.0.0', port=API_PORT, threaded=False)
-
-# Dodanie metryk Prometheus
-from prometheus_client import Counter, Histogram, generate_latest
-import time
+# Dodanie metryk Prometheus (przed app.run - inaczej trasy i hooki nie byłyby zarejestrowane)
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess
 
 # Metryki
 REQUESTS = Counter('model_requests_total', 'Total number of requests')
@@ -110,7 +262,12 @@ PREDICTION_TIME = Histogram('model_prediction_seconds', 'Time spent processing p
 
 @app.route('/metrics', methods=['GET'])
 def metrics():
-    return generate_latest()
+    # Przy kilku workerach (prefork) metryki wszystkich procesów z katalogu PROMETHEUS_MULTIPROC_DIR
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
+    return Response(generate_latest(), mimetype=CONTENT_TYPE_LATEST)
 
 # Modyfikacja głównej funkcji predykcji, aby zbierać metryki
 @app.before_request
@@ -119,8 +276,16 @@ def before_request():
 
 @app.after_request
 def after_request(response):
-    if request.path != '/metrics' and request.path != '/health':
+    if request.path not in ('/metrics', '/health', '/ready', '/api/health'):
         REQUESTS.inc()
         if hasattr(request, 'start_time'):
             PREDICTION_TIME.observe(time.time() - request.start_time)
     return response
+
+if __name__ == '__main__':
+    if WORKER_PROFILE is not None:
+        # Model ładowany raz w tym procesie, workery (fork) dzielą strony wag i wspólne gniazdo
+        serve_prefork(app, '0.0.0.0', API_PORT, WORKER_PROFILE, load=load_scheduler, start_worker=start_worker)
+    else:
+        # Wątki obsługują żądania współbieżnie; sam model wywołuje tylko wątek planisty partii
+        app.run(host='0.0.0.0', port=API_PORT, threaded=True)
@@ -0,0 +1,148 @@
+# model-service/prefix_cache.py
+import copy
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, Optional, Sequence, Tuple
+
+import torch
+
+TokenIds = Tuple[int, ...]
+
+
+def common_prefix_length(a: Sequence[int], b: Sequence[int]) -> int:
+    n = 0
+    for x, y in zip(a, b):
+        if x != y:
+            break
+        n += 1
+    return n
+
+
+class PrefixCache:
+    """Ograniczony cache past_key_values dla wspólnych początków promptów.
+
+    Prompty z szablonów (preambuły systemowe, analiza portalu) mają długi
+    wspólny początek, a różnią się końcówką. Cache pamięta kilkadziesiąt
+    ostatnich promptów (jako tokeny); gdy nowy prompt ma z którymś wspólny
+    początek dłuższy niż `min_tokens`, stan KV tego początku jest liczony raz
+    i zapisywany. Kolejne prompty z tym początkiem liczą prefill tylko dla
+    swojej końcówki. Rozmiar ograniczony łączną liczbą tokenów (`max_tokens`),
+    usuwane są najdawniej używane wpisy.
+    """
+
+    def __init__(self, max_tokens: int = 2048, min_tokens: int = 32, history: int = 32):
+        self.max_tokens = max_tokens
+        self.min_tokens = min_tokens
+        self._entries: "OrderedDict[TokenIds, Any]" = OrderedDict()
+        self._tokens = 0
+        self._recent: Deque[TokenIds] = deque(maxlen=history)
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "inserts": 0, "evictions": 0, "reused_tokens": 0,
+                       "prefill_tokens": 0, "prefill_seconds": 0.0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_tokens > 0
+
+    def lookup(self, ids: TokenIds) -> Tuple[int, Any]:
+        """Najdłuższy zapamiętany początek ids (krótszy niż całe ids): (długość, past_key_values)"""
+        best: Optional[TokenIds] = None
+        with self._lock:
+            for prefix in self._entries:
+                if len(prefix) < len(ids) and (best is None or len(prefix) > len(best)) \
+                        and ids[:len(prefix)] == prefix:
+                    best = prefix
+            if best is None:
+                self._stats["misses"] += 1
+                return 0, None
+            self._entries.move_to_end(best)
+            self._stats["hits"] += 1
+            self._stats["reused_tokens"] += len(best)
+            return len(best), self._entries[best]
+
+    def candidate(self, ids: TokenIds, cached: int) -> int:
+        """Długość wspólnego początku z niedawnym promptem wartego zapamiętania (0 = brak)"""
+        with self._lock:
+            best = max((common_prefix_length(ids, other) for other in self._recent), default=0)
+            self._recent.append(ids)
+        # Co najmniej jeden token musi zostać do policzenia w generate(); nowy wpis musi
+        # wydłużać już zapamiętany początek o min_tokens, inaczej tylko dubluje pamięć
+        best = min(best, len(ids) - 1)
+        if best - cached < self.min_tokens or best > self.max_tokens:
+            return 0
+        return best
+
+    def store(self, prefix: TokenIds, past_key_values: Any) -> None:
+        with self._lock:
+            if prefix in self._entries:
+                return
+            self._entries[prefix] = past_key_values
+            self._tokens += len(prefix)
+            self._stats["inserts"] += 1
+            while self._tokens > self.max_tokens and self._entries:
+                old, _ = self._entries.popitem(last=False)
+                self._tokens -= len(old)
+                self._stats["evictions"] += 1
+
+    def record_prefill(self, tokens: int, seconds: float) -> None:
+        with self._lock:
+            self._stats["prefill_tokens"] += tokens
+            self._stats["prefill_seconds"] += seconds
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+            stats["cached_tokens"] = self._tokens
+        stats["prefill_seconds"] = round(stats["prefill_seconds"], 3)
+        return stats
+
+
+def _forward(model, input_ids, past_key_values=None):
+    return model(input_ids=input_ids, past_key_values=past_key_values, use_cache=True).past_key_values
+
+
+def _reusable(past_key_values):
+    # Krotki tensorów (transformers 4.x) nie są modyfikowane przez generate(); obiekty Cache - tak
+    return past_key_values if isinstance(past_key_values, tuple) else copy.deepcopy(past_key_values)
+
+
+def prefill(model, input_ids, cache: PrefixCache):
+    """past_key_values dla wszystkich tokenów promptu poza ostatnim (jedna sekwencja) albo None.
+
+    Z generate(input_ids, past_key_values=...) model liczy już tylko ostatni
+    token promptu i od razu generuje; wspólny początek jest brany z cache,
+    a policzony tu nowy wspólny początek trafia do cache.
+    """
+    if not cache.enabled or input_ids.shape[0] != 1 or input_ids.shape[1] < 2:
+        return None
+    ids: TokenIds = tuple(input_ids[0].tolist())
+    cached, past = cache.lookup(ids)
+    stored = cache.candidate(ids, cached)
+    if not cached and not stored:
+        return None
+
+    start = time.monotonic()
+    reused = cached
+    with torch.no_grad():
+        if past is not None:
+            past = _reusable(past)
+        if stored:
+            past = _forward(model, input_ids[:, cached:stored], past)
+            cache.store(ids[:stored], past)
+            past = _reusable(past)
+            cached = stored
+        if cached < len(ids) - 1:
+            past = _forward(model, input_ids[:, cached:-1], past)
+    cache.record_prefill(len(ids) - 1 - reused, time.monotonic() - start)
+    return past
+
+
+def prefix_cache_from_env() -> PrefixCache:
+    """PREFIX_CACHE_MAX_TOKENS=0 wyłącza cache"""
+    return PrefixCache(
+        max_tokens=int(os.getenv("PREFIX_CACHE_MAX_TOKENS", "2048")),
+        min_tokens=int(os.getenv("PREFIX_CACHE_MIN_TOKENS", "32"))
+    )
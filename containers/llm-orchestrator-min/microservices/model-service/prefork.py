@@ -0,0 +1,131 @@
+# model-service/prefork.py
+import gc
+import os
+import signal
+import socket
+import threading
+import time
+import traceback
+from typing import Any, Callable, Dict, Optional
+
+from werkzeug.serving import make_server
+
+from cpu_tuning import (DEFAULT_PROFILE_PATH, apply_profile, cpu_topology, load_profile, plan_profile,
+                        profile_from_env, suggest_replicas)
+
+
+def worker_profile(setting: str) -> Optional[Dict[str, Any]]:
+    """Profil CPU dla trybu prefork albo None (jeden proces).
+
+    setting to liczba workerów albo "auto": liczba replik z zapisanego profilu
+    (INFERENCE_PROFILE - detect-hardware.py lub benchmark), a bez niego
+    z rdzeni dostępnych dla kontenera (cpu_tuning.suggest_replicas).
+    Rdzenie są dzielone między workery - każdy dostaje własny zestaw.
+    """
+    setting = (setting or "1").strip().lower()
+    if setting == "auto":
+        if load_profile(os.getenv("INFERENCE_PROFILE", DEFAULT_PROFILE_PATH)) or os.getenv("INFERENCE_REPLICAS"):
+            profile = profile_from_env()
+        else:
+            topology = cpu_topology()
+            profile = plan_profile(topology, replicas=suggest_replicas(topology))
+    else:
+        workers = int(setting)
+        if workers <= 1:
+            return None
+        profile = plan_profile(cpu_topology(), replicas=workers)
+    if os.getenv("INFERENCE_THREADS"):
+        profile["intra_op_threads"] = int(os.environ["INFERENCE_THREADS"])
+    return profile if profile["replicas"] > 1 else None
+
+
+def listen(host: str, port: int, backlog: int = 128) -> socket.socket:
+    """Wspólne gniazdo nasłuchujące - workery przyjmują z niego połączenia, jądro rozdziela je między nie"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _run_worker(app, host: str, port: int, sock: socket.socket, profile: Dict[str, Any], index: int,
+                loaded: Any, start_worker: Callable[[Any, int, Dict[str, Any]], None]) -> None:
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    applied = apply_profile(profile, replica_index=index, pin=os.getenv("INFERENCE_PIN", "false").lower() == "true")
+    print(f"Worker {index} (pid {os.getpid()}): {applied}")
+    # Połączenia przyjmowane dopiero po rozgrzewce - do tego czasu czekają w kolejce gniazda
+    start_worker(loaded, index, applied)
+    make_server(host, port, app, threaded=True, fd=sock.fileno()).serve_forever()
+
+
+def serve_prefork(app, host: str, port: int, profile: Dict[str, Any], load: Callable[[], Any],
+                  start_worker: Callable[[Any, int, Dict[str, Any]], None]) -> None:
+    """Model ładowany raz w procesie głównym, potem fork profile["replicas"] workerów.
+
+    Workery dzielą strony wag z rodzicem (copy-on-write, a przy migawce mmap -
+    page cache), więc RAM nie rośnie z liczbą workerów. W trakcie ładowania
+    rodzic sam odpowiada na /health i /ready (503); przed forkiem zatrzymuje
+    serwer, bo wątki nie przechodzą do procesów potomnych. Rodzic nie liczy
+    niczego modelem - pule wątków OpenMP po forku bywają zablokowane, więc
+    rozgrzewka i planista partii startują dopiero w workerach. Worker, który
+    się zakończy, jest uruchamiany ponownie.
+    """
+    sock = listen(host, port)
+    loading_server = make_server(host, port, app, threaded=True, fd=sock.fileno())
+    loading_thread = threading.Thread(target=loading_server.serve_forever, name="prefork-loading", daemon=True)
+    loading_thread.start()
+    try:
+        loaded = load()
+    except Exception as e:
+        print(f"Błąd ładowania modelu: {e}")
+        loading_thread.join()  # /health zgłasza błąd, kontener zostanie zrestartowany
+        return
+    loading_server.shutdown()
+    loading_thread.join()
+    loading_server.server_close()  # zamyka tylko kopię deskryptora, gniazdo zostaje dla workerów
+
+    # Obiekty rodzica poza zasięgiem GC w workerach - mniej stron kopiowanych przy zapisie
+    gc.collect()
+    gc.freeze()
+
+    children: Dict[int, int] = {}
+    stopping = False
+
+    def spawn(index: int) -> None:
+        pid = os.fork()
+        if pid == 0:
+            try:
+                _run_worker(app, host, port, sock, profile, index, loaded, start_worker)
+            except Exception:
+                traceback.print_exc()
+            finally:
+                os._exit(1)
+        children[pid] = index
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for index in range(profile["replicas"]):
+        spawn(index)
+    print(f"Prefork: {profile['replicas']} workerów po {profile['intra_op_threads']} wątków, port {port}")
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        index = children.pop(pid, None)
+        if index is not None and not stopping:
+            print(f"Worker {index} (pid {pid}) zakończył się (status {status}) - uruchamiam ponownie")
+            time.sleep(1)
+            spawn(index)
@@ -1,20 +1,50 @@
 # Main API entry point for LLM Orchestrator
 # llm-orchestrator/api.py (fragment)
 
-from flask import Flask, request, jsonify
-import requests
+from flask import Flask, Response, request, jsonify
+from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
+from http_client import CircuitOpenError
+from browser_registry import BrowserRegistry, NoReplicaAvailable
 from email_utils import get_latest_token_from_email
-from send_email_utils import send_email_with_attachments
-import sqlite3
+from token_matcher import get_matcher, resolve_patterns
+from token_watcher import registry_from_env, message_matcher
+from mail_outbox import MailOutbox
+from job_queue import JobQueue, JobQueueFull, JOB_SUCCEEDED, JOB_FAILED
+from status_store import StatusStore
+from batch_fill import BatchRun, DomainRateLimiter, validate_items, stream_batch, format_ndjson, format_sse
+from llm_manager import manager_from_env
+from admission import AdmissionRejected, resolve_priority
 import os
+import re
+import time
 
 app = Flask(__name__)
 
+def _token_patterns(data):
+    """Wzorce tokenu z żądania (token_regex i/lub patterns); kompiluje je, żeby błąd był widoczny od razu"""
+    patterns = resolve_patterns(data.get('token_regex'), data.get('patterns'))
+    get_matcher(patterns)
+    return patterns
+
+
+def _since_days(data):
+    """since_days z JSON lub ?since_days= jako liczba (None = domyślne TOKEN_SEARCH_SINCE_DAYS)"""
+    value = data.get('since_days', request.args.get('since_days'))
+    if value is None or value == "":
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise ValueError("Parametr since_days musi być liczbą")
+
+
 @app.route('/get-email-token', methods=['POST'])
 def get_email_token():
     """
     Pobiera najnowszy token (np. kod 2FA) ze skrzynki email.
-    Wymaga JSON z polami: imap_server, email_user, email_pass, optional: mailbox, search_subject, token_regex
+    Wymaga JSON z polami: imap_server, email_user, email_pass,
+    optional: mailbox, search_subject, search_from, since_days, token_regex,
+    patterns (nazwy zestawów z token_matcher.PRESETS, np. ["otp6", "magic_link"])
     """
     data = request.json
     imap_server = data.get('imap_server')
@@ -22,9 +52,17 @@ def get_email_token():
     email_pass = data.get('email_pass')
     mailbox = data.get('mailbox', 'INBOX')
     search_subject = data.get('search_subject')
-    token_regex = data.get('token_regex', r'\\b\d{6}\\b')
+    search_from = data.get('search_from')
     if not (imap_server and email_user and email_pass):
         return jsonify({"error": "Brak wymaganych pól: imap_server, email_user, email_pass"}), 400
+    try:
+        since_days = _since_days(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        patterns = _token_patterns(data)
+    except re.error as e:
+        return jsonify({"error": f"Nieprawidłowy wzorzec tokenu: {e}"}), 400
     try:
         token = get_latest_token_from_email(
             imap_server=imap_server,
@@ -32,7 +70,9 @@ def get_email_token():
             email_pass=email_pass,
             mailbox=mailbox,
             search_subject=search_subject,
-            token_regex=token_regex
+            search_from=search_from,
+            since_days=since_days,
+            patterns=patterns
         )
         if token:
             return jsonify({"token": token})
@@ -42,55 +82,330 @@ def get_email_token():
         return jsonify({"error": str(e)}), 500
 
 
-# --- Lazy loading przykładowego modelu transformers ---
-from transformers import AutoModelForCausalLM, AutoTokenizer
+token_watchers = registry_from_env()
+TOKEN_WAIT_MAX_TIMEOUT = float(os.getenv("TOKEN_WAIT_MAX_TIMEOUT", "120"))
 
-model = None
-tokenizer = None
 
-MODEL_NAME = "distilgpt2"  # Możesz tu podać dowolny model dostępny publicznie
+def _imap_credentials(data):
+    imap_server = data.get('imap_server')
+    email_user = data.get('email_user')
+    email_pass = data.get('email_pass')
+    if not (imap_server and email_user and email_pass):
+        return None
+    return imap_server, email_user, email_pass, data.get('mailbox', 'INBOX')
+
+
+@app.route('/get-email-token/watch', methods=['GET', 'POST', 'DELETE'])
+def watch_email_token():
+    """
+    Rejestruje (POST) lub wyrejestrowuje (DELETE) obserwację skrzynki przez IMAP IDLE.
+    GET zwraca listę obserwowanych skrzynek.
+    """
+    if request.method == 'GET':
+        return jsonify({"watchers": token_watchers.stats()})
+    credentials = _imap_credentials(request.json or {})
+    if not credentials:
+        return jsonify({"error": "Brak wymaganych pól: imap_server, email_user, email_pass"}), 400
+    if request.method == 'DELETE':
+        if not token_watchers.unwatch(*credentials):
+            return jsonify({"error": "Skrzynka nie jest obserwowana."}), 404
+        return jsonify({"status": "stopped"})
+    try:
+        watcher = token_watchers.watch(*credentials)
+    except RuntimeError as e:
+        return jsonify({"error": str(e)}), 503
+    if not watcher.wait_ready(5) and watcher.error:
+        return jsonify({"error": watcher.error}), 502
+    return jsonify(watcher.stats())
+
+
+@app.route('/get-email-token/wait', methods=['POST'])
+def wait_email_token():
+    """
+    Long-poll: zwraca token, gdy tylko pasująca wiadomość pojawi się w skrzynce (IMAP IDLE).
+    JSON jak w /get-email-token; czas oczekiwania w parametrze ?timeout= (sekundy).
+    """
+    data = request.json or {}
+    credentials = _imap_credentials(data)
+    if not credentials:
+        return jsonify({"error": "Brak wymaganych pól: imap_server, email_user, email_pass"}), 400
+    try:
+        timeout = min(float(request.args.get('timeout', data.get('timeout', 30))), TOKEN_WAIT_MAX_TIMEOUT)
+    except (TypeError, ValueError):
+        return jsonify({"error": "Parametr timeout musi być liczbą"}), 400
+    try:
+        since_days = _since_days(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    search_subject = data.get('search_subject')
+    search_from = data.get('search_from')
+    try:
+        patterns = _token_patterns(data)
+    except re.error as e:
+        return jsonify({"error": f"Nieprawidłowy wzorzec tokenu: {e}"}), 400
+    deadline = time.monotonic() + timeout
+
+    try:
+        watcher = token_watchers.watch(*credentials)
+    except RuntimeError as e:
+        return jsonify({"error": str(e)}), 503
+    if not watcher.wait_ready(min(timeout, 10)) and watcher.error:
+        return jsonify({"error": watcher.error}), 502
+
+    try:
+        # Wiadomości, które przyszły przed rozpoczęciem oczekiwania, znajdzie zwykłe wyszukiwanie
+        after_seq = watcher.last_seq
+        imap_server, email_user, email_pass, mailbox = credentials
+        token = get_latest_token_from_email(
+            imap_server=imap_server,
+            email_user=email_user,
+            email_pass=email_pass,
+            mailbox=mailbox,
+            search_subject=search_subject,
+            search_from=search_from,
+            since_days=since_days,
+            patterns=patterns
+        )
+        if not token:
+            found = watcher.wait_for_token(
+                after_seq, message_matcher(patterns, search_subject, search_from), deadline - time.monotonic()
+            )
+            if found:
+                token, uid = found
+                token_watchers.mark_seen(watcher, uid)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    if token:
+        return jsonify({"token": token})
+    return jsonify({"error": "Nie znaleziono tokenu w zadanym czasie."}), 404
+
+# --- Rejestr modeli LLM ładowanych na żądanie (LRU, przełączanie przez selected-model.json) z cache odpowiedzi ---
+llm_manager = manager_from_env()
+
+
+def _stream_llm(prompt, max_new_tokens, temperature, model=None):
+    """Zdarzenia SSE: token (fragment tekstu), na końcu done z pełnym wynikiem albo error (slot trzyma wywołujący)"""
+    parts = []
+    try:
+        for chunk in llm_manager.stream_text(prompt, max_new_tokens=max_new_tokens, temperature=temperature,
+                                             model=model, admitted=True):
+            parts.append(chunk)
+            yield format_sse("token", {"text": chunk})
+        yield format_sse("done", {"result": prompt + "".join(parts)})
+    except Exception as e:
+        yield format_sse("error", {"error": str(e)})
 
-def get_model():
-    global model, tokenizer
-    if model is None or tokenizer is None:
-        model = AutoModelForCausalLM.from_pretrained(MODEL_NAME)
-        tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
-    return model, tokenizer
 
 @app.route('/use-llm', methods=['POST'])
 def use_llm():
-    """Przykładowy endpoint wykorzystujący lazy loading modelu LLM"""
+    """Przykładowy endpoint wykorzystujący lazy loading modelu LLM; stream=true wysyła tokeny jako SSE.
+
+    Opcjonalne pole model wybiera model z rejestru (domyślnie aktywny), a priority
+    (lub nagłówek X-Priority: interactive/background) klasę w kolejce dopuszczenia.
+    Przy pełnej kolejce odpowiedź 429 z Retry-After.
+    """
     try:
-        model, tokenizer = get_model()
         data = request.json
         prompt = data.get('prompt', "Hello, world!")
-        inputs = tokenizer(prompt, return_tensors="pt")
-        outputs = model.generate(**inputs, max_new_tokens=20)
-        result = tokenizer.decode(outputs[0], skip_special_tokens=True)
+        max_new_tokens = int(data.get('max_new_tokens', 20))
+        temperature = float(data.get('temperature', 0))
+        model = data.get('model')
+        priority = resolve_priority(data.get('priority') or request.headers.get('X-Priority'))
+        if data.get('stream') or request.args.get('stream') == 'true':
+            # Slot przed wysłaniem nagłówków, żeby pełna kolejka mogła odpowiedzieć 429
+            ticket = llm_manager.admission.acquire(priority, max_new_tokens)
+            # Zamknięcie generatora po rozłączeniu klienta przerywa generate() i zwalnia slot
+            return Response(llm_manager.admission.hold(_stream_llm(prompt, max_new_tokens, temperature, model), ticket),
+                            mimetype='text/event-stream',
+                            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+        result = prompt + llm_manager.generate_text(prompt, max_new_tokens=max_new_tokens, temperature=temperature,
+                                                    model=model, priority=priority)
         return jsonify({"result": result})
+    except AdmissionRejected as e:
+        resp = jsonify({"error": str(e)})
+        resp.status_code = 429
+        resp.headers["Retry-After"] = str(e.retry_after)
+        return resp
+    except FileNotFoundError as e:
+        return jsonify({"error": str(e)}), 404
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/use-llm/stats', methods=['GET'])
+def use_llm_stats():
+    """Stan modeli i cache odpowiedzi (trafienia, wpisy)"""
+    return jsonify(llm_manager.stats()), 200
+
+
+@app.route('/models', methods=['GET'])
+def list_models():
+    """Modele w pamięci: czas ładowania, RSS, liczba zapytań; kolejność od najdawniej używanego"""
+    return jsonify(llm_manager.registry.stats()), 200
+
+
+@app.route('/models/active', methods=['POST'])
+def select_model():
+    """Przełącza aktywny model bez restartu; JSON: {"model": nazwa}"""
+    name = (request.json or {}).get('model')
+    if not name:
+        return jsonify({"error": "Brak wymaganego pola: model"}), 400
+    try:
+        return jsonify(llm_manager.registry.select(name)), 200
+    except FileNotFoundError as e:
+        return jsonify({"error": str(e)}), 404
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+
+@app.route('/models/<path:name>', methods=['DELETE'])
+def unload_model(name):
+    """Usuwa model z pamięci (przy następnym użyciu zostanie załadowany ponownie)"""
+    if not llm_manager.registry.unload(name):
+        return jsonify({"error": "Model nie jest załadowany"}), 404
+    return jsonify(llm_manager.registry.stats()), 200
+
 @app.route('/', methods=['GET'])
 def index():
     return jsonify({"message": "LLM Orchestrator API"}), 200
 
-app = Flask(__name__)
-
 @app.route('/api/health', methods=['GET'])
 @app.route('/health', methods=['GET'])
 def health():
     return jsonify({"status": "ok"}), 200
 
+
+@app.route('/browser-replicas', methods=['GET'])
+def browser_replicas():
+    """Stan replik browser-service: zdrowie, obciążenie, bezpieczniki"""
+    return jsonify(browser_registry.stats()), 200
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(generate_latest(), mimetype=CONTENT_TYPE_LATEST)
+
+# Statusy formularzy: jedno połączenie WAL + wątek zapisujący paczkami
+status_store = StatusStore(os.getenv("FORMS_DB_PATH", "form_status.db"))
+
+
+def save_form_status(form_url, notify_email, status_code, details):
+    status_store.record(form_url, notify_email, status_code, details)
+
+
+# Powiadomienia email wysyłane w tle (jedna sesja SMTP na paczkę, ponowienia z opóźnieniem)
+mail_outbox = MailOutbox(
+    os.getenv("OUTBOX_DB_PATH", "mail_outbox.db"),
+    max_attempts=int(os.getenv("OUTBOX_MAX_ATTEMPTS", "6")),
+    backoff=float(os.getenv("OUTBOX_BACKOFF", "30"))
+)
+mail_outbox.start()
+
+
+# Kolejka zadań wypełniania formularzy (trwała, obsługiwana przez ograniczoną pulę wątków)
+FILL_FORM_WORKERS = int(os.getenv("FILL_FORM_WORKERS", "16"))
+FILL_FORM_SYNC_TIMEOUT = float(os.getenv("FILL_FORM_SYNC_TIMEOUT", "90"))
+
+jobs = JobQueue(
+    os.getenv("JOBS_DB_PATH", "jobs.db"),
+    workers=FILL_FORM_WORKERS,
+    max_pending=int(os.getenv("JOBS_MAX_PENDING", "1000")),
+    retention_hours=float(os.getenv("JOBS_RETENTION_HOURS", "24"))
+)
+
+
+# Repliki browser-service (DNS usługi lub BROWSER_SERVICE_URLS); każda ma własny
+# klient z pulą keep-alive, ponowieniami i bezpiecznikiem
+browser_registry = BrowserRegistry.from_env(client_options={
+    "retries": int(os.getenv("BROWSER_RETRIES", "2")),
+    "timeout": 60,
+    "failure_threshold": int(os.getenv("BROWSER_CIRCUIT_THRESHOLD", "5")),
+    "reset_timeout": float(os.getenv("BROWSER_CIRCUIT_RESET", "30"))
+})
+browser_registry.start()
+BROWSER_ACQUIRE_TIMEOUT = float(os.getenv("BROWSER_ACQUIRE_TIMEOUT", "30"))
+
+
+def process_fill_form(payload):
+    """Wypełnia formularz przez browser-service; wykonywane w wątku roboczym kolejki"""
+    form_url = payload.get('form_url')
+    cv_path = payload.get('cv_path')
+    upload_files = payload.get('upload_files', {})
+    notify_email = payload.get('notify_email')
+
+    # Rozpocznij wypełnianie formularza w przeglądarce
+    try:
+        with browser_registry.lease(BROWSER_ACQUIRE_TIMEOUT) as replica:
+            response = replica.client.post(
+                "/fill-form",
+                json={
+                    "form_url": form_url,
+                    "cv_path": cv_path,
+                    "upload_files": upload_files
+                },
+                timeout=60
+            )
+    except (CircuitOpenError, NoReplicaAvailable) as e:
+        return 503, {"status": "error", "message": str(e)}
+
+    # Zapisz status do bazy sqlite (podsumowania)
+    save_form_status(form_url, notify_email, response.status_code, response.text)
+
+    # Jeśli podano email, podsumowanie i ew. załączniki trafiają do skrzynki nadawczej
+    if notify_email:
+        subject = f"Podsumowanie zgłoszenia: {form_url}"
+        body = f"Status: {response.status_code}\nSzczegóły: {response.text}"
+        attachments = [cv_path] if os.path.exists(cv_path) else None
+        try:
+            mail_outbox.enqueue(notify_email, subject, body, attachments)
+        except Exception as mailerr:
+            # Nie przerywaj procesu, tylko loguj błąd zapisu maila
+            print(f"Błąd zapisu email do skrzynki nadawczej: {mailerr}")
+
+    if response.status_code == 200:
+        return 200, {
+            "status": "success",
+            "message": "Formularz został wypełniony pomyślnie",
+            "details": response.json()
+        }
+    return response.status_code, {
+        "status": "error",
+        "message": f"Błąd podczas wypełniania formularza: {response.text}"
+    }
+
+
+jobs.register("fill_form", process_fill_form)
+jobs.start()
+
+
+def _wants_wait(data):
+    """Czekanie na wynik (opcjonalne): pole "wait" w JSON lub ?wait=true; domyślnie od razu 202 z id zadania"""
+    if "wait" in data:
+        return bool(data["wait"])
+    return request.args.get("wait", "").lower() in ("1", "true", "yes")
+
+
+def _job_accepted(job_id):
+    """Odpowiedź 202 Accepted z adresem do odpytywania stanu zadania"""
+    status_url = f"/jobs/{job_id}"
+    resp = jsonify({"status": "queued", "job_id": job_id, "status_url": status_url})
+    resp.status_code = 202
+    resp.headers["Location"] = status_url
+    return resp
+
+
 @app.route('/fill-form', methods=['POST'])
 def fill_form():
-    """Endpoint do wypełniania formularzy (używany przez testy)"""
+    """Endpoint do wypełniania formularzy (używany przez testy)
+
+    Każde zgłoszenie trafia do kolejki zadań i endpoint od razu zwraca 202
+    z id zadania (stan pod /jobs/<id>). Z ?wait=true (lub "wait": true) czeka
+    na wynik maksymalnie FILL_FORM_SYNC_TIMEOUT sekund.
+    """
     try:
-        data = request.json
+        data = request.json or {}
         form_url = data.get('form_url')
         cv_path = data.get('cv_path')
-        upload_files = data.get('upload_files', {})
-        notify_email = data.get('notify_email')
 
         # Sprawdź wymagane pola
         if not form_url or not cv_path:
@@ -99,70 +414,119 @@ def fill_form():
                 "message": "Brak wymaganych pól: form_url, cv_path"
             }), 400
 
-        # Rozpocznij wypełnianie formularza w przeglądarce
-        response = requests.post(
-            "http://browser-service:5001/fill-form",
-            json={
+        try:
+            job_id = jobs.submit("fill_form", {
                 "form_url": form_url,
                 "cv_path": cv_path,
-                "upload_files": upload_files
-            },
-            timeout=60
-        )
-
-        # Zapisz status do bazy sqlite (podsumowania)
-        save_form_status(form_url, notify_email, response.status_code, response.text)
-
-        # Jeśli podano email, wyślij podsumowanie i ew. załączniki
-        if notify_email:
-            subject = f"Podsumowanie zgłoszenia: {form_url}"
-            body = f"Status: {response.status_code}\nSzczegóły: {response.text}"
-            attachments = [cv_path] if os.path.exists(cv_path) else None
-            try:
-                send_email_with_attachments(notify_email, subject, body, attachments)
-            except Exception as mailerr:
-                # Nie przerywaj procesu, tylko loguj błąd wysyłki maila
-                print(f"Błąd wysyłki email: {mailerr}")
-
-        if response.status_code == 200:
-            return jsonify({
-                "status": "success",
-                "message": "Formularz został wypełniony pomyślnie",
-                "details": response.json()
+                "upload_files": data.get('upload_files', {}),
+                "notify_email": data.get('notify_email')
             })
-        else:
-            return jsonify({
-                "status": "error",
-                "message": f"Błąd podczas wypełniania formularza: {response.text}"
-            }), response.status_code
+        except JobQueueFull as e:
+            resp = jsonify({"status": "error", "message": str(e)})
+            resp.status_code = 503
+            resp.headers["Retry-After"] = "5"
+            return resp
+
+        if not _wants_wait(data):
+            return _job_accepted(job_id)
+
+        job = jobs.wait(job_id, FILL_FORM_SYNC_TIMEOUT)
+        if job["status"] not in (JOB_SUCCEEDED, JOB_FAILED):
+            # Nie zdążyło się wykonać - klient może dalej odpytywać zadanie
+            return _job_accepted(job_id)
+        return jsonify(job["result"]), job["status_code"]
     except Exception as e:
         return jsonify({
             "status": "error",
             "message": f"Wystąpił błąd: {str(e)}"
         }), 500
 
-def save_form_status(form_url, notify_email, status_code, details):
-    db_path = os.getenv("FORMS_DB_PATH", "form_status.db")
-    conn = sqlite3.connect(db_path)
-    c = conn.cursor()
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS form_status (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            form_url TEXT,
-            notify_email TEXT,
-            status_code INTEGER,
-            details TEXT,
-            ts DATETIME DEFAULT CURRENT_TIMESTAMP
+
+# Partie formularzy: równoległość per partia i wspólny limit zgłoszeń per domena
+BATCH_PARALLELISM = int(os.getenv("BATCH_PARALLELISM", "8"))
+batch_limiter = DomainRateLimiter(float(os.getenv("BATCH_DOMAIN_INTERVAL", "2.0")))
+
+
+@app.route('/fill-form/batch', methods=['POST'])
+def fill_form_batch():
+    """Wypełnia listę formularzy i strumieniuje wynik każdej pozycji po jej zakończeniu
+
+    JSON: {"items": [{form_url, cv_path, upload_files, notify_email} | "url", ...],
+    opcjonalnie domyślne cv_path/upload_files/notify_email oraz parallelism}.
+    Odpowiedź: NDJSON (domyślnie) lub SSE (Accept: text/event-stream albo ?format=sse).
+    """
+    data = request.json or {}
+    try:
+        items = validate_items(data.get('items'), data)
+        try:
+            parallelism = int(data.get('parallelism', BATCH_PARALLELISM))
+        except (TypeError, ValueError):
+            raise ValueError("Pole parallelism musi być liczbą całkowitą")
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    parallelism = max(1, min(parallelism, FILL_FORM_WORKERS))
+
+    run = BatchRun(jobs, batch_limiter, items, parallelism)
+    if request.args.get('format') == 'sse' or 'text/event-stream' in request.headers.get('Accept', ''):
+        return Response(stream_batch(run, format_sse), mimetype='text/event-stream',
+                        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    return Response(stream_batch(run, format_ndjson), mimetype='application/x-ndjson')
+
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Zwraca stan zadania z kolejki (queued, running, succeeded, failed)"""
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"status": "error", "message": f"Nie znaleziono zadania {job_id}"}), 404
+    return jsonify(job), 200
+
+@app.route('/form-status', methods=['GET'])
+def list_form_status():
+    """Historia statusów formularzy (od najnowszych)
+
+    Filtry: form_url, notify_email, domain, status_code, since, until (ISO 8601).
+    Paginacja po kluczu: limit (max 500) i cursor z pola next_cursor poprzedniej strony.
+    """
+    try:
+        args = request.args
+        limit = min(max(int(args.get('limit', 50)), 1), 500)
+        status_code = args.get('status_code')
+        rows, next_cursor = status_store.query(
+            form_url=args.get('form_url'),
+            notify_email=args.get('notify_email') or args.get('email'),
+            domain=args.get('domain'),
+            status_code=int(status_code) if status_code else None,
+            since=args.get('since'),
+            until=args.get('until'),
+            limit=limit,
+            cursor=args.get('cursor')
         )
-    """)
-    c.execute("INSERT INTO form_status (form_url, notify_email, status_code, details) VALUES (?, ?, ?, ?)",
-              (form_url, notify_email, status_code, details))
-    conn.commit()
-    conn.close()
+    except ValueError as e:
+        return jsonify({"status": "error", "message": f"Nieprawidłowy parametr: {str(e)}"}), 400
+    return jsonify({"items": rows, "next_cursor": next_cursor}), 200
 
-if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=False, use_reloader=False)
 
+@app.route('/form-status/<int:status_id>', methods=['GET'])
+def get_form_status(status_id):
+    row = status_store.get(status_id)
+    if row is None:
+        return jsonify({"status": "error", "message": f"Nie znaleziono wpisu {status_id}"}), 404
+    return jsonify(row), 200
+
+
+@app.route('/form-status/stats', methods=['GET'])
+def form_status_stats():
+    """Odsetek udanych zgłoszeń (2xx) per domena per godzina w zadanym przedziale czasu"""
+    try:
+        buckets = status_store.stats(
+            since=request.args.get('since'),
+            until=request.args.get('until'),
+            domain=request.args.get('domain')
+        )
+    except ValueError as e:
+        return jsonify({"status": "error", "message": f"Nieprawidłowy parametr: {str(e)}"}), 400
+    return jsonify({"buckets": buckets}), 200
 
 
 @app.route('/execute_command', methods=['POST'])
@@ -188,14 +552,15 @@ def execute_command():
         # Obsługa różnych komend
         if action == 'fill_form':
             url = params.get('url')
-            if url:
-                # Wywołanie funkcji wypełniania formularza
-                form_result = fill_form(url, params.get('cv_path'))
-                response["details"] = form_result
-                response["message"] = f"Form at {url} filled successfully"
+            cv_path = params.get('cv_path')
+            if url and cv_path:
+                # Wypełnianie formularza trafia do kolejki zadań
+                job_id = jobs.submit("fill_form", {"form_url": url, "cv_path": cv_path})
+                response["details"] = {"job_id": job_id, "status_url": f"/jobs/{job_id}"}
+                response["message"] = f"Form at {url} queued for filling"
             else:
                 response["success"] = False
-                response["message"] = "URL is required for fill_form action"
+                response["message"] = "URL and cv_path are required for fill_form action"
 
         elif action == 'run_test':
             # Wywołanie funkcji uruchamiania testów
@@ -245,7 +610,7 @@ def execute_command():
         elif action == 'help':
             # Zwracanie listy dostępnych komend
             commands = [
-                {"name": "fill_form", "description": "Fill a form at the specified URL", "params": ["url"]},
+                {"name": "fill_form", "description": "Fill a form at the specified URL", "params": ["url", "cv_path"]},
                 {"name": "run_test", "description": "Run tests for the system"},
                 {"name": "show_status", "description": "Show current system status"},
                 {"name": "list_forms", "description": "List available forms/applications"},
@@ -268,4 +633,8 @@ def execute_command():
         return jsonify({
             "success": False,
             "message": f"Error executing command: {str(e)}"
-        }), 500
\ No newline at end of file
+        }), 500
+
+
+if __name__ == '__main__':
+    app.run(host='0.0.0.0', port=5000, debug=False, use_reloader=False)
@@ -0,0 +1,151 @@
+# llm-orchestrator/batch_fill.py
+import json
+import queue
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+from job_queue import JobQueue, JobQueueFull, JOB_SUCCEEDED
+from status_store import url_domain
+
+
+class DomainRateLimiter:
+    """Minimalny odstęp między zgłoszeniami do tej samej domeny (wspólny dla wszystkich partii)"""
+
+    def __init__(self, interval: float = 2.0):
+        self.interval = interval
+        self._next_slot: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def try_acquire(self, domain: Optional[str]) -> float:
+        """Rezerwuje slot dla domeny; zwraca 0, gdy się udało, albo liczbę sekund do wolnego slotu"""
+        if not domain or self.interval <= 0:
+            return 0.0
+        now = time.monotonic()
+        with self._lock:
+            ready_at = self._next_slot.get(domain, 0.0)
+            if ready_at > now:
+                return ready_at - now
+            self._next_slot[domain] = now + self.interval
+            return 0.0
+
+
+class BatchRun:
+    """Jedna partia formularzy: wysyła pozycje do kolejki zadań z ograniczoną
+    równoległością i limitem per domena, a wyniki oddaje w kolejności kończenia."""
+
+    def __init__(self, jobs: JobQueue, limiter: DomainRateLimiter, items: List[Dict[str, Any]], parallelism: int):
+        self.jobs = jobs
+        self.limiter = limiter
+        self.items = items
+        self.parallelism = max(1, parallelism)
+        self._results: "queue.Queue[Dict[str, Any]]" = queue.Queue()
+        self._slots = threading.Semaphore(self.parallelism)
+        self._cancelled = threading.Event()
+
+    def cancel(self) -> None:
+        """Przerywa wysyłanie kolejnych pozycji (np. po rozłączeniu klienta)"""
+        self._cancelled.set()
+
+    def results(self) -> Iterator[Dict[str, Any]]:
+        """Uruchamia partię i zwraca wynik każdej pozycji zaraz po jej zakończeniu"""
+        dispatcher = threading.Thread(target=self._dispatch, name="batch-dispatch", daemon=True)
+        dispatcher.start()
+        for _ in range(len(self.items)):
+            yield self._results.get()
+
+    def _dispatch(self) -> None:
+        pending = list(enumerate(self.items))
+        while pending:
+            self._slots.acquire()
+            if self._cancelled.is_set():
+                self._slots.release()
+                return
+            # Pierwsza pozycja, której domena ma wolny slot; pozostałe czekają w kolejce
+            wait = None
+            for pos, (index, item) in enumerate(pending):
+                delay = self.limiter.try_acquire(url_domain(item["form_url"]))
+                if delay == 0:
+                    pending.pop(pos)
+                    self._submit(index, item)
+                    break
+                wait = delay if wait is None else min(wait, delay)
+            else:
+                self._slots.release()
+                time.sleep(min(wait, 1.0))
+
+    def _submit(self, index: int, item: Dict[str, Any]) -> None:
+        def on_done(job: Dict[str, Any]) -> None:
+            self._slots.release()
+            self._results.put(self._item_result(index, item, job))
+
+        try:
+            self.jobs.submit("fill_form", item, on_done=on_done)
+        except JobQueueFull as e:
+            self._slots.release()
+            self._results.put({
+                "index": index,
+                "form_url": item["form_url"],
+                "status": "error",
+                "status_code": 503,
+                "message": str(e)
+            })
+
+    @staticmethod
+    def _item_result(index: int, item: Dict[str, Any], job: Dict[str, Any]) -> Dict[str, Any]:
+        result = job.get("result") or {}
+        return {
+            "index": index,
+            "form_url": item["form_url"],
+            "job_id": job["job_id"],
+            "status": "success" if job["status"] == JOB_SUCCEEDED else "error",
+            "status_code": job["status_code"],
+            "message": result.get("message"),
+            "details": result.get("details"),
+        }
+
+
+def validate_items(items: Any, defaults: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Uzupełnia pozycje wartościami domyślnymi partii i sprawdza wymagane pola"""
+    if not isinstance(items, list) or not items:
+        raise ValueError("Pole items musi być niepustą listą")
+    normalized = []
+    for i, raw in enumerate(items):
+        if isinstance(raw, str):
+            raw = {"form_url": raw}
+        if not isinstance(raw, dict):
+            raise ValueError(f"Pozycja {i}: oczekiwano obiektu lub adresu URL")
+        item = {
+            "form_url": raw.get("form_url"),
+            "cv_path": raw.get("cv_path", defaults.get("cv_path")),
+            "upload_files": raw.get("upload_files", defaults.get("upload_files", {})),
+            "notify_email": raw.get("notify_email", defaults.get("notify_email")),
+        }
+        if not item["form_url"] or not item["cv_path"]:
+            raise ValueError(f"Pozycja {i}: brak wymaganych pól form_url, cv_path")
+        normalized.append(item)
+    return normalized
+
+
+def format_ndjson(event: str, payload: Dict[str, Any]) -> str:
+    return json.dumps(payload, ensure_ascii=False) + "\n"
+
+
+def format_sse(event: str, payload: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+
+def stream_batch(run: BatchRun, fmt=format_ndjson) -> Iterator[str]:
+    """Strumień wyników partii zakończony podsumowaniem"""
+    succeeded = failed = 0
+    try:
+        for result in run.results():
+            if result["status"] == "success":
+                succeeded += 1
+            else:
+                failed += 1
+            yield fmt("item", result)
+        yield fmt("done", {"done": True, "total": len(run.items), "succeeded": succeeded, "failed": failed})
+    finally:
+        # Klient się rozłączył albo partia się skończyła - nie wysyłaj kolejnych pozycji
+        run.cancel()
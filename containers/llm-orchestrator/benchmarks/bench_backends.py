@@ -0,0 +1,71 @@
+# llm-orchestrator/benchmarks/bench_backends.py
+"""Pamięć i tokeny/s backendów LLM: transformers (float32) vs llama.cpp (GGUF q4, mmap).
+
+Każdy model jest ładowany w osobnym procesie (pomiar RSS nie miesza się
+między backendami), a następnie generuje --tokens tokenów dla kilku promptów
+dekodowaniem zachłannym.
+
+Użycie: python benchmarks/bench_backends.py TinyLlama/TinyLlama-1.1B-Chat-v1.0 tiny-llama-1b-gguf
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+PROMPTS = [
+    "Opisz w dwóch zdaniach, jak wypełnić formularz aplikacyjny.",
+    "List the fields usually found in a job application form.",
+    "Jakie dokumenty dołącza się zwykle do aplikacji o pracę?",
+]
+
+
+def _measure(model_name, tokens, results):
+    import psutil
+    from llm_backends import create_backend
+
+    process = psutil.Process()
+    rss_before = process.memory_info().rss
+    start = time.perf_counter()
+    backend = create_backend(model_name)
+    backend.load()
+    load_seconds = time.perf_counter() - start
+    backend.generate(PROMPTS[0], 4, 0.0, 1.0)  # rozgrzewka
+
+    generated = 0
+    start = time.perf_counter()
+    for prompt in PROMPTS:
+        generated += sum(1 for _ in backend.stream(prompt, tokens, 0.0, 1.0))
+    elapsed = time.perf_counter() - start
+    results.put({
+        "model": model_name,
+        "backend": backend.name,
+        "load_s": load_seconds,
+        "rss_mb": (process.memory_info().rss - rss_before) / 2 ** 20,
+        "tokens_per_s": generated / elapsed,
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark backendów LLM")
+    parser.add_argument("models", nargs="+", help="nazwy modeli HF lub GGUF (np. phi-2-q4-gguf)")
+    parser.add_argument("--tokens", type=int, default=64)
+    args = parser.parse_args()
+
+    results = multiprocessing.Queue()
+    print(f"{'model':40} {'backend':10} {'ładowanie s':>12} {'RSS MB':>9} {'tok/s':>8}")
+    for model_name in args.models:
+        worker = multiprocessing.Process(target=_measure, args=(model_name, args.tokens, results))
+        worker.start()
+        worker.join()
+        if worker.exitcode != 0:
+            print(f"{model_name:40} błąd (kod {worker.exitcode})")
+            continue
+        r = results.get()
+        print(f"{r['model'][:40]:40} {r['backend']:10} {r['load_s']:12.1f} {r['rss_mb']:9.0f} {r['tokens_per_s']:8.1f}")
+
+
+if __name__ == "__main__":
+    main()
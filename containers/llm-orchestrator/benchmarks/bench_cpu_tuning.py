@@ -0,0 +1,119 @@
+# llm-orchestrator/benchmarks/bench_cpu_tuning.py
+"""Przegląd ustawień wykonania na CPU: liczba replik x wątki na replikę, z przypięciem do rdzeni.
+
+Dla każdej konfiguracji uruchamia R procesów (replik), każdy przypięty do
+własnego zestawu rdzeni fizycznych (cpu_tuning.plan_profile) z T wątkami
+torch/OpenMP, ładuje model i przez --seconds sekund generuje odpowiedzi.
+Wynik: łączne tokeny/s hosta i mediana czasu odpowiedzi. Najlepszy profil
+(wg --objective) trafia do hardware-info.json pod kluczem inference_profile,
+skąd czytają go model-service i orchestrator (INFERENCE_PROFILE).
+
+Użycie: python benchmarks/bench_cpu_tuning.py --model distilgpt2 --output /app/config/hardware-info.json
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from cpu_tuning import DEFAULT_PROFILE_PATH, apply_profile, cpu_topology, plan_profile, usable_cores  # noqa: E402
+
+PROMPT = "Wypełniając formularz aplikacyjny na portalu pracy, należy najpierw"
+
+
+def _replica(profile, index, model_name, tokens, seconds, barrier, results):
+    apply_profile(profile, replica_index=index, pin=True)
+    from llm_backends import create_backend
+    backend = create_backend(model_name, n_threads=profile["intra_op_threads"])
+    backend.load()
+    backend.generate(PROMPT, 4, 0.0, 1.0)  # rozgrzewka
+    barrier.wait()
+
+    latencies = []
+    generated = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        generated += sum(1 for _ in backend.stream(PROMPT, tokens, 0.0, 1.0))
+        latencies.append(time.perf_counter() - start)
+    results.put((generated, latencies))
+
+
+def run_config(profile, model_name, tokens, seconds):
+    ctx = multiprocessing.get_context("spawn")
+    barrier = ctx.Barrier(profile["replicas"] + 1)
+    results = ctx.Queue()
+    workers = [ctx.Process(target=_replica, args=(profile, i, model_name, tokens, seconds, barrier, results))
+               for i in range(profile["replicas"])]
+    for worker in workers:
+        worker.start()
+    barrier.wait()
+    start = time.perf_counter()
+    outcomes = [results.get() for _ in workers]
+    elapsed = time.perf_counter() - start
+    for worker in workers:
+        worker.join()
+    latencies = [latency for _, lats in outcomes for latency in lats]
+    return {
+        "tokens_per_second": round(sum(generated for generated, _ in outcomes) / elapsed, 1),
+        "p50_latency_s": round(statistics.median(latencies), 3) if latencies else None,
+    }
+
+
+def candidates(topology):
+    """Wszystkie podziały rdzeni: T wątków na replikę, R = rdzenie // T replik, plus jedna replika z T wątkami"""
+    cores = usable_cores(topology)
+    threads = sorted({t for t in (1, 2, 4, 6, 8, 12, 16, 24, 32) if t <= cores} | {cores})
+    configs = []
+    for t in threads:
+        configs.append((1, t))
+        if cores // t > 1:
+            configs.append((cores // t, t))
+    return configs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Przegląd wątków i replik dla inferencji na CPU")
+    parser.add_argument("--model", default=os.getenv("LLM_MODEL_NAME", "distilgpt2"))
+    parser.add_argument("--tokens", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=20)
+    parser.add_argument("--objective", choices=["throughput", "latency"], default="throughput")
+    parser.add_argument("--output", default=os.getenv("INFERENCE_PROFILE", DEFAULT_PROFILE_PATH))
+    args = parser.parse_args()
+
+    topology = cpu_topology()
+    print(f"Rdzenie fizyczne: {len(topology['cores'])}, procesory logiczne: {len(topology['logical_cpus'])}, "
+          f"limit cgroup: {topology['cpu_quota']}")
+    print(f"{'repliki':>8} {'wątki':>6} {'tok/s':>9} {'p50 s':>8}")
+    sweep = []
+    for replicas, threads in candidates(topology):
+        profile = plan_profile(topology, replicas=replicas, threads=threads)
+        result = run_config(profile, args.model, args.tokens, args.seconds)
+        sweep.append({**profile, **result})
+        print(f"{replicas:>8} {threads:>6} {result['tokens_per_second']:>9.1f} {result['p50_latency_s']:>8}")
+
+    if args.objective == "throughput":
+        best = max(sweep, key=lambda r: r["tokens_per_second"])
+    else:
+        best = min(sweep, key=lambda r: r["p50_latency_s"])
+    best = dict(best, source="benchmark", model=args.model, objective=args.objective)
+
+    try:
+        with open(args.output) as f:
+            info = json.load(f)
+    except (OSError, ValueError):
+        info = {}
+    info["inference_profile"] = best
+    info["inference_sweep"] = sweep
+    with open(args.output, "w") as f:
+        json.dump(info, f, indent=2)
+    print(f"Najlepszy profil ({args.objective}): {best['replicas']} x {best['intra_op_threads']} wątków "
+          f"-> {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+# llm-orchestrator/benchmarks/bench_smtp_pool.py
+"""Przepustowość wysyłki maili: połączenie na wiadomość vs SMTPPool.
+
+Uruchamia lokalny serwer aiosmtpd (bez TLS i logowania) i mierzy
+wiadomości/s dla:
+  - legacy: nowe połączenie SMTP na każdą wiadomość (jak dawne send_email_with_attachments),
+  - SMTPPool.send z wielu wątków,
+  - SMTPPool.send_many z jednego wątku.
+
+Opcja --latency dodaje sztuczne opóźnienie odpowiedzi serwera na połączenie
+(symulacja handshake'u ze zdalnym serwerem).
+
+Użycie: pip install aiosmtpd && python benchmarks/bench_smtp_pool.py --messages 500 --threads 4
+"""
+import argparse
+import os
+import smtplib
+import sys
+import threading
+import time
+from email.mime.text import MIMEText
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from send_email_utils import SMTPPool  # noqa: E402
+
+try:
+    from aiosmtpd.controller import Controller
+    from aiosmtpd.smtp import SMTP as AioSMTP
+except ImportError:
+    Controller = None
+
+
+class CountingHandler:
+    def __init__(self):
+        self.received = 0
+
+    async def handle_DATA(self, server, session, envelope):
+        self.received += 1
+        return "250 OK"
+
+
+class SlowGreetingController(Controller if Controller else object):
+    """Serwer, który opóźnia powitanie - koszt nawiązania połączenia"""
+
+    def __init__(self, handler, latency, **kwargs):
+        super().__init__(handler, **kwargs)
+        self.latency = latency
+
+    def factory(self):
+        server = AioSMTP(self.handler)
+        if self.latency:
+            original = server._handle_client
+
+            async def delayed():
+                import asyncio
+                await asyncio.sleep(self.latency)
+                await original()
+
+            server._handle_client = delayed
+        return server
+
+
+def make_message(i):
+    msg = MIMEText("Treść testowa", "plain")
+    msg["From"] = "bench@example.com"
+    msg["To"] = f"user{i % 10}@example.com"
+    msg["Subject"] = f"Test {i}"
+    return msg
+
+
+def make_messages(count):
+    return [make_message(i) for i in range(count)]
+
+
+def bench_legacy(settings, messages):
+    start = time.perf_counter()
+    for msg in messages:
+        with smtplib.SMTP(settings["server"], settings["port"]) as server:
+            server.send_message(msg)
+    return len(messages) / (time.perf_counter() - start)
+
+
+def bench_pool_threads(settings, messages, threads):
+    pool = SMTPPool(settings, size=threads)
+    chunks = [messages[i::threads] for i in range(threads)]
+
+    def worker(chunk):
+        for msg in chunk:
+            pool.send(msg)
+
+    workers = [threading.Thread(target=worker, args=(chunk,)) for chunk in chunks]
+    start = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    rate = len(messages) / (time.perf_counter() - start)
+    pool.close()
+    return rate, pool.stats
+
+
+def bench_send_many(settings, messages):
+    pool = SMTPPool(settings, size=1)
+    start = time.perf_counter()
+    results = pool.send_many(messages)
+    rate = len(messages) / (time.perf_counter() - start)
+    pool.close()
+    return rate, sum(1 for r in results if r is not None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark puli SMTP")
+    parser.add_argument("--messages", type=int, default=300)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.0, help="Opóźnienie powitania serwera [s]")
+    parser.add_argument("--port", type=int, default=8025)
+    args = parser.parse_args()
+
+    if Controller is None:
+        sys.exit("Brak pakietu aiosmtpd: pip install aiosmtpd")
+
+    handler = CountingHandler()
+    controller = SlowGreetingController(handler, args.latency, hostname="127.0.0.1", port=args.port)
+    controller.start()
+    try:
+        settings = {"server": "127.0.0.1", "port": args.port, "user": None, "password": None,
+                    "from_email": "bench@example.com", "starttls": False}
+        messages = make_messages(args.messages)
+
+        legacy = bench_legacy(settings, messages)
+        pooled, stats = bench_pool_threads(settings, messages, args.threads)
+        many, errors = bench_send_many(settings, messages)
+
+        print(f"Wiadomości: {args.messages}, wątki: {args.threads}, opóźnienie powitania: {args.latency}s")
+        print(f"legacy (połączenie na wiadomość): {legacy:8.0f} msg/s")
+        print(f"SMTPPool.send x{args.threads} wątki:      {pooled:8.0f} msg/s  (połączeń: {stats['connects']})")
+        print(f"SMTPPool.send_many:             {many:8.0f} msg/s  (błędów: {errors})")
+        print(f"Odebrane przez serwer: {handler.received}")
+    finally:
+        controller.stop()
+
+
+if __name__ == "__main__":
+    main()
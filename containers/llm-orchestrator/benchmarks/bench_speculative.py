@@ -0,0 +1,86 @@
+# llm-orchestrator/benchmarks/bench_speculative.py
+"""Tokeny/s na CPU: zwykłe generowanie vs dekodowanie spekulatywne z modelem szkicowym.
+
+Prompty jak w PipelineGenerator (analiza portalu pracy, pipeline w JSON).
+Dla każdej liczby tokenów szkicu (--draft-tokens) raportowane są: tokeny/s,
+przyspieszenie względem samego modelu docelowego, odsetek zaakceptowanych
+tokenów szkicu i średnia liczba tokenów na przebieg modelu docelowego.
+Dekodowanie jest zachłanne, więc kolumna "zgodne" sprawdza, że wynik jest
+taki sam jak bez szkicu. Model szkicowy musi mieć ten sam słownik
+(np. gpt2-large + distilgpt2, Llama-2-7b + TinyLlama).
+
+Użycie: python benchmarks/bench_speculative.py --model gpt2-large --draft distilgpt2 --draft-tokens 2 4 6
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+PROMPTS = [
+    "Analizuję stronę internetową https://www.pracuj.pl, która wydaje się być portalem pracy.\n"
+    "Zaproponuj kroki, które pozwolą znaleźć formularz aplikacyjny, wypełnić go danymi z CV i przesłać CV.\n",
+    "Convert the following steps into a JSON pipeline with a \"steps\" list of objects with \"type\", "
+    "\"action\" and \"selector\" fields:\n1. Open the job offer\n2. Click the apply button\n"
+    "3. Fill in name, email and phone\n4. Upload the CV\n",
+    "Suggest CSS selectors for a job application form with fields: first name, last name, email, "
+    "phone, CV upload and a submit button.\n",
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark dekodowania spekulatywnego")
+    parser.add_argument("--model", default=os.getenv("LLM_MODEL_NAME", "gpt2-large"))
+    parser.add_argument("--draft", default=os.getenv("LLM_DRAFT_MODEL", "distilgpt2"))
+    parser.add_argument("--draft-tokens", type=int, nargs="+", default=[2, 4, 6])
+    parser.add_argument("--tokens", type=int, default=96)
+    args = parser.parse_args()
+
+    import torch
+    from transformers import AutoModelForCausalLM, AutoTokenizer
+
+    from cpu_tuning import configure_from_env
+    from speculative import SpeculativeStats, compatible, speculative_tokens
+
+    configure_from_env()
+    tokenizer = AutoTokenizer.from_pretrained(args.model)
+    if not compatible(tokenizer, AutoTokenizer.from_pretrained(args.draft)):
+        sys.exit(f"{args.draft} ma inny słownik niż {args.model}")
+    model = AutoModelForCausalLM.from_pretrained(args.model, low_cpu_mem_usage=True).eval()
+    draft = AutoModelForCausalLM.from_pretrained(args.draft, low_cpu_mem_usage=True).eval()
+    prompts = [tokenizer(prompt)["input_ids"] for prompt in PROMPTS]
+
+    def baseline(input_ids):
+        with torch.no_grad():
+            output = model.generate(torch.tensor([input_ids]), max_new_tokens=args.tokens, do_sample=False,
+                                    pad_token_id=tokenizer.eos_token_id)
+        return output[0, len(input_ids):].tolist()
+
+    def speculative(input_ids, k, stats):
+        return [token for chunk in speculative_tokens(model, draft, input_ids, args.tokens, num_draft_tokens=k,
+                                                      eos_token_id=tokenizer.eos_token_id, stats=stats)
+                for token in chunk]
+
+    baseline(prompts[0][:8])  # rozgrzewka
+    speculative(prompts[0][:8], 2, None)
+
+    start = time.perf_counter()
+    reference = [baseline(input_ids) for input_ids in prompts]
+    base_rate = sum(len(tokens) for tokens in reference) / (time.perf_counter() - start)
+
+    print(f"{'tryb':14} {'tok/s':>8} {'przysp.':>8} {'akceptacja':>11} {'tok/przebieg':>13} {'zgodne':>7}")
+    print(f"{'bez szkicu':14} {base_rate:8.1f} {1.0:8.2f} {'-':>11} {1.0:13.2f} {'-':>7}")
+    for k in args.draft_tokens:
+        stats = SpeculativeStats(args.model, args.draft)
+        start = time.perf_counter()
+        outputs = [speculative(input_ids, k, stats) for input_ids in prompts]
+        rate = sum(len(tokens) for tokens in outputs) / (time.perf_counter() - start)
+        summary = stats.snapshot()
+        same = sum(out == ref for out, ref in zip(outputs, reference))
+        print(f"{f'szkic k={k}':14} {rate:8.1f} {rate / base_rate:8.2f} {summary['acceptance_rate']:11.2f} "
+              f"{summary['tokens_per_pass']:13.2f} {same:>3}/{len(prompts)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+# llm-orchestrator/benchmarks/bench_status_store.py
+"""Porównanie przepustowości zapisu statusów formularzy.
+
+Mierzy inserty/s dla dotychczasowej funkcji save_form_status (nowe połączenie,
+CREATE TABLE i commit na każdy wiersz) oraz dla StatusStore (WAL + group commit)
+przy zadanej liczbie wątków piszących.
+
+Użycie: python benchmarks/bench_status_store.py --rows 5000 --threads 8
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from status_store import StatusStore  # noqa: E402
+
+
+def legacy_save_form_status(db_path, form_url, notify_email, status_code, details):
+    """Kopia save_form_status sprzed wprowadzenia StatusStore"""
+    # timeout=30 zamiast domyślnych 5 s, żeby przy wielu wątkach nie kończyło się "database is locked"
+    conn = sqlite3.connect(db_path, timeout=30)
+    c = conn.cursor()
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS form_status (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            form_url TEXT,
+            notify_email TEXT,
+            status_code INTEGER,
+            details TEXT,
+            ts DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    c.execute("INSERT INTO form_status (form_url, notify_email, status_code, details) VALUES (?, ?, ?, ?)",
+              (form_url, notify_email, status_code, details))
+    conn.commit()
+    conn.close()
+
+
+def run_threads(threads, rows, write):
+    per_thread = rows // threads
+
+    def worker(n):
+        for i in range(per_thread):
+            write(f"https://example.com/jobs/{n}/{i}", "user@example.com", 200, '{"status": "ok"}')
+
+    workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    start = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    return per_thread * threads, start
+
+
+def bench_legacy(db_path, rows, threads):
+    total, start = run_threads(
+        threads, rows, lambda *row: legacy_save_form_status(db_path, *row)
+    )
+    return total / (time.perf_counter() - start)
+
+
+def bench_store(db_path, rows, threads):
+    store = StatusStore(db_path)
+    total, start = run_threads(threads, rows, store.record)
+    store.flush()
+    elapsed = time.perf_counter() - start
+    store.close()
+    return total / elapsed
+
+
+def count_rows(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM form_status").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark zapisu form_status")
+    parser.add_argument("--rows", type=int, default=2000, help="Łączna liczba wierszy")
+    parser.add_argument("--threads", type=int, default=8, help="Liczba wątków piszących")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_db = os.path.join(tmp, "legacy.db")
+        store_db = os.path.join(tmp, "store.db")
+
+        legacy_rate = bench_legacy(legacy_db, args.rows, args.threads)
+        store_rate = bench_store(store_db, args.rows, args.threads)
+
+        print(f"Wiersze: {args.rows}, wątki: {args.threads}")
+        print(f"save_form_status (legacy): {legacy_rate:10.0f} insert/s  ({count_rows(legacy_db)} wierszy)")
+        print(f"StatusStore (WAL+batch):   {store_rate:10.0f} insert/s  ({count_rows(store_db)} wierszy)")
+        print(f"Przyspieszenie: x{store_rate / legacy_rate:.1f}")
+
+
+if __name__ == "__main__":
+    main()
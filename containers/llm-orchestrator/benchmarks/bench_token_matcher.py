@@ -0,0 +1,141 @@
+# llm-orchestrator/benchmarks/bench_token_matcher.py
+"""Wyłuskiwanie tokenów z korpusu wiadomości: regex per wywołanie vs token_matcher.
+
+Generuje korpus realistycznych wiadomości (kody 2FA po polsku i angielsku,
+linki aktywacyjne w HTML, wiadomości z portali, newslettery bez tokenu
+z numerami zamówień i datami jako "zmyłkami") i mierzy wiadomości/s dla:
+  - legacy: re.compile + search osobno dla każdego wzorca (jak dawne /get-email-token
+    wywoływane raz na wzorzec), HTML przeszukiwany jako surowe znaczniki,
+  - skompilowane raz wzorce, ale osobne przejście przez tekst dla każdego,
+  - token_matcher: skompilowana z cache alternatywa wszystkich wzorców, jedno
+    przejście przez tekst; HTML najpierw zamieniany na tekst (html_to_text).
+
+Użycie: python benchmarks/bench_token_matcher.py --messages 2000 --repeat 5
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from token_matcher import PRESETS, get_matcher, html_to_text  # noqa: E402
+
+PATTERNS = ("otp6", "magic_link", "alnum_code", "linkedin", "pracuj", "stepstone", "indeed")
+
+FILLER = (
+    "Dziękujemy za zainteresowanie naszą ofertą. Zamówienie nr {order} z dnia {date} zostało przyjęte. "
+    "W razie pytań skontaktuj się z działem obsługi klienta pod numerem +48 22 {phone}. "
+    "Thank you for applying. Your application reference is REF-{order}. "
+)
+
+
+def _filler(rng, paragraphs):
+    return "\n".join(
+        FILLER.format(order=rng.randint(10 ** 7, 10 ** 8), date=f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+                      phone=f"{rng.randint(100, 999)} {rng.randint(10, 99)} {rng.randint(10, 99)}")
+        for _ in range(paragraphs)
+    )
+
+
+def make_corpus(count, seed=42):
+    """Lista (treść, czy_html, oczekiwany_token)"""
+    rng = random.Random(seed)
+    corpus = []
+    for i in range(count):
+        kind = rng.choice(["otp_pl", "otp_en", "link_html", "portal", "alnum", "newsletter_html", "newsletter"])
+        code = f"{rng.randint(0, 999999):06d}"
+        if kind == "otp_pl":
+            body = f"Dzień dobry,\n\nTwój jednorazowy kod weryfikacyjny to: {code}\nKod jest ważny 10 minut.\n\n{_filler(rng, 2)}"
+            corpus.append((body, False, code))
+        elif kind == "otp_en":
+            body = f"Hi,\n\nUse {code} as your verification code.\n\n{_filler(rng, 3)}"
+            corpus.append((body, False, code))
+        elif kind == "link_html":
+            url = f"https://portal.example.com/account/verify?token={rng.getrandbits(64):x}"
+            body = ("<html><head><style>p{font-family:Arial}</style></head><body>"
+                    + "".join(f"<p>{p}</p>" for p in _filler(rng, 4).split("\n"))
+                    + f'<p><a href="{url}" style="color:#0a66c2">Potwierdź adres e-mail</a></p></body></html>')
+            corpus.append((body, True, url))
+        elif kind == "portal":
+            portal = rng.choice(["LinkedIn", "Pracuj.pl", "StepStone", "Indeed"])
+            body = f"{portal}\n\nTwój kod: {code}\n\n{_filler(rng, 2)}"
+            corpus.append((body, False, code))
+        elif kind == "alnum":
+            token = "".join(rng.choice("ABCDEFGHJKLMNPQRSTUVWXYZ") for _ in range(4)) + f"{rng.randint(10, 99)}"
+            body = f"Your access code is {token}. Do not share it.\n\n{_filler(rng, 1)}"
+            corpus.append((body, False, token))
+        elif kind == "newsletter_html":
+            body = ("<html><body><table>" + "".join(
+                f"<tr><td><img src=\"https://cdn.example.com/{i}.png\"></td><td>{p}</td></tr>"
+                for p in _filler(rng, 30).split("\n")) + "</table></body></html>")
+            corpus.append((body, True, None))
+        else:
+            corpus.append((_filler(rng, 20), False, None))
+    return corpus
+
+
+def bench_legacy(corpus, repeat):
+    regexes = [PRESETS[p] for p in PATTERNS]
+    start = time.perf_counter()
+    found = 0
+    for _ in range(repeat):
+        for body, _is_html, _expected in corpus:
+            best = None
+            for regex in regexes:
+                # Wewnętrzny cache modułu re ma 512 pozycji i jest czyszczony w całości po
+                # przepełnieniu - przy wielu różnych wzorcach kompilacja wraca co wywołanie
+                re.purge()
+                match = re.compile(regex).search(body)
+                if match and (best is None or match.start() < best.start()):
+                    best = match
+            found += best is not None
+    return len(corpus) * repeat / (time.perf_counter() - start), found // repeat
+
+
+def bench_precompiled(corpus, repeat):
+    """Wzorce skompilowane raz, ale nadal osobne przejście na każdy wzorzec"""
+    compiled = [re.compile(PRESETS[p]) for p in PATTERNS]
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for body, is_html, _expected in corpus:
+            text = html_to_text(body) if is_html else body
+            min((m for m in (c.search(text) for c in compiled) if m), key=lambda m: m.start(), default=None)
+    return len(corpus) * repeat / (time.perf_counter() - start)
+
+
+def bench_matcher(corpus, repeat):
+    start = time.perf_counter()
+    found = correct = 0
+    for _ in range(repeat):
+        for body, is_html, expected in corpus:
+            match = get_matcher(PATTERNS).search(html_to_text(body) if is_html else body)
+            found += match is not None
+            correct += match is not None and match.token == expected
+    return len(corpus) * repeat / (time.perf_counter() - start), found // repeat, correct // repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark wyłuskiwania tokenów")
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    corpus = make_corpus(args.messages)
+    expected = sum(1 for _, _, token in corpus if token)
+    size = sum(len(body) for body, _, _ in corpus) / len(corpus)
+
+    legacy, legacy_found = bench_legacy(corpus, args.repeat)
+    precompiled = bench_precompiled(corpus, args.repeat)
+    matcher, found, correct = bench_matcher(corpus, args.repeat)
+
+    print(f"Wiadomości: {args.messages} (średnio {size / 1024:.1f} KiB), z tokenem: {expected}, wzorce: {len(PATTERNS)}")
+    print(f"legacy (compile + search per wzorzec): {legacy:9.0f} msg/s  (dopasowań: {legacy_found})")
+    print(f"skompilowane, przejście per wzorzec: {precompiled:9.0f} msg/s")
+    print(f"token_matcher (jedno przejście):       {matcher:9.0f} msg/s  (dopasowań: {found}, poprawnych: {correct})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+# llm-orchestrator/browser_registry.py
+import itertools
+import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+import requests
+
+from http_client import ServiceClient
+
+try:
+    from prometheus_client import Gauge
+except ImportError:
+    Gauge = None
+
+if Gauge is not None:
+    REPLICA_IN_FLIGHT = Gauge("browser_replica_in_flight", "Formularze w toku na replice", ["replica"])
+    REPLICA_HEALTHY = Gauge("browser_replica_healthy", "1 gdy replika przechodzi health-check", ["replica"])
+
+
+class NoReplicaAvailable(Exception):
+    """Brak zdrowej repliki browser-service z wolnym slotem"""
+
+
+class Replica:
+    """Pojedyncza instancja browser-service z własną pulą połączeń i limitem współbieżności"""
+
+    def __init__(self, url: str, health_url: str, limit: int, client_options: Dict):
+        self.url = url.rstrip("/")
+        self.health_url = health_url
+        self.limit = limit
+        self.in_flight = 0
+        self.healthy = True
+        self.failures = 0
+        self.client = ServiceClient(self.url, name=f"browser-service@{self.url}", pool_size=limit, **client_options)
+
+    @property
+    def available(self) -> bool:
+        return self.healthy and self.in_flight < self.limit and self.client.breaker.state != "open"
+
+    def to_dict(self) -> Dict:
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "in_flight": self.in_flight,
+            "limit": self.limit,
+            "circuit": self.client.breaker.state,
+        }
+
+
+class BrowserRegistry:
+    """Rejestr replik browser-service z wyborem najmniej obciążonej repliki.
+
+    Repliki pochodzą z listy adresów (BROWSER_SERVICE_URLS) albo z rozwiązania
+    nazwy usługi w DNS - przy `docker compose up --scale browser-service=N`
+    nazwa `browser-service` wskazuje na wszystkie kontenery. Wątek w tle
+    odświeża listę i odpytuje /health każdej repliki; repliki, które nie
+    odpowiadają `eject_after` razy z rzędu, są wyłączane z ruchu.
+    """
+
+    def __init__(
+        self,
+        urls: Optional[List[str]] = None,
+        service_host: Optional[str] = None,
+        port: int = 5001,
+        health_port: int = 3000,
+        per_replica_limit: int = 2,
+        strategy: str = "least_loaded",
+        health_interval: float = 10.0,
+        eject_after: int = 2,
+        client_options: Optional[Dict] = None,
+    ):
+        self.static_urls = urls or []
+        self.service_host = service_host
+        self.port = port
+        self.health_port = health_port
+        self.per_replica_limit = per_replica_limit
+        self.strategy = strategy
+        self.health_interval = health_interval
+        self.eject_after = eject_after
+        self.client_options = client_options or {}
+        self._replicas: Dict[str, Replica] = {}
+        self._cond = threading.Condition()
+        self._rr = itertools.count()
+        self._thread: Optional[threading.Thread] = None
+        self._health_session = requests.Session()
+        self.refresh()
+
+    @classmethod
+    def from_env(cls, **kwargs) -> "BrowserRegistry":
+        urls = [u.strip() for u in os.getenv("BROWSER_SERVICE_URLS", "").split(",") if u.strip()]
+        return cls(
+            urls=urls,
+            service_host=None if urls else os.getenv("BROWSER_SERVICE_HOST", "browser-service"),
+            port=int(os.getenv("BROWSER_SERVICE_PORT", "5001")),
+            health_port=int(os.getenv("BROWSER_HEALTH_PORT", "3000")),
+            per_replica_limit=int(os.getenv("BROWSER_REPLICA_CONCURRENCY", "2")),
+            strategy=os.getenv("BROWSER_DISPATCH", "least_loaded"),
+            health_interval=float(os.getenv("BROWSER_HEALTH_INTERVAL", "10")),
+            **kwargs
+        )
+
+    def start(self) -> None:
+        """Uruchamia wątek odświeżający listę replik i ich health-check"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._health_loop, name="browser-registry", daemon=True)
+            self._thread.start()
+
+    def refresh(self) -> None:
+        """Aktualizuje listę replik (statyczna lista lub DNS)"""
+        urls = self.static_urls or self._resolve()
+        with self._cond:
+            for url in urls:
+                if url not in self._replicas:
+                    self._replicas[url] = self._new_replica(url)
+            # Usuń repliki, które zniknęły z DNS, o ile nic na nich nie działa
+            for url in list(self._replicas):
+                if url not in urls and self._replicas[url].in_flight == 0:
+                    del self._replicas[url]
+            self._cond.notify_all()
+
+    def check_health(self) -> None:
+        """Odpytuje /health każdej repliki i wyłącza niezdrowe z ruchu"""
+        with self._cond:
+            replicas = list(self._replicas.values())
+        for replica in replicas:
+            try:
+                ok = self._health_session.get(replica.health_url, timeout=2).status_code == 200
+            except requests.RequestException:
+                ok = False
+            with self._cond:
+                replica.failures = 0 if ok else replica.failures + 1
+                replica.healthy = ok or replica.failures < self.eject_after
+                self._cond.notify_all()
+            if Gauge is not None:
+                REPLICA_HEALTHY.labels(replica.url).set(1 if replica.healthy else 0)
+
+    @contextmanager
+    def lease(self, timeout: float = 30.0) -> Iterator[Replica]:
+        """Rezerwuje slot na wybranej replice na czas bloku `with`"""
+        replica = self.acquire(timeout)
+        try:
+            yield replica
+        finally:
+            self.release(replica)
+
+    def acquire(self, timeout: float = 30.0) -> Replica:
+        """Wybiera replikę z wolnym slotem; czeka do `timeout` sekund, gdy wszystkie są zajęte"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                replica = self._pick()
+                if replica is not None:
+                    replica.in_flight += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise NoReplicaAvailable(
+                        f"Brak wolnej repliki browser-service ({len(self._replicas)} zarejestrowanych)"
+                    )
+                self._cond.wait(min(remaining, 1.0))
+        if Gauge is not None:
+            REPLICA_IN_FLIGHT.labels(replica.url).inc()
+        return replica
+
+    def release(self, replica: Replica) -> None:
+        with self._cond:
+            replica.in_flight -= 1
+            self._cond.notify()
+        if Gauge is not None:
+            REPLICA_IN_FLIGHT.labels(replica.url).dec()
+
+    def stats(self) -> Dict:
+        with self._cond:
+            replicas = [r.to_dict() for r in self._replicas.values()]
+        return {
+            "strategy": self.strategy,
+            "replicas": replicas,
+            "capacity": sum(r["limit"] for r in replicas if r["healthy"]),
+        }
+
+    def _pick(self) -> Optional[Replica]:
+        candidates = [r for r in self._replicas.values() if r.available]
+        if not candidates:
+            return None
+        offset = next(self._rr)
+        if self.strategy == "round_robin":
+            return candidates[offset % len(candidates)]
+        # least_loaded: najmniejsze obciążenie względem limitu, remisy rozdzielane round-robin
+        lowest = min(r.in_flight / r.limit for r in candidates)
+        tied = [r for r in candidates if r.in_flight / r.limit == lowest]
+        return tied[offset % len(tied)]
+
+    def _new_replica(self, url: str) -> Replica:
+        host = url.split("://", 1)[-1].split("/", 1)[0].rsplit(":", 1)[0]
+        health_url = f"http://{host}:{self.health_port}/health"
+        return Replica(url, health_url, self.per_replica_limit, self.client_options)
+
+    def _resolve(self) -> List[str]:
+        try:
+            infos = socket.getaddrinfo(self.service_host, self.port, socket.AF_INET, socket.SOCK_STREAM)
+        except socket.gaierror:
+            # DNS chwilowo niedostępny - zostaw dotychczasowe repliki
+            with self._cond:
+                return list(self._replicas) or [f"http://{self.service_host}:{self.port}"]
+        return sorted({f"http://{info[4][0]}:{self.port}" for info in infos})
+
+    def _health_loop(self) -> None:
+        while True:
+            try:
+                self.refresh()
+                self.check_health()
+            except Exception as e:
+                print(f"Błąd odświeżania rejestru browser-service: {e}")
+            time.sleep(self.health_interval)
@@ -5,6 +5,8 @@ import os
 import psutil
 import GPUtil
 
+from cpu_tuning import cpu_topology, plan_profile, suggest_replicas
+
 
 def detect_hardware():
     """Wykrywa dostępny sprzęt i zwraca rekomendacje dla modeli LLM"""
@@ -67,6 +69,18 @@ def detect_hardware():
                  "best_for": "Najprostsze formularze, minimalne zasoby"}
             ]
 
+    # Profil wykonania na CPU: wątki na replikę, liczba replik i ich rdzenie
+    # (benchmarks/bench_cpu_tuning.py nadpisuje go profilem zmierzonym)
+    topology = cpu_topology()
+    model_ram_gb = None
+    if result["recommended_models"]:
+        model_ram_gb = float(result["recommended_models"][0]["ram_required"].rstrip("GB"))
+    result["cpu"]["topology"] = topology
+    result["inference_profile"] = plan_profile(
+        topology, replicas=suggest_replicas(topology, result["cpu"]["memory_gb"], model_ram_gb)
+    )
+    result["inference_profile"]["source"] = "heuristic"
+
     return result
 
 
@@ -81,4 +95,8 @@ if __name__ == "__main__":
         print(f"    Przeznaczenie: {model['purpose']}")
         print(f"    Wymagana RAM: {model['ram_required']}")
         print(f"    Najlepszy do: {model['best_for']}")
-        print()
\ No newline at end of file
+        print()
+
+    profile = hardware_info["inference_profile"]
+    print(f"Profil CPU: {profile['replicas']} replik(a) x {profile['intra_op_threads']} wątków, "
+          f"rdzenie: {profile['core_sets']}")
\ No newline at end of file
@@ -1,9 +1,27 @@
 import imaplib
-import email
 from email.header import decode_header
-import re
-from typing import Optional
+from email.message import Message
+from typing import Optional, Sequence, Union
 import os
+import time
+
+from imap_fetch import TextCache, imap_date, iter_message_texts, quote
+from imap_pool import IMAPPool, get_imap_pool
+from token_matcher import get_matcher, resolve_patterns
+
+# Treści już przeskanowanych wiadomości - kolejne odpytania nie pobierają ich ponownie
+_text_cache = TextCache(int(os.getenv("TOKEN_TEXT_CACHE_SIZE", "2048")))
+
+
+def message_subject(msg: Message) -> str:
+    """Zdekodowany temat wiadomości"""
+    parts = []
+    for value, charset in decode_header(msg.get("Subject", "")):
+        if isinstance(value, bytes):
+            value = value.decode(charset or "utf-8", errors="ignore")
+        parts.append(value)
+    return "".join(parts)
+
 
 def get_latest_token_from_email(
     imap_server: str,
@@ -11,7 +29,10 @@ def get_latest_token_from_email(
     email_pass: str,
     mailbox: str = "INBOX",
     search_subject: Optional[str] = None,
-    token_regex: str = r"\\b\d{6}\\b"
+    token_regex: Optional[str] = None,
+    search_from: Optional[str] = None,
+    since_days: Optional[float] = None,
+    patterns: Union[None, str, Sequence[str]] = None
 ) -> Optional[str]:
     """
     Pobiera najnowszy token (np. kod 2FA) ze skrzynki email.
@@ -21,32 +42,40 @@ def get_latest_token_from_email(
     :param mailbox: skrzynka (domyślnie INBOX)
     :param search_subject: opcjonalny filtr po temacie
     :param token_regex: regex do wyłuskania tokenu (domyślnie 6-cyfrowy kod)
+    :param patterns: nazwy zestawów wzorców z token_matcher.PRESETS lub regexy, sprawdzane jednym przejściem
+    :param search_from: opcjonalny filtr po nadawcy
+    :param since_days: tylko wiadomości z ostatnich N dni (domyślnie TOKEN_SEARCH_SINCE_DAYS, 0 = bez filtra daty)
     :return: token lub None
     """
-    mail = imaplib.IMAP4_SSL(imap_server)
-    mail.login(email_user, email_pass)
-    mail.select(mailbox)
-    search_criteria = '(UNSEEN)'
+    criteria = ['UNSEEN']
     if search_subject:
-        search_criteria = f'(UNSEEN SUBJECT "{search_subject}")'
-    status, messages = mail.search(None, search_criteria)
-    if status != 'OK':
+        criteria.append(f'SUBJECT {quote(search_subject)}')
+    if search_from:
+        criteria.append(f'FROM {quote(search_from)}')
+    since_days = float(os.getenv("TOKEN_SEARCH_SINCE_DAYS", "0") if since_days is None else since_days)
+    if since_days > 0:
+        # SINCE ma dokładność do dnia i działa w strefie serwera
+        criteria.append(f'SINCE {imap_date(time.time() - since_days * 86400)}')
+    search_criteria = f'({" ".join(criteria)})'
+    matcher = get_matcher(resolve_patterns(token_regex, patterns))
+    max_bytes = int(os.getenv("TOKEN_FETCH_BYTES", "16384"))
+    pool = get_imap_pool()
+    key = IMAPPool.make_key(imap_server, email_user, email_pass, mailbox)
+
+    def find_token(mail: imaplib.IMAP4) -> Optional[str]:
+        # Filtrowanie po stronie serwera, wynik jako UID-y (stałe między sesjami)
+        status, messages = mail.uid('SEARCH', None, search_criteria)
+        if status != 'OK' or not messages or not messages[0]:
+            return None
+        uids = list(reversed(messages[0].split()))
+        prefix = (key, pool.uidvalidity.get(key))
+        for uid, body in iter_message_texts(mail, uids, _text_cache, prefix, max_bytes):
+            match = matcher.search(body)
+            if match:
+                # Pobieranie odbywa się przez BODY.PEEK - przeczytana jest tylko wiadomość z tokenem
+                mail.uid('STORE', uid.decode(), '+FLAGS', '(\\Seen)')
+                return match.token
         return None
-    for num in reversed(messages[0].split()):
-        status, data = mail.fetch(num, '(RFC822)')
-        if status != 'OK':
-            continue
-        msg = email.message_from_bytes(data[0][1])
-        if msg.is_multipart():
-            for part in msg.walk():
-                if part.get_content_type() == "text/plain":
-                    body = part.get_payload(decode=True).decode(errors='ignore')
-                    break
-            else:
-                continue
-        else:
-            body = msg.get_payload(decode=True).decode(errors='ignore')
-        match = re.search(token_regex, body)
-        if match:
-            return match.group(0)
-    return None
+
+    # Sesja z puli jest już zalogowana i ma wybraną skrzynkę
+    return pool.run(imap_server, email_user, email_pass, mailbox, find_token)
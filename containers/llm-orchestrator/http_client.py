@@ -0,0 +1,220 @@
+# llm-orchestrator/http_client.py
+# Ten sam plik jest używany w containers/web-voice-api/http_client.py - zmiany wprowadzaj w obu miejscach.
+import random
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+try:
+    from prometheus_client import Counter, Gauge, Histogram
+except ImportError:  # metryki są opcjonalne (np. web-voice-api)
+    Counter = Gauge = Histogram = None
+
+IDEMPOTENT_METHODS = ("GET", "HEAD", "OPTIONS", "PUT", "DELETE")
+# Kody oznaczające przeciążenie lub chwilową niedostępność usługi
+RETRY_STATUS_CODES = (502, 503, 504)
+SATURATION_STATUS_CODES = (429, 502, 503, 504)
+
+if Histogram is not None:
+    REQUEST_LATENCY = Histogram(
+        "http_client_request_seconds", "Czas odpowiedzi usługi zależnej", ["service", "method", "outcome"]
+    )
+    REQUEST_RETRIES = Counter("http_client_retries_total", "Liczba ponowień żądań", ["service"])
+    CIRCUIT_REJECTED = Counter(
+        "http_client_circuit_rejected_total", "Żądania odrzucone przez otwarty bezpiecznik", ["service"]
+    )
+    POOL_IN_FLIGHT = Gauge("http_client_in_flight", "Żądania w toku", ["service"])
+    POOL_SIZE = Gauge("http_client_pool_size", "Rozmiar puli połączeń", ["service"])
+    CIRCUIT_OPEN = Gauge("http_client_circuit_open", "1 gdy bezpiecznik jest otwarty", ["service"])
+
+
+class CircuitOpenError(Exception):
+    """Bezpiecznik jest otwarty - usługa zależna jest przeciążona lub niedostępna"""
+
+
+class CircuitBreaker:
+    """Bezpiecznik: po `failure_threshold` kolejnych błędach odrzuca żądania przez
+    `reset_timeout` sekund, potem przepuszcza jedno żądanie próbne (half-open)."""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if time.monotonic() - self._opened_at >= self.reset_timeout:
+                return "half-open"
+            return "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.reset_timeout or self._probe_in_flight:
+                return False
+            self._probe_in_flight = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._probe_in_flight = False
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+
+class ServiceClient:
+    """Współdzielony klient HTTP do usługi zależnej.
+
+    Trzyma pulę połączeń keep-alive (requests.Session), ponawia żądania
+    z losowym opóźnieniem (full jitter) i ma bezpiecznik, który szybko odrzuca
+    żądania, gdy usługa jest przeciążona. Żądania nieidempotentne (POST)
+    są ponawiane tylko wtedy, gdy połączenie w ogóle nie zostało nawiązane.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        name: Optional[str] = None,
+        pool_size: int = 10,
+        retries: int = 2,
+        backoff: float = 0.2,
+        timeout: float = 60,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.name = name or self.base_url
+        self.pool_size = pool_size
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+
+        self.session = requests.Session()
+        # pool_block=True: przy wyczerpaniu puli czekamy na połączenie zamiast otwierać nadmiarowe
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=True)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._counters = {"requests": 0, "failures": 0, "retries": 0, "rejected": 0}
+        if Gauge is not None:
+            POOL_SIZE.labels(self.name).set(pool_size)
+
+    def get(self, path: str, **kwargs) -> requests.Response:
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path: str, **kwargs) -> requests.Response:
+        return self.request("POST", path, **kwargs)
+
+    def request(self, method: str, path: str, idempotent: Optional[bool] = None, **kwargs) -> requests.Response:
+        """Wysyła żądanie z ponowieniami; rzuca CircuitOpenError, gdy bezpiecznik jest otwarty"""
+        method = method.upper()
+        if idempotent is None:
+            idempotent = method in IDEMPOTENT_METHODS
+        kwargs.setdefault("timeout", self.timeout)
+        url = path if path.startswith("http") else f"{self.base_url}{path}"
+
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                self._count("rejected")
+                if Counter is not None:
+                    CIRCUIT_REJECTED.labels(self.name).inc()
+                raise CircuitOpenError(f"{self.name}: bezpiecznik otwarty, usługa przeciążona lub niedostępna")
+
+            self._track_in_flight(1)
+            start = time.perf_counter()
+            outcome = "error"
+            try:
+                response = self.session.request(method, url, **kwargs)
+                outcome = str(response.status_code)
+            except requests.RequestException as e:
+                self._on_failure()
+                if attempt < self.retries and (idempotent or _not_sent(e)):
+                    attempt += 1
+                    self._sleep_before_retry(attempt)
+                    continue
+                raise
+            finally:
+                self._track_in_flight(-1)
+                if Histogram is not None:
+                    REQUEST_LATENCY.labels(self.name, method, outcome).observe(time.perf_counter() - start)
+
+            if response.status_code in SATURATION_STATUS_CODES:
+                self._on_failure()
+                if idempotent and response.status_code in RETRY_STATUS_CODES and attempt < self.retries:
+                    attempt += 1
+                    response.close()
+                    self._sleep_before_retry(attempt)
+                    continue
+            else:
+                self._on_success()
+            self._count("requests")
+            return response
+
+    def stats(self) -> Dict[str, Any]:
+        """Stan puli, bezpiecznika i liczniki żądań"""
+        with self._lock:
+            stats = dict(self._counters)
+            stats["in_flight"] = self._in_flight
+        stats["pool_size"] = self.pool_size
+        stats["pool_utilization"] = round(stats["in_flight"] / self.pool_size, 3)
+        stats["circuit"] = self.breaker.state
+        return stats
+
+    def _on_success(self) -> None:
+        self.breaker.record_success()
+        if Gauge is not None:
+            CIRCUIT_OPEN.labels(self.name).set(0)
+
+    def _on_failure(self) -> None:
+        self._count("failures")
+        self.breaker.record_failure()
+        if Gauge is not None:
+            CIRCUIT_OPEN.labels(self.name).set(1 if self.breaker.state != "closed" else 0)
+
+    def _sleep_before_retry(self, attempt: int) -> None:
+        self._count("retries")
+        if Counter is not None:
+            REQUEST_RETRIES.labels(self.name).inc()
+        time.sleep(random.uniform(0, self.backoff * (2 ** (attempt - 1))))
+
+    def _track_in_flight(self, delta: int) -> None:
+        with self._lock:
+            self._in_flight += delta
+        if Gauge is not None:
+            POOL_IN_FLIGHT.labels(self.name).inc(delta)
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self._counters[key] += 1
+
+
+def _not_sent(error: requests.RequestException) -> bool:
+    """True, gdy żądanie na pewno nie dotarło do serwera (można je bezpiecznie powtórzyć)"""
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    if isinstance(error, requests.exceptions.ConnectionError) and error.args:
+        reason = getattr(error.args[0], "reason", error.args[0])
+        return isinstance(reason, NewConnectionError)
+    return False
@@ -0,0 +1,194 @@
+# llm-orchestrator/imap_fetch.py
+import base64
+import binascii
+import email
+import imaplib
+import quopri
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Iterator, List, Optional, Sequence, Tuple
+
+from token_matcher import html_to_text
+
+_MONTHS = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+_SEXP_TOKEN = re.compile(rb'\(|\)|"(?:[^"\\]|\\.)*"|[^\s()"]+')
+
+# Ile wiadomości pobierać jednym FETCH BODYSTRUCTURE
+STRUCTURE_BATCH = 10
+
+
+def imap_date(timestamp: float) -> str:
+    """Data w formacie kryterium SINCE (np. 05-Mar-2025), niezależnie od locale"""
+    t = time.gmtime(timestamp)
+    return f"{t.tm_mday:02d}-{_MONTHS[t.tm_mon - 1]}-{t.tm_year}"
+
+
+def quote(value: str) -> str:
+    """Łańcuch IMAP w cudzysłowie"""
+    return '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def parse_sexp(data: bytes) -> List[Any]:
+    """Parsuje listę IMAP w nawiasach (np. odpowiedź FETCH BODYSTRUCTURE)"""
+    stack: List[List[Any]] = [[]]
+    for match in _SEXP_TOKEN.finditer(data):
+        token = match.group(0)
+        if token == b"(":
+            stack.append([])
+        elif token == b")":
+            item = stack.pop()
+            stack[-1].append(item)
+        elif token.startswith(b'"'):
+            stack[-1].append(re.sub(rb"\\(.)", rb"\1", token[1:-1]).decode(errors="ignore"))
+        elif token.upper() == b"NIL":
+            stack[-1].append(None)
+        else:
+            stack[-1].append(token.decode(errors="ignore"))
+    if len(stack) != 1:
+        raise ValueError("Niezbalansowane nawiasy w odpowiedzi IMAP")
+    return stack[0]
+
+
+def _fetch_items(line: List[Any]) -> dict:
+    """['1', ['UID', '5', 'BODYSTRUCTURE', [...]]] -> {'UID': '5', 'BODYSTRUCTURE': [...]}"""
+    if len(line) < 2 or not isinstance(line[1], list):
+        return {}
+    items = line[1]
+    return {str(items[i]).upper(): items[i + 1] for i in range(0, len(items) - 1, 2)}
+
+
+def text_parts(structure: List[Any], number: str = "") -> Iterator[Tuple[str, str, str, Optional[str]]]:
+    """Części tekstowe z BODYSTRUCTURE: (numer części, podtyp, kodowanie, charset)"""
+    if structure and isinstance(structure[0], list):
+        # multipart: najpierw części, potem podtyp i dane rozszerzeń
+        index = 0
+        for child in structure:
+            if not isinstance(child, list):
+                break
+            index += 1
+            yield from text_parts(child, f"{number}.{index}" if number else str(index))
+        return
+    if len(structure) < 6 or not isinstance(structure[0], str):
+        return
+    if structure[0].lower() != "text":
+        return
+    params = structure[2] if isinstance(structure[2], list) else []
+    charset = None
+    for key, value in zip(params[::2], params[1::2]):
+        if str(key).lower() == "charset":
+            charset = value
+    yield number or "1", str(structure[1]).lower(), str(structure[5] or "7bit").lower(), charset
+
+
+def decode_part(raw: bytes, encoding: str, charset: Optional[str]) -> str:
+    """Dekoduje (być może uciętą) treść części według Content-Transfer-Encoding"""
+    if encoding == "base64":
+        compact = b"".join(raw.split())
+        try:
+            raw = base64.b64decode(compact[:len(compact) // 4 * 4])
+        except binascii.Error:
+            return ""
+    elif encoding == "quoted-printable":
+        raw = quopri.decodestring(raw)
+    try:
+        return raw.decode(charset or "utf-8", errors="ignore")
+    except LookupError:
+        return raw.decode("utf-8", errors="ignore")
+
+
+class TextCache:
+    """LRU treści już przeskanowanych wiadomości, kluczowane (skrzynka, UIDVALIDITY, UID)"""
+
+    def __init__(self, size: int = 2048):
+        self.size = size
+        self._items: "OrderedDict[Hashable, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[str]:
+        with self._lock:
+            text = self._items.get(key)
+            if text is not None:
+                self._items.move_to_end(key)
+            return text
+
+    def put(self, key: Hashable, text: str) -> None:
+        with self._lock:
+            self._items[key] = text
+            self._items.move_to_end(key)
+            while len(self._items) > self.size:
+                self._items.popitem(last=False)
+
+
+def fetch_structures(imap: imaplib.IMAP4, uids: Sequence[bytes]) -> dict:
+    """BODYSTRUCTURE wielu wiadomości jednym zapytaniem: {uid: struktura}"""
+    status, data = imap.uid("FETCH", b",".join(uids).decode(), "(UID BODYSTRUCTURE)")
+    structures = {}
+    if status != "OK":
+        return structures
+    for line in data:
+        # Literały ({n}) w BODYSTRUCTURE zdarzają się rzadko - takie wiadomości pobieramy w całości
+        if not isinstance(line, bytes):
+            continue
+        try:
+            items = _fetch_items(parse_sexp(line))
+        except (ValueError, IndexError):
+            continue
+        if "UID" in items and isinstance(items.get("BODYSTRUCTURE"), list):
+            structures[items["UID"].encode()] = items["BODYSTRUCTURE"]
+    return structures
+
+
+def fetch_text(imap: imaplib.IMAP4, uid: bytes, structure: Optional[List[Any]], max_bytes: int) -> str:
+    """Pobiera (bez oznaczania jako przeczytane) co najwyżej max_bytes części text/plain,
+    a gdy jej brak - części text/html zamienionej na tekst"""
+    if structure is not None:
+        parts = list(text_parts(structure))
+        part = next((p for p in parts if p[1] == "plain"), None) or next((p for p in parts if p[1] == "html"), None)
+        if part is None:
+            # Brak części tekstowej (np. same załączniki)
+            return ""
+        number, subtype, encoding, charset = part
+        status, data = imap.uid("FETCH", uid.decode(), f"(BODY.PEEK[{number}]<0.{max_bytes}>)")
+        if status != "OK" or not data or not isinstance(data[0], tuple):
+            return ""
+        text = decode_part(data[0][1], encoding, charset)
+        return html_to_text(text) if subtype == "html" else text
+    # Nie udało się odczytać struktury - pełna wiadomość jak dawniej
+    status, data = imap.uid("FETCH", uid.decode(), "(BODY.PEEK[])")
+    if status != "OK" or not data or not isinstance(data[0], tuple):
+        return ""
+    msg = email.message_from_bytes(data[0][1])
+    html_text = None
+    for p in msg.walk():
+        if p.get_content_type() == "text/plain":
+            return p.get_payload(decode=True).decode(errors="ignore")
+        if p.get_content_type() == "text/html" and html_text is None:
+            html_text = html_to_text(p.get_payload(decode=True).decode(errors="ignore"))
+    return html_text or ""
+
+
+def iter_message_texts(imap: imaplib.IMAP4, uids: Sequence[bytes], cache: Optional[TextCache] = None,
+                       cache_prefix: Hashable = None, max_bytes: int = 16384) -> Iterator[Tuple[bytes, str]]:
+    """Treści wiadomości w podanej kolejności, pobierane leniwie.
+
+    Wiadomości z pamięci podręcznej nie są pobierane ponownie; dla pozostałych
+    BODYSTRUCTURE idzie paczkami po STRUCTURE_BATCH, a potem tylko początek
+    części tekstowej (partial fetch).
+    """
+    structures: dict = {}
+    for i, uid in enumerate(uids):
+        key = (cache_prefix, uid)
+        text = cache.get(key) if cache is not None else None
+        if text is None:
+            if uid not in structures:
+                batch = [u for u in uids[i:] if cache is None or cache.get((cache_prefix, u)) is None]
+                batch = batch[:STRUCTURE_BATCH]
+                structures = fetch_structures(imap, batch)
+                for u in batch:
+                    structures.setdefault(u, None)
+            text = fetch_text(imap, uid, structures.get(uid), max_bytes)
+            if cache is not None:
+                cache.put(key, text)
+        yield uid, text
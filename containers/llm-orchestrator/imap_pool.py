@@ -0,0 +1,182 @@
+# llm-orchestrator/imap_pool.py
+import hashlib
+import imaplib
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+SessionKey = Tuple[str, str, str, str]
+
+
+def is_connection_error(error: BaseException) -> bool:
+    """True dla błędów, po których sesji IMAP nie da się dalej używać.
+
+    IMAP4.error oznacza odrzuconą komendę (sesja działa dalej), natomiast
+    IMAP4.abort i błędy gniazda/TLS - zerwane połączenie.
+    """
+    if isinstance(error, imaplib.IMAP4.abort):
+        return True
+    return isinstance(error, OSError)
+
+
+class _PooledSession:
+    def __init__(self, key: SessionKey, imap: imaplib.IMAP4):
+        self.key = key
+        self.imap = imap
+        self.last_used = time.monotonic()
+
+
+class IMAPPool:
+    """Pula zalogowanych sesji IMAP z wybraną skrzynką, kluczowana (serwer, użytkownik, skrzynka).
+
+    Kolejne odpytania tej samej skrzynki używają już otwartej sesji, więc
+    kosztują tylko jedną komendę zamiast handshake'u TLS, logowania i SELECT.
+    Sesja nieużywana dłużej niż `noop_after` sekund jest sprawdzana komendą
+    NOOP, po `max_idle` sekundach zamykana. W kluczu jest skrót hasła, żeby
+    sesja nie została wydana komuś z innym hasłem.
+    """
+
+    def __init__(self, max_per_key: int = 2, noop_after: float = 30.0, max_idle: float = 300.0,
+                 timeout: float = 30.0):
+        self.max_per_key = max_per_key
+        self.noop_after = noop_after
+        self.max_idle = max_idle
+        self.timeout = timeout
+        self._idle: Dict[SessionKey, List[_PooledSession]] = {}
+        # UIDVALIDITY ostatnio wybranej skrzynki - UID-y są stałe tylko przy tej samej wartości
+        self.uidvalidity: Dict[SessionKey, Optional[bytes]] = {}
+        self._lock = threading.Lock()
+        self.stats = {"connects": 0, "reused": 0, "noop_failures": 0, "reconnects": 0}
+
+    @staticmethod
+    def make_key(server: str, user: str, password: str, mailbox: str) -> SessionKey:
+        return (server, user, mailbox, hashlib.sha256(password.encode()).hexdigest())
+
+    @contextmanager
+    def session(self, server: str, user: str, password: str, mailbox: str = "INBOX") -> Iterator[imaplib.IMAP4]:
+        """Wypożycza sesję z wybraną skrzynką; zerwane sesje nie wracają do puli"""
+        key = self.make_key(server, user, password, mailbox)
+        conn = self._checkout(key, password)
+        try:
+            yield conn.imap
+        except Exception as e:
+            if is_connection_error(e):
+                self._discard(conn)
+                conn = None
+            raise
+        finally:
+            if conn is not None:
+                self._checkin(conn)
+
+    def run(self, server: str, user: str, password: str, mailbox: str, fn):
+        """Wywołuje fn(imap) na sesji z puli, ponawiając raz po zerwaniu połączenia"""
+        for attempt in (1, 2):
+            try:
+                with self.session(server, user, password, mailbox) as imap:
+                    return fn(imap)
+            except Exception as e:
+                if attempt == 2 or not is_connection_error(e):
+                    raise
+                self.stats["reconnects"] += 1
+
+    def close(self) -> None:
+        """Wylogowuje wszystkie bezczynne sesje"""
+        with self._lock:
+            idle = [conn for conns in self._idle.values() for conn in conns]
+            self._idle = {}
+        for conn in idle:
+            self._logout(conn)
+
+    def _connect(self, key: SessionKey, password: str) -> _PooledSession:
+        server, user, mailbox, _ = key
+        imap = imaplib.IMAP4_SSL(server, timeout=self.timeout)
+        try:
+            imap.login(user, password)
+            status, data = imap.select(mailbox)
+            if status != "OK":
+                raise imaplib.IMAP4.error(f"SELECT {mailbox} failed: {data}")
+            _, validity = imap.response("UIDVALIDITY")
+            self.uidvalidity[key] = validity[0] if validity and validity[0] else None
+        except Exception:
+            try:
+                imap.shutdown()
+            except OSError:
+                pass
+            raise
+        self.stats["connects"] += 1
+        return _PooledSession(key, imap)
+
+    def _checkout(self, key: SessionKey, password: str) -> _PooledSession:
+        while True:
+            with self._lock:
+                conns = self._idle.get(key)
+                conn = conns.pop() if conns else None
+            if conn is None:
+                return self._connect(key, password)
+            idle_for = time.monotonic() - conn.last_used
+            if idle_for > self.max_idle:
+                self._logout(conn)
+                continue
+            if idle_for > self.noop_after:
+                try:
+                    ok = conn.imap.noop()[0] == "OK"
+                except (imaplib.IMAP4.error, OSError):
+                    ok = False
+                if not ok:
+                    self.stats["noop_failures"] += 1
+                    self._discard(conn)
+                    continue
+            self.stats["reused"] += 1
+            return conn
+
+    def _checkin(self, conn: _PooledSession) -> None:
+        conn.last_used = time.monotonic()
+        expired = []
+        with self._lock:
+            conns = self._idle.setdefault(conn.key, [])
+            if len(conns) < self.max_per_key:
+                conns.append(conn)
+            else:
+                expired.append(conn)
+            # Przy okazji zamknij sesje innych skrzynek, które za długo czekały
+            for key, others in list(self._idle.items()):
+                keep = [c for c in others if conn.last_used - c.last_used <= self.max_idle]
+                expired.extend(c for c in others if c not in keep)
+                if keep:
+                    self._idle[key] = keep
+                else:
+                    del self._idle[key]
+        for old in expired:
+            self._logout(old)
+
+    def _discard(self, conn: _PooledSession) -> None:
+        try:
+            conn.imap.shutdown()
+        except OSError:
+            pass
+
+    def _logout(self, conn: _PooledSession) -> None:
+        try:
+            conn.imap.logout()
+        except (imaplib.IMAP4.error, OSError):
+            self._discard(conn)
+
+
+_default_pool: Optional[IMAPPool] = None
+_default_pool_lock = threading.Lock()
+
+
+def get_imap_pool() -> IMAPPool:
+    """Współdzielona pula sesji IMAP skonfigurowana ze zmiennych środowiskowych"""
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = IMAPPool(
+                max_per_key=int(os.getenv("IMAP_POOL_MAX_PER_KEY", "2")),
+                noop_after=float(os.getenv("IMAP_NOOP_AFTER", "30")),
+                max_idle=float(os.getenv("IMAP_MAX_IDLE", "300")),
+                timeout=float(os.getenv("IMAP_TIMEOUT", "30"))
+            )
+        return _default_pool
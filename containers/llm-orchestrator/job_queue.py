@@ -0,0 +1,220 @@
+# llm-orchestrator/job_queue.py
+import json
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, Optional, Tuple
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+
+# Handler zadania: przyjmuje payload, zwraca (kod HTTP, treść odpowiedzi)
+JobHandler = Callable[[Dict[str, Any]], Tuple[int, Dict[str, Any]]]
+
+
+class JobQueueFull(Exception):
+    """Kolejka osiągnęła limit oczekujących zadań"""
+
+
+class JobQueue:
+    """Trwała kolejka zadań (SQLite) obsługiwana przez ograniczoną pulę wątków.
+
+    Zadania są zapisywane w bazie przed zwróceniem identyfikatora, więc po
+    restarcie procesu niedokończone zadania wracają do kolejki. Zakończone
+    zadania starsze niż retention_hours są usuwane przez wątki robocze
+    (co purge_interval sekund); retention_hours=0 wyłącza usuwanie.
+    """
+
+    def __init__(self, db_path: str, workers: int = 4, max_pending: int = 1000,
+                 retention_hours: float = 24, purge_interval: float = 600):
+        self.db_path = db_path
+        self.workers = max(1, workers)
+        self.max_pending = max_pending
+        self.retention_hours = retention_hours
+        self.purge_interval = purge_interval
+        self._next_purge = time.monotonic() + purge_interval
+        self._handlers: Dict[str, JobHandler] = {}
+        self._pending: "queue.Queue[str]" = queue.Queue()
+        self._callbacks: Dict[str, Callable[[Dict[str, Any]], None]] = {}
+        self._db_lock = threading.Lock()
+        self._finished = threading.Condition()
+        self._threads = []
+        self._started = False
+
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL,
+                status_code INTEGER,
+                result TEXT,
+                attempts INTEGER DEFAULT 0,
+                created_at REAL,
+                started_at REAL,
+                finished_at REAL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_finished ON jobs (finished_at)")
+
+    def register(self, kind: str, handler: JobHandler) -> None:
+        """Rejestruje funkcję obsługującą zadania danego typu"""
+        self._handlers[kind] = handler
+
+    def start(self) -> None:
+        """Przywraca niedokończone zadania i uruchamia wątki robocze"""
+        if self._started:
+            return
+        self._started = True
+        with self._db_lock:
+            # Zadania przerwane restartem wracają do kolejki
+            self._conn.execute("UPDATE jobs SET status = ? WHERE status = ?", (JOB_QUEUED, JOB_RUNNING))
+            rows = self._conn.execute(
+                "SELECT id FROM jobs WHERE status = ? ORDER BY created_at", (JOB_QUEUED,)
+            ).fetchall()
+        for (job_id,) in rows:
+            self._pending.put(job_id)
+        for i in range(self.workers):
+            t = threading.Thread(target=self._worker, name=f"job-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def submit(
+        self,
+        kind: str,
+        payload: Dict[str, Any],
+        on_done: Optional[Callable[[Dict[str, Any]], None]] = None
+    ) -> str:
+        """Zapisuje zadanie w bazie i wstawia je do kolejki; zwraca id zadania.
+
+        `on_done` (opcjonalnie) jest wywoływane w wątku roboczym ze stanem
+        zakończonego zadania.
+        """
+        if kind not in self._handlers:
+            raise ValueError(f"Nieznany typ zadania: {kind}")
+        if self._pending.qsize() >= self.max_pending:
+            raise JobQueueFull(f"Kolejka zadań jest pełna ({self.max_pending})")
+        job_id = uuid.uuid4().hex
+        with self._db_lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, kind, payload, status, created_at) VALUES (?, ?, ?, ?, ?)",
+                (job_id, kind, json.dumps(payload), JOB_QUEUED, time.time())
+            )
+        if on_done is not None:
+            self._callbacks[job_id] = on_done
+        self._pending.put(job_id)
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Zwraca stan zadania lub None, jeśli zadanie nie istnieje"""
+        with self._db_lock:
+            row = self._conn.execute(
+                "SELECT id, kind, status, status_code, result, attempts, created_at, started_at, finished_at "
+                "FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "job_id": row[0],
+            "kind": row[1],
+            "status": row[2],
+            "status_code": row[3],
+            "result": json.loads(row[4]) if row[4] else None,
+            "attempts": row[5],
+            "created_at": row[6],
+            "started_at": row[7],
+            "finished_at": row[8],
+        }
+
+    def wait(self, job_id: str, timeout: float) -> Optional[Dict[str, Any]]:
+        """Czeka na zakończenie zadania maksymalnie `timeout` sekund i zwraca jego stan"""
+        deadline = time.monotonic() + timeout
+        with self._finished:
+            while True:
+                job = self.get(job_id)
+                if job is None or job["status"] in (JOB_SUCCEEDED, JOB_FAILED):
+                    return job
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return job
+                self._finished.wait(remaining)
+
+    def stats(self) -> Dict[str, Any]:
+        """Liczba zadań w poszczególnych stanach"""
+        with self._db_lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {"workers": self.workers, "pending": self._pending.qsize(), "jobs": dict(rows)}
+
+    def purge(self) -> int:
+        """Usuwa zakończone zadania starsze niż retention_hours; zwraca liczbę usuniętych"""
+        if not self.retention_hours:
+            return 0
+        cutoff = time.time() - self.retention_hours * 3600
+        with self._db_lock:
+            cursor = self._conn.execute(
+                "DELETE FROM jobs WHERE status IN (?, ?) AND finished_at < ?", (JOB_SUCCEEDED, JOB_FAILED, cutoff)
+            )
+        return cursor.rowcount
+
+    def _maybe_purge(self) -> None:
+        with self._db_lock:
+            if time.monotonic() < self._next_purge:
+                return
+            self._next_purge = time.monotonic() + self.purge_interval  # tylko jeden wątek sprząta
+        try:
+            removed = self.purge()
+            if removed:
+                print(f"Usunięto {removed} zakończonych zadań starszych niż {self.retention_hours} h")
+        except sqlite3.Error as e:
+            print(f"Błąd usuwania starych zadań: {e}")
+
+    def _worker(self) -> None:
+        while True:
+            self._maybe_purge()
+            try:
+                job_id = self._pending.get(timeout=self.purge_interval)
+            except queue.Empty:
+                continue
+            try:
+                self._run(job_id)
+            except Exception as e:
+                print(f"Błąd obsługi zadania {job_id}: {e}")
+            finally:
+                self._pending.task_done()
+
+    def _run(self, job_id: str) -> None:
+        with self._db_lock:
+            row = self._conn.execute(
+                "SELECT kind, payload FROM jobs WHERE id = ? AND status = ?", (job_id, JOB_QUEUED)
+            ).fetchone()
+            if row is None:
+                return
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, started_at = ?, attempts = attempts + 1 WHERE id = ?",
+                (JOB_RUNNING, time.time(), job_id)
+            )
+        kind, payload = row[0], json.loads(row[1])
+
+        try:
+            status_code, result = self._handlers[kind](payload)
+        except Exception as e:
+            status_code, result = 500, {"status": "error", "message": f"Wystąpił błąd: {str(e)}"}
+        status = JOB_SUCCEEDED if status_code < 400 else JOB_FAILED
+
+        with self._db_lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, status_code = ?, result = ?, finished_at = ? WHERE id = ?",
+                (status, status_code, json.dumps(result), time.time(), job_id)
+            )
+        with self._finished:
+            self._finished.notify_all()
+        callback = self._callbacks.pop(job_id, None)
+        if callback is not None:
+            callback(self.get(job_id))
@@ -0,0 +1,231 @@
+# llm-orchestrator/llm_backends.py
+import glob
+import os
+import threading
+from typing import Any, Dict, Iterator, Optional
+
+try:
+    from llama_cpp import Llama, LogitsProcessorList
+except ImportError:  # llama-cpp-python jest potrzebny tylko dla modeli GGUF
+    Llama = LogitsProcessorList = None
+
+MODELS_DIR = os.getenv("MODELS_DIR", "/app/models")
+
+
+def is_gguf(model_name: str) -> bool:
+    return model_name.endswith(".gguf") or model_name.endswith("-gguf")
+
+
+def resolve_gguf(model_name: str, models_dir: str = MODELS_DIR) -> str:
+    """Ścieżka pliku GGUF dla nazwy z detect-hardware.py (np. phi-2-q4-gguf -> phi-2-q4.gguf) lub ścieżki"""
+    if model_name.endswith(".gguf"):
+        return model_name if os.path.isabs(model_name) else os.path.join(models_dir, model_name)
+    base = model_name[:-len("-gguf")]
+    exact = os.path.join(models_dir, f"{base}.gguf")
+    if os.path.exists(exact):
+        return exact
+    matches = sorted(glob.glob(os.path.join(models_dir, f"{base}*.gguf")))
+    if matches:
+        return matches[0]
+    raise FileNotFoundError(f"Nie znaleziono pliku GGUF dla modelu {model_name} w {models_dir}")
+
+
+def _physical_cores() -> int:
+    try:
+        import psutil
+        return psutil.cpu_count(logical=False) or os.cpu_count() or 1
+    except ImportError:
+        return os.cpu_count() or 1
+
+
+class HFBackend:
+    """Model transformers (AutoModelForCausalLM) ładowany przy pierwszym użyciu.
+
+    Z draft_model generuje dekodowaniem spekulatywnym (speculative.py): mały
+    model o tym samym słowniku proponuje num_draft_tokens tokenów, a model
+    docelowy weryfikuje je w jednym przebiegu. Model szkicowy o innym
+    słowniku jest pomijany - backend generuje wtedy zwykłym generate().
+    """
+
+    name = "hf"
+
+    def __init__(self, model_name: str, draft_model: Optional[str] = None, num_draft_tokens: int = 4):
+        self.model_name = model_name
+        self.draft_model = draft_model if draft_model != model_name else None
+        self.num_draft_tokens = num_draft_tokens
+        self._model = None
+        self._tokenizer = None
+        self._draft = None
+        self._speculative_stats = None
+        self._token_text = None  # tekst tokenów dla dekodowania ze schematem, liczony leniwie
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._model is not None
+
+    def load(self):
+        with self._lock:
+            if self._model is None:
+                from transformers import AutoModelForCausalLM, AutoTokenizer
+                self._tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+                self._model = AutoModelForCausalLM.from_pretrained(self.model_name, low_cpu_mem_usage=True)
+                self._model.eval()
+                if self.draft_model:
+                    self._load_draft()
+            return self._model, self._tokenizer
+
+    def _load_draft(self) -> None:
+        from transformers import AutoModelForCausalLM, AutoTokenizer
+        from speculative import SpeculativeStats, compatible
+        if not compatible(self._tokenizer, AutoTokenizer.from_pretrained(self.draft_model)):
+            print(f"Model szkicowy {self.draft_model} ma inny słownik niż {self.model_name} "
+                  f"- bez dekodowania spekulatywnego")
+            return
+        self._draft = AutoModelForCausalLM.from_pretrained(self.draft_model, low_cpu_mem_usage=True).eval()
+        self._speculative_stats = SpeculativeStats(self.model_name, self.draft_model)
+
+    def generate(self, prompt: str, max_new_tokens: int, temperature: float, top_p: float) -> str:
+        import torch
+        model, tokenizer = self.load()
+        if self._draft is not None:
+            return "".join(self._speculative(prompt, max_new_tokens, temperature, top_p))
+        inputs = tokenizer(prompt, return_tensors="pt")
+        with torch.no_grad():
+            outputs = model.generate(**inputs, max_new_tokens=max_new_tokens,
+                                     pad_token_id=tokenizer.eos_token_id, **self._sampling(temperature, top_p))
+        return tokenizer.decode(outputs[0, inputs["input_ids"].shape[1]:], skip_special_tokens=True)
+
+    def stream(self, prompt: str, max_new_tokens: int, temperature: float, top_p: float,
+               cancel: Optional[threading.Event] = None) -> Iterator[str]:
+        from llm_stream import stream_generate
+        model, tokenizer = self.load()
+        if self._draft is not None:
+            return self._speculative(prompt, max_new_tokens, temperature, top_p, cancel)
+        return stream_generate(model, tokenizer, prompt, max_new_tokens=max_new_tokens, cancel=cancel,
+                               pad_token_id=tokenizer.eos_token_id, **self._sampling(temperature, top_p))
+
+    def generate_json(self, prompt: str, schema: Dict[str, Any], max_new_tokens: int) -> str:
+        """Tekst JSON zgodny ze schematem (dekodowanie zachłanne z procesorem logitów, bez szkicu)"""
+        import torch
+        from transformers import LogitsProcessorList
+        from structured_output import JsonLogitsProcessor, JsonSchemaConstraint, tokenizer_token_text
+        model, tokenizer = self.load()
+        if self._token_text is None:
+            self._token_text = tokenizer_token_text(tokenizer)
+        constraint = JsonSchemaConstraint(schema, self._token_text, tokenizer.eos_token_id, max_new_tokens)
+        inputs = tokenizer(prompt, return_tensors="pt")
+        with torch.no_grad():
+            outputs = model.generate(**inputs, max_new_tokens=max_new_tokens, do_sample=False,
+                                     pad_token_id=tokenizer.eos_token_id,
+                                     logits_processor=LogitsProcessorList([JsonLogitsProcessor(constraint)]))
+        return tokenizer.decode(outputs[0, inputs["input_ids"].shape[1]:], skip_special_tokens=True,
+                                clean_up_tokenization_spaces=False)
+
+    def info(self) -> Dict[str, Any]:
+        info = {"backend": self.name, "model": self.model_name, "loaded": self.loaded}
+        if self._speculative_stats is not None:
+            info["speculative"] = dict(self._speculative_stats.snapshot(), num_draft_tokens=self.num_draft_tokens)
+        return info
+
+    def _speculative(self, prompt: str, max_new_tokens: int, temperature: float, top_p: float,
+                     cancel: Optional[threading.Event] = None) -> Iterator[str]:
+        from speculative import speculative_stream
+        return speculative_stream(self._model, self._draft, self._tokenizer, prompt, max_new_tokens,
+                                  num_draft_tokens=self.num_draft_tokens, temperature=temperature or 0.0,
+                                  top_p=top_p, stats=self._speculative_stats, cancel=cancel)
+
+    @staticmethod
+    def _sampling(temperature: float, top_p: float) -> Dict[str, Any]:
+        if temperature and temperature > 0:
+            return {"do_sample": True, "temperature": temperature, "top_p": top_p}
+        return {"do_sample": False}
+
+
+class LlamaCppBackend:
+    """Skwantyzowany model GGUF przez llama.cpp (llama-cpp-python).
+
+    Plik jest mapowany do pamięci (mmap) - strony wag są współdzielone między
+    procesami i ładowane leniwie, a model q4 zajmuje ok. 1/7 pamięci wag
+    float32. Jeden kontekst llama.cpp obsługuje jedno generowanie naraz,
+    dlatego wywołania są serializowane.
+    """
+
+    name = "llama_cpp"
+
+    def __init__(self, model_path: str, n_ctx: int = 2048, n_threads: Optional[int] = None,
+                 n_batch: int = 512, use_mlock: bool = False):
+        self.model_path = model_path
+        self.n_ctx = n_ctx
+        self.n_threads = n_threads or _physical_cores()
+        self.n_batch = n_batch
+        self.use_mlock = use_mlock
+        self._llm = None
+        self._token_text = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._llm is not None
+
+    def load(self):
+        if Llama is None:
+            raise RuntimeError("Model GGUF wymaga pakietu llama-cpp-python")
+        with self._lock:
+            if self._llm is None:
+                self._llm = Llama(model_path=self.model_path, n_ctx=self.n_ctx, n_threads=self.n_threads,
+                                  n_batch=self.n_batch, use_mmap=True, use_mlock=self.use_mlock, verbose=False)
+            return self._llm
+
+    def generate(self, prompt: str, max_new_tokens: int, temperature: float, top_p: float) -> str:
+        llm = self.load()
+        with self._lock:
+            output = llm(prompt, max_tokens=max_new_tokens, temperature=temperature, top_p=top_p)
+        return output["choices"][0]["text"]
+
+    def stream(self, prompt: str, max_new_tokens: int, temperature: float, top_p: float,
+               cancel: Optional[threading.Event] = None) -> Iterator[str]:
+        llm = self.load()
+        # Zamknięcie generatora (rozłączenie klienta) kończy pętlę llama.cpp i zwalnia blokadę
+        with self._lock:
+            for part in llm(prompt, max_tokens=max_new_tokens, temperature=temperature, top_p=top_p, stream=True):
+                if cancel is not None and cancel.is_set():
+                    break
+                text = part["choices"][0]["text"]
+                if text:
+                    yield text
+
+    def generate_json(self, prompt: str, schema: Dict[str, Any], max_new_tokens: int) -> str:
+        from structured_output import JsonSchemaConstraint, LlamaJsonLogitsProcessor, llama_token_text
+        llm = self.load()
+        with self._lock:
+            if self._token_text is None:
+                self._token_text = llama_token_text(llm)
+            # llama.cpp skraca max_tokens do miejsca w kontekście - ograniczenie musi znać ten sam limit
+            max_new_tokens = max(1, min(max_new_tokens, self.n_ctx - len(llm.tokenize(prompt.encode("utf-8")))))
+            constraint = JsonSchemaConstraint(schema, self._token_text, llm.token_eos(), max_new_tokens)
+            output = llm(prompt, max_tokens=max_new_tokens, temperature=0.0,
+                         logits_processor=LogitsProcessorList([LlamaJsonLogitsProcessor(constraint)]))
+        return output["choices"][0]["text"]
+
+    def info(self) -> Dict[str, Any]:
+        return {"backend": self.name, "model": self.model_path, "loaded": self.loaded,
+                "n_threads": self.n_threads, "n_batch": self.n_batch, "n_ctx": self.n_ctx}
+
+
+def create_backend(model_name: str, backend: Optional[str] = None, n_threads: Optional[int] = None):
+    """Backend dla modelu: LLM_BACKEND=auto (GGUF -> llama.cpp, reszta -> transformers), hf lub llama_cpp.
+
+    LLM_DRAFT_MODEL włącza dekodowanie spekulatywne modeli transformers (LLM_DRAFT_TOKENS tokenów szkicu).
+    """
+    backend = backend or os.getenv("LLM_BACKEND", "auto")
+    if backend == "llama_cpp" or (backend == "auto" and is_gguf(model_name)):
+        return LlamaCppBackend(
+            resolve_gguf(model_name),
+            n_ctx=int(os.getenv("LLAMA_CTX", "2048")),
+            n_threads=int(os.getenv("LLAMA_THREADS", "0")) or n_threads,
+            n_batch=int(os.getenv("LLAMA_BATCH", "512")),
+            use_mlock=os.getenv("LLAMA_MLOCK", "false").lower() == "true"
+        )
+    return HFBackend(model_name, draft_model=os.getenv("LLM_DRAFT_MODEL") or None,
+                     num_draft_tokens=int(os.getenv("LLM_DRAFT_TOKENS", "4")))
@@ -0,0 +1,140 @@
+# llm-orchestrator/llm_manager.py
+import json
+import os
+from typing import Any, Dict, Iterator, Optional
+
+from admission import INTERACTIVE, AdmissionController, admission_from_env
+from cpu_tuning import configure_from_env
+from model_registry import DEFAULT_SELECTION_PATH, ModelRegistry, registry_from_env
+from response_cache import ResponseCache, cache_from_env
+
+
+class LLMManager:
+    """Modele LLM (backend transformers albo llama.cpp) z rejestru z cache odpowiedzi.
+
+    Z tego obiektu korzystają /use-llm (generate_text) i PipelineGenerator (generate_json).
+    Bez podanej nazwy używany jest aktywny model rejestru; backend wybierany
+    jest po nazwie modelu (create_backend), więc to samo API obsługuje modele
+    HF i skwantyzowane pliki GGUF. Powtórzony deterministyczny prompt (bez
+    próbkowania) jest zwracany z cache bez wywoływania modelu. Pozostałe
+    przechodzą przez kontrolę dopuszczenia (priorytet interactive/background);
+    przy pełnej kolejce rzucane jest AdmissionRejected.
+    """
+
+    def __init__(self, registry: ModelRegistry, cache: Optional[ResponseCache] = None,
+                 cpu_profile: Optional[Dict[str, Any]] = None, admission: Optional[AdmissionController] = None):
+        self.registry = registry
+        self.cache = cache
+        self.cpu_profile = cpu_profile
+        self.admission = admission
+
+    @property
+    def model_name(self) -> str:
+        return self.registry.active_name
+
+    def generate_text(self, prompt: str, max_new_tokens: int = 256, temperature: float = 0.0,
+                      top_p: float = 1.0, model: Optional[str] = None, priority: str = INTERACTIVE) -> str:
+        """Tekst wygenerowany po prompcie (bez samego promptu); temperature 0 = dekodowanie zachłanne"""
+        model = model or self.model_name
+        if self.admission is not None:
+            max_new_tokens = self.admission.clamp(max_new_tokens)
+        params = {"max_new_tokens": max_new_tokens, "temperature": temperature, "top_p": top_p}
+        if self.cache is not None:
+            cached = self.cache.get(model, prompt, params)
+            if cached is not None:
+                return cached
+
+        if self.admission is None:
+            text = self.registry.get(model).generate(prompt, max_new_tokens, temperature, top_p)
+        else:
+            with self.admission.admit(priority, max_new_tokens):
+                text = self.registry.get(model).generate(prompt, max_new_tokens, temperature, top_p)
+
+        if self.cache is not None:
+            self.cache.put(model, prompt, params, text)
+        return text
+
+    def generate_json(self, prompt: str, schema: Dict[str, Any], max_new_tokens: int = 512,
+                      model: Optional[str] = None, priority: str = INTERACTIVE) -> Any:
+        """Dokument JSON zgodny ze schematem w jednym przebiegu generowania (structured_output.py).
+
+        Model może wybierać tylko tokeny, które zachowują poprawny JSON zgodny ze
+        schematem, więc wynik nie wymaga wycinania z tekstu ani ponownej prośby
+        o poprawienie formatu. ValueError, gdy zabrakło max_new_tokens na domknięcie dokumentu.
+        """
+        model = model or self.model_name
+        if self.admission is not None:
+            max_new_tokens = self.admission.clamp(max_new_tokens)
+        params = {"max_new_tokens": max_new_tokens, "schema": schema}
+        if self.cache is not None:
+            cached = self.cache.get(model, prompt, params)
+            if cached is not None:
+                return json.loads(cached)
+
+        if self.admission is None:
+            text = self.registry.get(model).generate_json(prompt, schema, max_new_tokens)
+        else:
+            with self.admission.admit(priority, max_new_tokens):
+                text = self.registry.get(model).generate_json(prompt, schema, max_new_tokens)
+
+        result = json.loads(text)  # przed zapisem - niedomknięty dokument nie trafia do cache
+        if self.cache is not None:
+            self.cache.put(model, prompt, params, text)
+        return result
+
+    def stream_text(self, prompt: str, max_new_tokens: int = 256, temperature: float = 0.0,
+                    top_p: float = 1.0, model: Optional[str] = None, priority: str = INTERACTIVE,
+                    admitted: bool = False) -> Iterator[str]:
+        """Jak generate_text, ale fragmentami; pełna odpowiedź trafia do cache po zakończeniu.
+
+        admitted=True: wywołujący trzyma już slot (np. /use-llm, który musi móc odpowiedzieć 429
+        przed wysłaniem nagłówków strumienia).
+        """
+        model = model or self.model_name
+        if self.admission is not None:
+            max_new_tokens = self.admission.clamp(max_new_tokens)
+        params = {"max_new_tokens": max_new_tokens, "temperature": temperature, "top_p": top_p}
+        if self.cache is not None:
+            cached = self.cache.get(model, prompt, params)
+            if cached is not None:
+                yield cached
+                return
+
+        ticket = None
+        if self.admission is not None and not admitted:
+            ticket = self.admission.acquire(priority, max_new_tokens)
+        parts = []
+        try:
+            for chunk in self.registry.get(model).stream(prompt, max_new_tokens, temperature, top_p):
+                parts.append(chunk)
+                yield chunk
+        finally:
+            if ticket is not None:
+                self.admission.release(ticket)
+        if self.cache is not None:
+            self.cache.put(model, prompt, params, "".join(parts))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "model": self.model_name,
+            "registry": self.registry.stats(),
+            "cpu_profile": self.cpu_profile,
+            "admission": self.admission.stats() if self.admission is not None else None,
+            "cache": self.cache.stats() if self.cache is not None else None
+        }
+
+
+def manager_from_env() -> LLMManager:
+    """Menedżer modeli z cache odpowiedzi (LLM_CACHE=false wyłącza).
+
+    Wątki inferencji ustawia profil CPU (cpu_tuning: INFERENCE_PROFILE lub topologia hosta).
+    Aktywny model to LLM_MODEL_NAME, dopóki set_model (volumes/commands.py) nie zapisze
+    selected-model.json (LLM_SELECTION_PATH) - zmiana pliku przełącza model bez restartu.
+    Generowania ogranicza kontrola dopuszczenia (ADMISSION_*, domyślnie 2 naraz).
+    """
+    cpu_profile = configure_from_env()
+    registry = registry_from_env(n_threads=cpu_profile["intra_op_threads"] if cpu_profile else None)
+    registry.watch_selection(os.getenv("LLM_SELECTION_PATH", DEFAULT_SELECTION_PATH),
+                             interval=float(os.getenv("LLM_SELECTION_POLL", "5")))
+    cache = cache_from_env("llm-orchestrator") if os.getenv("LLM_CACHE", "true").lower() == "true" else None
+    return LLMManager(registry, cache, cpu_profile=cpu_profile, admission=admission_from_env("llm-orchestrator"))
@@ -0,0 +1,57 @@
+# llm-orchestrator/llm_stream.py
+import threading
+from typing import Iterator, Optional
+
+import torch
+from transformers import StoppingCriteria, StoppingCriteriaList, TextIteratorStreamer
+
+
+class CancelledCriteria(StoppingCriteria):
+    """Przerywa generate() po ustawieniu zdarzenia (np. klient się rozłączył)"""
+
+    def __init__(self, event: threading.Event):
+        self.event = event
+
+    def __call__(self, input_ids, scores, **kwargs):
+        return torch.full((input_ids.shape[0],), self.event.is_set(), dtype=torch.bool)
+
+
+def stream_generate(model, tokenizer, prompt: str, max_new_tokens: int = 20,
+                    cancel: Optional[threading.Event] = None, timeout: float = 60.0,
+                    **generate_kwargs) -> Iterator[str]:
+    """Fragmenty tekstu w miarę generowania (bez promptu).
+
+    generate() działa w osobnym wątku i oddaje tokeny przez TextIteratorStreamer.
+    Zamknięcie iteratora (rozłączenie klienta) ustawia `cancel`, więc generowanie
+    kończy się na najbliższym kroku zamiast liczyć odpowiedź do końca.
+    """
+    cancel = cancel or threading.Event()
+    streamer = TextIteratorStreamer(tokenizer, skip_prompt=True, timeout=timeout, skip_special_tokens=True)
+    inputs = tokenizer(prompt, return_tensors="pt")
+    errors = []
+
+    def run():
+        try:
+            with torch.no_grad():
+                model.generate(
+                    **inputs,
+                    max_new_tokens=max_new_tokens,
+                    streamer=streamer,
+                    stopping_criteria=StoppingCriteriaList([CancelledCriteria(cancel)]),
+                    **generate_kwargs
+                )
+        except Exception as e:
+            errors.append(e)
+            streamer.end()
+
+    thread = threading.Thread(target=run, name="llm-stream", daemon=True)
+    thread.start()
+    try:
+        for chunk in streamer:
+            if chunk:
+                yield chunk
+        thread.join()
+        if errors:
+            raise errors[0]
+    finally:
+        cancel.set()
@@ -0,0 +1,157 @@
+# llm-orchestrator/mail_outbox.py
+import json
+import random
+import sqlite3
+import threading
+import time
+from itertools import groupby
+from typing import Dict, List, Optional
+
+from send_email_utils import build_streaming_message, get_smtp_pool
+
+MAIL_PENDING = "pending"
+MAIL_SENT = "sent"
+MAIL_FAILED = "failed"
+
+
+class MailOutbox:
+    """Trwała skrzynka nadawcza wysyłana w tle.
+
+    /fill-form tylko zapisuje wiadomość w tabeli outbox; wątek wysyłający
+    pobiera zaległe wiadomości, grupuje je po odbiorcy i wysyła przez
+    współdzieloną pulę uwierzytelnionych sesji SMTP (send_many). Nieudane wysyłki są ponawiane z wykładniczym
+    opóźnieniem, po `max_attempts` próbach wiadomość dostaje status failed.
+    """
+
+    def __init__(self, db_path: str, batch_size: int = 50, max_attempts: int = 6,
+                 backoff: float = 30.0, max_backoff: float = 3600.0, poll_interval: float = 5.0):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.poll_interval = poll_interval
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                to_email TEXT NOT NULL,
+                subject TEXT,
+                body TEXT,
+                attachments TEXT,
+                status TEXT NOT NULL,
+                attempts INTEGER DEFAULT 0,
+                next_attempt_at REAL,
+                last_error TEXT,
+                created_at REAL,
+                sent_at REAL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox (status, next_attempt_at)")
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._send_loop, name="mail-outbox", daemon=True)
+            self._thread.start()
+
+    def enqueue(self, to_email: str, subject: str, body: str, attachments: Optional[List[str]] = None) -> int:
+        """Zapisuje wiadomość do wysłania; zwraca jej id"""
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO outbox (to_email, subject, body, attachments, status, next_attempt_at, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (to_email, subject, body, json.dumps(attachments or []), MAIL_PENDING, now, now)
+            )
+        self._wakeup.set()
+        return cursor.lastrowid
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._conn.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall())
+
+    def send_due(self) -> int:
+        """Wysyła zaległe wiadomości (jedna sesja SMTP na odbiorcę); zwraca liczbę wysłanych"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, to_email, subject, body, attachments, attempts FROM outbox "
+                "WHERE status = ? AND next_attempt_at <= ? ORDER BY to_email, id LIMIT ?",
+                (MAIL_PENDING, time.time(), self.batch_size)
+            ).fetchall()
+        if not rows:
+            return 0
+
+        try:
+            pool = get_smtp_pool()
+        except ValueError as e:
+            # Brak konfiguracji SMTP - ponawianie nic nie da
+            for row in rows:
+                self._mark_failed(row[0], str(e))
+            return 0
+
+        sent = 0
+        for to_email, group in groupby(rows, key=lambda row: row[1]):
+            group = list(group)
+            messages, ready = [], []
+            for row in group:
+                try:
+                    messages.append(build_streaming_message(
+                        pool.settings["from_email"], to_email, row[2], row[3], json.loads(row[4])
+                    ))
+                    ready.append(row)
+                except OSError as e:
+                    # Np. załącznik zniknął z dysku
+                    self._schedule_retry(row[0], row[5], str(e))
+            # Wiadomości do jednego odbiorcy idą jedną sesją z puli
+            for row, error in zip(ready, pool.send_many(messages)):
+                if error is None:
+                    self._mark_sent(row[0])
+                    sent += 1
+                else:
+                    self._schedule_retry(row[0], row[5], str(error))
+        return sent
+
+    def _mark_sent(self, msg_id: int) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE outbox SET status = ?, attempts = attempts + 1, sent_at = ? WHERE id = ?",
+                (MAIL_SENT, time.time(), msg_id)
+            )
+
+    def _schedule_retry(self, msg_id: int, attempts: int, error: str) -> None:
+        attempts += 1
+        if attempts >= self.max_attempts:
+            self._mark_failed(msg_id, error, attempts)
+            return
+        delay = min(self.max_backoff, self.backoff * 2 ** (attempts - 1)) * random.uniform(0.8, 1.2)
+        with self._lock:
+            self._conn.execute(
+                "UPDATE outbox SET attempts = ?, next_attempt_at = ?, last_error = ? WHERE id = ? AND status = ?",
+                (attempts, time.time() + delay, error, msg_id, MAIL_PENDING)
+            )
+
+    def _mark_failed(self, msg_id: int, error: str, attempts: Optional[int] = None) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE outbox SET status = ?, attempts = COALESCE(?, attempts + 1), last_error = ? "
+                "WHERE id = ? AND status = ?",
+                (MAIL_FAILED, attempts, error, msg_id, MAIL_PENDING)
+            )
+        print(f"Nie udało się wysłać wiadomości {msg_id}: {error}")
+
+    def _send_loop(self) -> None:
+        while True:
+            try:
+                sent = self.send_due()
+            except Exception as e:
+                print(f"Błąd wysyłki skrzynki nadawczej: {e}")
+                sent = 0
+            if sent < self.batch_size:
+                # Nic pilnego - czekaj na nową wiadomość albo na termin ponowienia
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
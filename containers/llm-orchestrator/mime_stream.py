@@ -0,0 +1,215 @@
+# llm-orchestrator/mime_stream.py
+import base64
+import hashlib
+import os
+import smtplib
+import threading
+import uuid
+from collections import OrderedDict
+from email.header import Header
+from email.utils import encode_rfc2231, formatdate, make_msgid
+from typing import Iterator, List, Optional, Tuple
+
+# 57 bajtów danych = jedna linia base64 o długości 76 znaków
+LINE_BYTES = 57
+CHUNK_BYTES = LINE_BYTES * 1024
+CRLF = "\r\n"
+
+
+def encode_base64_chunks(f, chunk_bytes: int = CHUNK_BYTES) -> Iterator[bytes]:
+    """Koduje strumień do base64 porcjami, z liniami po 76 znaków zakończonymi CRLF"""
+    while True:
+        chunk = f.read(chunk_bytes)
+        if not chunk:
+            return
+        yield base64.encodebytes(chunk).replace(b"\n", b"\r\n")
+
+
+def file_digest(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class EncodedAttachmentCache:
+    """Dyskowa pamięć podręczna załączników zakodowanych w base64, kluczowana skrótem treści.
+
+    To samo CV wysyłane wiele razy jest kodowane tylko raz. Skrót pliku jest
+    zapamiętywany dla (ścieżka, rozmiar, mtime), więc niezmieniony plik nie jest
+    nawet ponownie czytany w celu liczenia skrótu (najwyżej `max_digests` skrótów,
+    LRU). Po przekroczeniu `max_bytes` usuwane są najdawniej używane wpisy.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = 256 * 1024 * 1024, max_digests: int = 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_digests = max_digests
+        self._digests: "OrderedDict[Tuple[str, int, int], str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def iter_encoded(self, path: str) -> Iterator[bytes]:
+        digest = self._digest(path)
+        cached = os.path.join(self.cache_dir, f"{digest}.b64")
+        if os.path.exists(cached):
+            self._count("hits")
+            os.utime(cached)
+            with open(cached, "rb") as f:
+                yield from iter(lambda: f.read(CHUNK_BYTES), b"")
+            return
+
+        self._count("misses")
+        tmp = f"{cached}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(path, "rb") as src, open(tmp, "wb") as dst:
+                for encoded in encode_base64_chunks(src):
+                    dst.write(encoded)
+                    yield encoded
+            os.replace(tmp, cached)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        self._evict()
+
+    def _digest(self, path: str) -> str:
+        st = os.stat(path)
+        key = (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+        with self._lock:
+            digest = self._digests.get(key)
+            if digest is not None:
+                self._digests.move_to_end(key)
+        if digest is None:
+            digest = file_digest(path)
+            with self._lock:
+                self._digests[key] = digest
+                while len(self._digests) > self.max_digests:
+                    self._digests.popitem(last=False)
+        return digest
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self.stats[key] += 1
+
+    def _evict(self) -> None:
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".b64"):
+                full = os.path.join(self.cache_dir, name)
+                try:
+                    st = os.stat(full)
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, full))
+        total = sum(size for _, size, _ in entries)
+        for _, size, full in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(full)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+
+class StreamingMessage:
+    """Wiadomość multipart/mixed generowana porcjami zamiast budowania całości w pamięci.
+
+    Załączniki są czytane i kodowane w base64 kawałkami w trakcie zapisu do
+    gniazda SMTP, więc zużycie pamięci nie zależy od rozmiaru załączników.
+    """
+
+    def __init__(self, from_email: str, to_email: str, subject: str, body: str,
+                 attachments: Optional[List[str]] = None,
+                 cache: Optional[EncodedAttachmentCache] = None):
+        self.from_email = from_email
+        self.to_email = to_email
+        self.subject = subject
+        self.body = body
+        self.attachments = attachments or []
+        self.cache = cache
+        self.boundary = f"=============={uuid.uuid4().hex}=="
+
+    def iter_chunks(self) -> Iterator[bytes]:
+        """Kolejne porcje wiadomości w formacie gotowym do komendy DATA (CRLF)"""
+        headers = [
+            f"Content-Type: multipart/mixed; boundary=\"{self.boundary}\"",
+            "MIME-Version: 1.0",
+            f"From: {self.from_email}",
+            f"To: {self.to_email}",
+            # Długi temat jest zawijany - kontynuacje muszą kończyć się CRLF, nie samym LF
+            f"Subject: {Header(self.subject, 'utf-8').encode(linesep=CRLF)}",
+            f"Date: {formatdate(localtime=True)}",
+            f"Message-ID: {make_msgid()}",
+        ]
+        yield self._lines(headers + [""])
+
+        yield self._lines([
+            f"--{self.boundary}",
+            "Content-Type: text/plain; charset=\"utf-8\"",
+            "MIME-Version: 1.0",
+            "Content-Transfer-Encoding: base64",
+            "",
+        ])
+        yield base64.encodebytes(self.body.encode("utf-8")).replace(b"\n", b"\r\n")
+
+        for path in self.attachments:
+            yield self._lines([
+                f"--{self.boundary}",
+                "Content-Type: application/octet-stream",
+                "MIME-Version: 1.0",
+                "Content-Transfer-Encoding: base64",
+                f"Content-Disposition: attachment; {self._filename_param(os.path.basename(path))}",
+                "",
+            ])
+            if self.cache is not None:
+                yield from self.cache.iter_encoded(path)
+            else:
+                with open(path, "rb") as f:
+                    yield from encode_base64_chunks(f)
+
+        yield self._lines([f"--{self.boundary}--"])
+
+    @staticmethod
+    def _lines(lines: List[str]) -> bytes:
+        return "".join(f"{line}\r\n" for line in lines).encode("ascii")
+
+    @staticmethod
+    def _filename_param(filename: str) -> str:
+        try:
+            filename.encode("ascii")
+            return f"filename=\"{filename}\""
+        except UnicodeEncodeError:
+            return f"filename*={encode_rfc2231(filename, 'utf-8')}"
+
+
+def send_streaming(server: smtplib.SMTP, msg: StreamingMessage) -> None:
+    """Wysyła StreamingMessage przez otwartą sesję SMTP, pisząc treść prosto do gniazda.
+
+    Treść składa się wyłącznie z nagłówków i linii base64, więc żadna linia nie
+    zaczyna się od kropki i nie trzeba stosować dot-stuffingu.
+    """
+    server.ehlo_or_helo_if_needed()
+    code, resp = server.mail(msg.from_email)
+    if code != 250:
+        server.rset()
+        raise smtplib.SMTPSenderRefused(code, resp, msg.from_email)
+    code, resp = server.rcpt(msg.to_email)
+    if code not in (250, 251):
+        server.rset()
+        raise smtplib.SMTPRecipientsRefused({msg.to_email: (code, resp)})
+
+    server.putcmd("data")
+    code, resp = server.getreply()
+    if code != 354:
+        server.rset()
+        raise smtplib.SMTPDataError(code, resp)
+    for chunk in msg.iter_chunks():
+        server.send(chunk)
+    server.send(b".\r\n")
+    code, resp = server.getreply()
+    if code != 250:
+        server.rset()
+        raise smtplib.SMTPDataError(code, resp)
@@ -0,0 +1,253 @@
+# llm-orchestrator/model_registry.py
+import gc
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional
+
+from llm_backends import create_backend
+
+try:
+    import psutil
+except ImportError:  # bez psutil nie mierzymy pamięci modeli (budżet pamięci nie działa)
+    psutil = None
+
+try:
+    from prometheus_client import Gauge, Histogram
+except ImportError:  # metryki są opcjonalne
+    Gauge = Histogram = None
+
+DEFAULT_SELECTION_PATH = "/app/config/selected-model.json"
+
+if Gauge is not None:
+    MODELS_RESIDENT = Gauge("llm_models_resident", "Modele LLM załadowane do pamięci")
+    MODEL_LOAD_SECONDS = Histogram("llm_model_load_seconds", "Czas ładowania modelu LLM", ["model"],
+                                   buckets=(0.5, 1, 2.5, 5, 10, 30, 60, 120, 300))
+
+
+def _rss_mb() -> Optional[float]:
+    return psutil.Process().memory_info().rss / 2 ** 20 if psutil is not None else None
+
+
+@dataclass
+class ResidentModel:
+    name: str
+    backend: Any
+    load_seconds: float
+    rss_mb: Optional[float]
+    loaded_at: float
+    last_used: float
+    requests: int = 0
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "backend": self.backend.info(),
+            "load_seconds": round(self.load_seconds, 2),
+            "rss_mb": round(self.rss_mb, 1) if self.rss_mb is not None else None,
+            "loaded_at": self.loaded_at,
+            "last_used": self.last_used,
+            "requests": self.requests,
+        }
+
+
+class ModelRegistry:
+    """Modele LLM ładowane na żądanie po nazwie, najwyżej max_models w pamięci (LRU).
+
+    Aktywny model (active_name) obsługuje zapytania bez podanej nazwy; select()
+    najpierw ładuje nowy model, a dopiero potem go przełącza, więc zapytania
+    w trakcie ładowania dalej trafiają do poprzedniego. Miejsce zwalniane jest
+    dopiero po udanym załadowaniu (także przy max_models=1), więc w trakcie
+    ładowania w pamięci jest o jeden model więcej niż limit. Ładowania są
+    serializowane - przyrost RSS procesu w trakcie load() to pamięć modelu,
+    z której liczony jest budżet memory_budget_mb. Usunięty z rejestru model
+    zostaje w pamięci, dopóki trwające generowania trzymają referencję.
+    """
+
+    def __init__(self, default_model: str, max_models: int = 2, memory_budget_mb: float = 0,
+                 n_threads: Optional[int] = None, backend_factory: Callable = create_backend):
+        self.active_name = default_model
+        self.max_models = max(1, max_models)
+        self.memory_budget_mb = memory_budget_mb
+        self.n_threads = n_threads
+        self.backend_factory = backend_factory
+        self._models: "OrderedDict[str, ResidentModel]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._evictions = 0
+        self._selection_mtime: Optional[float] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def get(self, name: Optional[str] = None):
+        """Backend modelu (domyślnie aktywnego), ładowany przy pierwszym użyciu"""
+        return self._get(name or self.active_name)
+
+    def select(self, name: str) -> Dict[str, Any]:
+        """Przełącza aktywny model bez restartu procesu (po udanym załadowaniu)"""
+        previous = self.active_name
+        self._get(name, activate=True)
+        if previous != name:
+            print(f"Aktywny model LLM: {previous} -> {name}")
+        return self.stats()
+
+    def unload(self, name: str) -> bool:
+        with self._lock:
+            entry = self._models.pop(name, None)
+        if entry is None:
+            return False
+        self._release()
+        return True
+
+    def resident(self):
+        with self._lock:
+            return list(self._models)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            models = [entry.info() for entry in self._models.values()]
+            evictions = self._evictions
+        return {
+            "active": self.active_name,
+            "max_models": self.max_models,
+            "memory_budget_mb": self.memory_budget_mb or None,
+            "resident_mb": round(sum(m["rss_mb"] or 0 for m in models), 1),
+            "evictions": evictions,
+            "models": models,  # od najdawniej używanego
+        }
+
+    # --- Wybór modelu z selected-model.json (volumes/commands.py set_model) ---
+
+    def check_selection(self, path: str) -> None:
+        """Przełącza model, jeśli plik wyboru zmienił się od ostatniego sprawdzenia"""
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            return
+        if mtime == self._selection_mtime:
+            return
+        self._selection_mtime = mtime
+        try:
+            with open(path) as f:
+                name = json.load(f)["name"]
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"Nieprawidłowy plik wyboru modelu {path}: {e}")
+            return
+        if name != self.active_name or name not in self.resident():
+            try:
+                self.select(name)
+            except Exception as e:
+                print(f"Nie udało się przełączyć na model {name}, zostaje {self.active_name}: {e}")
+
+    def watch_selection(self, path: str = DEFAULT_SELECTION_PATH, interval: float = 5.0) -> None:
+        """Wątek sprawdzający plik wyboru modelu co interval sekund"""
+        if self._thread is not None:
+            return
+
+        def run():
+            while True:
+                self.check_selection(path)
+                time.sleep(interval)
+
+        self._thread = threading.Thread(target=run, name="model-selection", daemon=True)
+        self._thread.start()
+
+    def _get(self, name: str, activate: bool = False):
+        backend = self._touch(name)
+        if backend is None:
+            with self._load_lock:
+                backend = self._touch(name)  # inny wątek załadował go w międzyczasie
+                if backend is None:
+                    return self._add(name, activate)
+        if activate:
+            self.active_name = name
+        return backend
+
+    def _add(self, name: str, activate: bool):
+        """Ładuje model obok dotychczasowych, przełącza (activate) i dopiero wtedy zwalnia miejsce"""
+        entry = self._load(name)
+        with self._lock:
+            self._models[name] = entry
+            entry.requests += 1
+            if activate:
+                # Przed usunięciem poprzedniego - zapytania bez nazwy nie załadują go ponownie
+                self.active_name = name
+        self._make_room(keep=name)
+        self._enforce_budget(keep=name)
+        self._update_gauge()
+        return entry.backend
+
+    def _touch(self, name: str):
+        with self._lock:
+            entry = self._models.get(name)
+            if entry is None:
+                return None
+            self._models.move_to_end(name)
+            entry.last_used = time.time()
+            entry.requests += 1
+            return entry.backend
+
+    def _load(self, name: str) -> ResidentModel:
+        rss_before = _rss_mb()
+        start = time.perf_counter()
+        backend = self.backend_factory(name, n_threads=self.n_threads)
+        backend.load()
+        load_seconds = time.perf_counter() - start
+        rss_after = _rss_mb()
+        if Histogram is not None:
+            MODEL_LOAD_SECONDS.labels(name).observe(load_seconds)
+        print(f"Załadowano model LLM {name} w {load_seconds:.1f} s")
+        now = time.time()
+        return ResidentModel(name, backend, load_seconds,
+                             max(0.0, rss_after - rss_before) if rss_before is not None else None, now, now)
+
+    def _evict_lru(self, keep) -> bool:
+        with self._lock:
+            for name in self._models:
+                if name not in keep:
+                    del self._models[name]
+                    self._evictions += 1
+                    print(f"Usunięto z pamięci model LLM {name} (LRU)")
+                    return True
+        return False
+
+    def _make_room(self, keep: str) -> None:
+        """Usuwa modele ponad max_models (poza właśnie załadowanym); aktywny tylko, gdy nie ma innego"""
+        evicted = False
+        while len(self.resident()) > self.max_models:
+            if not (self._evict_lru({keep, self.active_name}) or self._evict_lru({keep})):
+                break
+            evicted = True
+        if evicted:
+            self._release()
+
+    def _enforce_budget(self, keep: str) -> None:
+        if not self.memory_budget_mb:
+            return
+        evicted = False
+        while self.stats()["resident_mb"] > self.memory_budget_mb:
+            if not self._evict_lru({keep, self.active_name}):
+                break
+            evicted = True
+        if evicted:
+            self._release()
+
+    def _release(self) -> None:
+        gc.collect()
+        self._update_gauge()
+
+    def _update_gauge(self) -> None:
+        if Gauge is not None:
+            MODELS_RESIDENT.set(len(self.resident()))
+
+
+def registry_from_env(n_threads: Optional[int] = None) -> ModelRegistry:
+    """Rejestr modeli: domyślny LLM_MODEL_NAME, limity LLM_MAX_MODELS i LLM_MEMORY_BUDGET_MB"""
+    return ModelRegistry(
+        os.getenv("LLM_MODEL_NAME", "distilgpt2"),
+        max_models=int(os.getenv("LLM_MAX_MODELS", "2")),
+        memory_budget_mb=float(os.getenv("LLM_MEMORY_BUDGET_MB", "0")),
+        n_threads=n_threads
+    )
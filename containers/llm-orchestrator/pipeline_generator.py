@@ -3,6 +3,34 @@ import json
 import os
 from typing import Dict, List, Any
 
+from admission import BACKGROUND
+
+# Schemat pipeline'u generowanego przez LLM (podzbiór JSON Schema obsługiwany przez structured_output.py)
+PIPELINE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "name": {"type": "string", "maxLength": 80},
+        "steps": {
+            "type": "array",
+            "minItems": 1,
+            "maxItems": 10,
+            "items": {
+                "type": "object",
+                "properties": {
+                    "type": {"enum": ["navigation", "authentication", "form_filling", "click", "upload",
+                                      "submit", "wait", "analysis"]},
+                    "action": {"type": "string", "maxLength": 40},
+                    "url": {"type": "string", "maxLength": 200},
+                    "selector": {"type": "string", "maxLength": 120},
+                    "value": {"type": "string", "maxLength": 120}
+                },
+                "required": ["type", "action"]
+            }
+        }
+    },
+    "required": ["name", "steps"]
+}
+
 
 class PipelineGenerator:
     """Generator pipeline'ów dla popularnych portali pracy"""
@@ -126,63 +154,27 @@ class PipelineGenerator:
 
     def _generate_custom_pipeline(self, url: str, cv_path: str) -> Dict[str, Any]:
         """Generuje niestandardowy pipeline dla nieznanego portalu przy użyciu LLM"""
-        # Użyj LLM do analizy strony i sugierowania pipeline
+        # Analiza i pipeline w jednym wywołaniu - dekodowanie ograniczone schematem zwraca poprawny JSON
         prompt = f"""
         Analizuję stronę internetową {url}, która wydaje się być portalem pracy.
         Potrzebuję stworzyć pipeline do automatyzacji aplikowania o pracę.
 
-        Proszę o sugestię kroków, które należy wykonać, aby:
+        Zaproponuj kroki, które należy wykonać, aby:
         1. Znaleźć formularze aplikacyjne
         2. Wypełnić je danymi z CV
         3. Przesłać CV i inne wymagane dokumenty
 
-        Sugeruj konkretne selektory CSS lub XPath, które mogą być używane do identyfikacji elementów formularza.
+        Dla każdego kroku podaj konkretny selektor CSS lub XPath elementu formularza.
+        Odpowiedz wyłącznie pipeline'em w formacie JSON, na przykład:
+        {{"name": "Pipeline dla nieznanego portalu", "steps": [
+          {{"type": "navigation", "action": "goto", "url": "{url}"}},
+          {{"type": "form_filling", "action": "fill", "selector": "#email", "value": "personal_info.email"}}
+        ]}}
         """
 
-        # Używamy LLM do analizy i generowania sugestii
-        result = self.llm_manager.generate_text(prompt)
-
-        # Spróbuj sparsować sugestie jako strukturę JSON
         try:
-            # Próba ekstraktowania JSON z odpowiedzi
-            import re
-            json_match = re.search(r'```json\n(.*?)\n```', result, re.DOTALL)
-            if json_match:
-                pipeline_suggestion = json.loads(json_match.group(1))
-            else:
-                # Użyj LLM do strukturyzacji odpowiedzi w formacie JSON
-                structuring_prompt = f"""
-                Przekształć poniższą odpowiedź w strukturę JSON pipeline:
-
-                {result}
-
-                Format oczekiwanej odpowiedzi:
-                {{
-                  "name": "Pipeline dla nieznanego portalu",
-                  "url": "{url}",
-                  "steps": [
-                    {{
-                      "type": "navigation",
-                      "action": "goto",
-                      "url": "{url}"
-                    }},
-                    ...
-                  ]
-                }}
-                """
-                structured_result = self.llm_manager.generate_text(structuring_prompt)
-                # Wyciągnij JSON z odpowiedzi
-                json_match = re.search(r'```json\n(.*?)\n```', structured_result, re.DOTALL)
-                if json_match:
-                    pipeline_suggestion = json.loads(json_match.group(1))
-                else:
-                    json_start = structured_result.find('{')
-                    json_end = structured_result.rfind('}') + 1
-                    if json_start >= 0 and json_end > json_start:
-                        pipeline_json = structured_result[json_start:json_end]
-                        pipeline_suggestion = json.loads(pipeline_json)
-                    else:
-                        raise ValueError("Nie można znaleźć prawidłowej struktury JSON w odpowiedzi")
+            pipeline_suggestion = self.llm_manager.generate_json(prompt, PIPELINE_SCHEMA, priority=BACKGROUND)
+            pipeline_suggestion["url"] = url
 
             # Dodaj ścieżkę do CV
             pipeline_suggestion["cv_path"] = cv_path
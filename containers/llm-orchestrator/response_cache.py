@@ -0,0 +1,162 @@
+# llm-orchestrator/response_cache.py
+# Ten sam plik jest używany w containers/llm-orchestrator-min/microservices/model-service/response_cache.py
+# - zmiany wprowadzaj w obu miejscach.
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+try:
+    from prometheus_client import Counter
+except ImportError:  # metryki są opcjonalne (np. llm-orchestrator-min)
+    Counter = None
+
+if Counter is not None:
+    CACHE_LOOKUPS = Counter("llm_cache_lookups_total", "Odczyty cache odpowiedzi LLM", ["cache", "result"])
+
+# Odstępy wewnątrz wiersza (bez wcięcia); podział na wiersze jest zachowywany - listy i kod zależą od niego
+_INNER_SPACES = re.compile(r"(?<=\S)[ \t]+")
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS llm_cache (
+        key TEXT PRIMARY KEY,
+        model TEXT,
+        response TEXT,
+        created REAL
+    )
+"""
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Prompt bez różnic nieistotnych dla modelu: NFC, wielokrotne spacje i tabulatory w wierszu
+    zwinięte do jednej spacji, bez białych znaków na końcu wierszy i całego promptu"""
+    lines = unicodedata.normalize("NFC", prompt).split("\n")
+    return "\n".join(_INNER_SPACES.sub(" ", line).rstrip() for line in lines).rstrip()
+
+
+def normalize_params(params: Dict[str, Any]) -> Dict[str, Any]:
+    """Parametry liczbowe jako float - temperature=0 i temperature=0.0 dają ten sam klucz"""
+    return {name: float(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else value
+            for name, value in params.items()}
+
+
+def is_deterministic(params: Dict[str, Any]) -> bool:
+    """True dla dekodowania zachłannego (temperature 0 albo do_sample=False)"""
+    if params.get("do_sample") is False:
+        return True
+    temperature = params.get("temperature")
+    return temperature is not None and float(temperature) == 0
+
+
+class ResponseCache:
+    """Cache odpowiedzi LLM kluczowany (model, znormalizowany prompt, parametry próbkowania).
+
+    W pamięci LRU z TTL; opcjonalnie kopia w SQLite (`db_path`), dzięki której
+    cache przeżywa restart - wpis znaleziony na dysku wraca do pamięci.
+    Domyślnie zapamiętywane są tylko odpowiedzi deterministyczne (temperature 0),
+    bo przy próbkowaniu powtórzone zapytanie ma prawo dać inną odpowiedź.
+    """
+
+    def __init__(self, name: str = "llm", max_entries: int = 1024, ttl: float = 3600.0,
+                 db_path: Optional[str] = None, cache_sampled: bool = False):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.cache_sampled = cache_sampled
+        self._entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+        self._db: Optional[sqlite3.Connection] = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(SCHEMA)
+            self._db.execute("DELETE FROM llm_cache WHERE created < ?", (time.time() - ttl,))
+
+    @staticmethod
+    def make_key(model: str, prompt: str, params: Dict[str, Any]) -> str:
+        raw = json.dumps([model, normalize_prompt(prompt), normalize_params(params)], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def cacheable(self, params: Dict[str, Any]) -> bool:
+        return self.cache_sampled or is_deterministic(params)
+
+    def get(self, model: str, prompt: str, params: Dict[str, Any]) -> Optional[str]:
+        if not self.cacheable(params):
+            return None
+        key = self.make_key(model, prompt, params)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if now - entry[1] <= self.ttl:
+                    self._entries.move_to_end(key)
+                    self._count("hits", "hit")
+                    return entry[0]
+                del self._entries[key]
+            if self._db is not None:
+                row = self._db.execute("SELECT response, created FROM llm_cache WHERE key = ? AND created >= ?",
+                                       (key, now - self.ttl)).fetchone()
+                if row is not None:
+                    self._remember(key, row[0], row[1])
+                    self._count("disk_hits", "disk_hit")
+                    return row[0]
+            self._count("misses", "miss")
+        return None
+
+    def put(self, model: str, prompt: str, params: Dict[str, Any], response: str) -> None:
+        if not self.cacheable(params):
+            return
+        key = self.make_key(model, prompt, params)
+        now = time.time()
+        with self._lock:
+            self._remember(key, response, now)
+            self._stats["stores"] += 1
+            if self._db is not None:
+                self._db.execute("INSERT OR REPLACE INTO llm_cache (key, model, response, created) VALUES (?, ?, ?, ?)",
+                                 (key, model, response, now))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM llm_cache")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+        lookups = stats["hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_ratio"] = round((stats["hits"] + stats["disk_hits"]) / lookups, 3) if lookups else 0
+        stats["persistent"] = self._db is not None
+        return stats
+
+    def _remember(self, key: str, response: str, created: float) -> None:
+        self._entries[key] = (response, created)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def _count(self, stat: str, result: str) -> None:
+        self._stats[stat] += 1
+        if Counter is not None:
+            CACHE_LOOKUPS.labels(self.name, result).inc()
+
+
+def cache_from_env(name: str) -> ResponseCache:
+    """Cache skonfigurowany ze zmiennych LLM_CACHE_*; pusta LLM_CACHE_DB = tylko pamięć"""
+    return ResponseCache(
+        name=name,
+        max_entries=int(os.getenv("LLM_CACHE_SIZE", "1024")),
+        ttl=float(os.getenv("LLM_CACHE_TTL", "3600")),
+        db_path=os.getenv("LLM_CACHE_DB") or None,
+        cache_sampled=os.getenv("LLM_CACHE_SAMPLED", "false").lower() == "true"
+    )
@@ -1,37 +1,264 @@
 import smtplib
 import os
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
-from email.mime.base import MIMEBase
-from email import encoders
-from typing import List, Optional
+import threading
+import time
+from contextlib import contextmanager
+from email.message import Message
+from typing import Dict, Iterator, List, Optional, Union
 
-def send_email_with_attachments(to_email: str, subject: str, body: str, attachments: Optional[List[str]] = None) -> bool:
-    smtp_server = os.getenv("SMTP_SERVER")
-    smtp_port = int(os.getenv("SMTP_PORT", "587"))
+from mime_stream import EncodedAttachmentCache, StreamingMessage, send_streaming
+
+# Wiadomość zbudowana w pamięci (email.message) albo generowana strumieniowo
+OutgoingMessage = Union[Message, StreamingMessage]
+
+
+def is_connection_error(error: BaseException) -> bool:
+    """True dla błędów, po których połączenia SMTP nie da się dalej używać.
+
+    SMTPException dziedziczy po OSError, więc odpowiedzi serwera dotyczące
+    pojedynczej wiadomości (np. odrzucony adresat) trzeba odróżnić od zerwań.
+    """
+    if isinstance(error, (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError)):
+        return True
+    return isinstance(error, OSError) and not isinstance(error, smtplib.SMTPException)
+
+
+def smtp_settings() -> Dict:
+    """Konfiguracja SMTP ze zmiennych środowiskowych"""
     smtp_user = os.getenv("SMTP_USER")
-    smtp_pass = os.getenv("SMTP_PASS")
-    from_email = os.getenv("EMAIL_FROM", smtp_user)
-    if not (smtp_server and smtp_user and smtp_pass and to_email):
+    return {
+        "server": os.getenv("SMTP_SERVER"),
+        "port": int(os.getenv("SMTP_PORT", "587")),
+        "user": smtp_user,
+        "password": os.getenv("SMTP_PASS"),
+        "from_email": os.getenv("EMAIL_FROM", smtp_user),
+        "starttls": os.getenv("SMTP_STARTTLS", "true").lower() == "true",
+    }
+
+
+_attachment_cache: Optional[EncodedAttachmentCache] = None
+_attachment_cache_lock = threading.Lock()
+
+
+def get_attachment_cache() -> Optional[EncodedAttachmentCache]:
+    """Pamięć podręczna zakodowanych załączników; ATTACHMENT_CACHE_DIR="" ją wyłącza"""
+    global _attachment_cache
+    cache_dir = os.getenv("ATTACHMENT_CACHE_DIR", "/tmp/coboarding-attachments")
+    if not cache_dir:
+        return None
+    with _attachment_cache_lock:
+        if _attachment_cache is None:
+            max_bytes = int(os.getenv("ATTACHMENT_CACHE_MB", "256")) * 1024 * 1024
+            _attachment_cache = EncodedAttachmentCache(cache_dir, max_bytes)
+        return _attachment_cache
+
+
+def build_streaming_message(from_email: str, to_email: str, subject: str, body: str,
+                            attachments: Optional[List[str]] = None) -> StreamingMessage:
+    """Wiadomość, której załączniki są kodowane porcjami dopiero podczas wysyłki"""
+    for path in attachments or []:
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f"Attachment not found: {path}")
+    return StreamingMessage(from_email, to_email, subject, body, attachments, cache=get_attachment_cache())
+
+
+def _connect(settings: Dict) -> smtplib.SMTP:
+    server = smtplib.SMTP(settings["server"], settings["port"], timeout=settings.get("timeout", 30))
+    try:
+        if settings.get("starttls", True):
+            server.starttls()
+        if settings.get("user"):
+            server.login(settings["user"], settings["password"])
+    except Exception:
+        server.close()
+        raise
+    return server
+
+
+class _PooledConnection:
+    def __init__(self, server: smtplib.SMTP):
+        self.server = server
+        self.sent = 0
+        self.last_used = time.monotonic()
+
+
+class SMTPPool:
+    """Pula uwierzytelnionych połączeń SMTP współdzielona między wątkami.
+
+    Połączenie nieużywane dłużej niż `noop_after` sekund jest sprawdzane
+    komendą NOOP przed ponownym użyciem, po `max_idle` sekundach jest
+    zamykane, a po `max_messages` wiadomościach wymieniane na nowe.
+    Zerwane połączenie jest odtwarzane i wysyłka ponawiana raz.
+    """
+
+    def __init__(self, settings: Optional[Dict] = None, size: int = 4, max_messages: int = 100,
+                 noop_after: float = 30.0, max_idle: float = 300.0):
+        self.settings = settings or smtp_settings()
+        self.size = size
+        self.max_messages = max_messages
+        self.noop_after = noop_after
+        self.max_idle = max_idle
+        self._idle: List[_PooledConnection] = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(size)
+        self.stats = {"connects": 0, "reused": 0, "noop_failures": 0, "reconnects": 0}
+
+    @contextmanager
+    def connection(self) -> Iterator[_PooledConnection]:
+        """Wypożycza połączenie z puli; zerwane połączenia nie wracają do puli"""
+        self._slots.acquire()
+        conn = None
+        try:
+            conn = self._checkout()
+            yield conn
+        except OSError as e:
+            if conn is not None and is_connection_error(e):
+                self._discard(conn)
+                conn = None
+            raise
+        finally:
+            if conn is not None:
+                self._checkin(conn)
+            self._slots.release()
+
+    def send(self, msg: OutgoingMessage) -> None:
+        """Wysyła jedną wiadomość, ponawiając raz po zerwaniu połączenia"""
+        for attempt in (1, 2):
+            try:
+                with self.connection() as conn:
+                    self._send_on(conn, msg)
+                return
+            except OSError as e:
+                if attempt == 2 or not is_connection_error(e):
+                    raise
+                self._count("reconnects")
+
+    def send_many(self, messages: List[OutgoingMessage]) -> List[Optional[Exception]]:
+        """Wysyła wiadomości jednym połączeniem (wymienianym po max_messages lub zerwaniu).
+
+        Zwraca listę wyników w kolejności wiadomości: None oznacza sukces,
+        w przeciwnym razie wyjątek, który wystąpił przy tej wiadomości.
+        """
+        results: List[Optional[Exception]] = []
+        remaining = list(messages)
+        retried = False
+        while remaining:
+            try:
+                with self.connection() as conn:
+                    while remaining and conn.sent < self.max_messages:
+                        try:
+                            self._send_on(conn, remaining[0])
+                            results.append(None)
+                        except smtplib.SMTPServerDisconnected:
+                            raise
+                        except smtplib.SMTPException as e:
+                            # Błąd dotyczy tej wiadomości (np. odrzucony adresat) - sesja działa dalej
+                            results.append(e)
+                        remaining.pop(0)
+                        retried = False
+            except OSError as e:
+                if retried or not is_connection_error(e):
+                    # Np. błąd logowania albo drugie zerwanie z rzędu - reszta kończy się tym błędem
+                    results.extend([e] * len(remaining))
+                    break
+                retried = True
+                self._count("reconnects")
+        return results
+
+    def close(self) -> None:
+        """Zamyka wszystkie bezczynne połączenia"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            self._quit(conn)
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self.stats[key] += 1
+
+    def _send_on(self, conn: _PooledConnection, msg: OutgoingMessage) -> None:
+        if isinstance(msg, StreamingMessage):
+            send_streaming(conn.server, msg)
+        else:
+            conn.server.send_message(msg)
+        conn.sent += 1
+        conn.last_used = time.monotonic()
+
+    def _checkout(self) -> _PooledConnection:
+        while True:
+            with self._lock:
+                conn = self._idle.pop() if self._idle else None
+            if conn is None:
+                self._count("connects")
+                return _PooledConnection(_connect(self.settings))
+            idle_for = time.monotonic() - conn.last_used
+            if idle_for > self.max_idle:
+                self._quit(conn)
+                continue
+            if idle_for > self.noop_after:
+                try:
+                    ok = conn.server.noop()[0] == 250
+                except OSError:
+                    ok = False
+                if not ok:
+                    self._count("noop_failures")
+                    conn.server.close()
+                    continue
+            self._count("reused")
+            return conn
+
+    def _checkin(self, conn: _PooledConnection) -> None:
+        if conn.sent >= self.max_messages:
+            self._quit(conn)
+            return
+        with self._lock:
+            self._idle.append(conn)
+
+    def _discard(self, conn: _PooledConnection) -> None:
+        try:
+            conn.server.close()
+        except OSError:
+            pass
+
+    def _quit(self, conn: _PooledConnection) -> None:
+        try:
+            conn.server.quit()
+        except OSError:
+            conn.server.close()
+
+
+_default_pool: Optional[SMTPPool] = None
+_default_pool_lock = threading.Lock()
+
+
+def get_smtp_pool() -> SMTPPool:
+    """Współdzielona pula SMTP skonfigurowana ze zmiennych środowiskowych"""
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None:
+            settings = smtp_settings()
+            if not (settings["server"] and settings["user"] and settings["password"]):
+                raise ValueError("Missing SMTP configuration")
+            _default_pool = SMTPPool(
+                settings,
+                size=int(os.getenv("SMTP_POOL_SIZE", "4")),
+                max_messages=int(os.getenv("SMTP_MAX_MESSAGES_PER_CONNECTION", "100")),
+                noop_after=float(os.getenv("SMTP_NOOP_AFTER", "30")),
+                max_idle=float(os.getenv("SMTP_MAX_IDLE", "300"))
+            )
+        return _default_pool
+
+
+def send_many(messages: List[OutgoingMessage]) -> List[Optional[Exception]]:
+    """Wysyła wiele wiadomości przez współdzieloną pulę SMTP"""
+    return get_smtp_pool().send_many(messages)
+
+
+def send_email_with_attachments(to_email: str, subject: str, body: str, attachments: Optional[List[str]] = None) -> bool:
+    pool = get_smtp_pool()
+    if not to_email:
         raise ValueError("Missing SMTP configuration or recipient email")
 
-    msg = MIMEMultipart()
-    msg['From'] = from_email
-    msg['To'] = to_email
-    msg['Subject'] = subject
-    msg.attach(MIMEText(body, 'plain'))
-
-    if attachments:
-        for path in attachments:
-            part = MIMEBase('application', 'octet-stream')
-            with open(path, 'rb') as f:
-                part.set_payload(f.read())
-            encoders.encode_base64(part)
-            part.add_header('Content-Disposition', f'attachment; filename="{os.path.basename(path)}"')
-            msg.attach(part)
-
-    with smtplib.SMTP(smtp_server, smtp_port) as server:
-        server.starttls()
-        server.login(smtp_user, smtp_pass)
-        server.send_message(msg)
+    msg = build_streaming_message(pool.settings["from_email"], to_email, subject, body, attachments)
+    pool.send(msg)
     return True
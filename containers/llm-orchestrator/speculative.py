@@ -0,0 +1,206 @@
+# llm-orchestrator/speculative.py
+import threading
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import torch
+
+try:
+    from prometheus_client import Counter
+except ImportError:  # metryki są opcjonalne
+    Counter = None
+
+if Counter is not None:
+    DRAFT_TOKENS = Counter("llm_speculative_draft_tokens_total", "Tokeny zaproponowane przez model szkicowy",
+                           ["model", "draft"])
+    ACCEPTED_TOKENS = Counter("llm_speculative_accepted_tokens_total",
+                              "Tokeny modelu szkicowego zaakceptowane przez model docelowy", ["model", "draft"])
+    TARGET_PASSES = Counter("llm_speculative_target_passes_total", "Przebiegi weryfikacji modelu docelowego",
+                            ["model", "draft"])
+
+
+class SpeculativeStats:
+    """Liczniki dekodowania spekulatywnego jednego modelu (acceptance rate, tokeny na przebieg modelu docelowego)"""
+
+    def __init__(self, model: str, draft: str):
+        self.model = model
+        self.draft = draft
+        self.drafted = 0
+        self.accepted = 0
+        self.passes = 0
+        self.generated = 0
+        self._lock = threading.Lock()
+
+    def record(self, drafted: int, accepted: int, generated: int) -> None:
+        with self._lock:
+            self.drafted += drafted
+            self.accepted += accepted
+            self.passes += 1
+            self.generated += generated
+        if Counter is not None:
+            DRAFT_TOKENS.labels(self.model, self.draft).inc(drafted)
+            ACCEPTED_TOKENS.labels(self.model, self.draft).inc(accepted)
+            TARGET_PASSES.labels(self.model, self.draft).inc()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "draft": self.draft,
+                "drafted": self.drafted,
+                "accepted": self.accepted,
+                "acceptance_rate": round(self.accepted / self.drafted, 3) if self.drafted else None,
+                "tokens_per_pass": round(self.generated / self.passes, 2) if self.passes else None,
+            }
+
+
+def compatible(tokenizer, draft_tokenizer) -> bool:
+    """Model szkicowy musi mieć ten sam słownik - weryfikacja porównuje identyfikatory tokenów"""
+    return tokenizer.get_vocab() == draft_tokenizer.get_vocab()
+
+
+def _crop(past, length: int):
+    """Obcina cache klucz/wartość (krotki [batch, głowy, sekwencja, wymiar]) do pierwszych length pozycji"""
+    return tuple(tuple(t[..., :length, :] for t in layer) for layer in past)
+
+
+def _probs(logits: torch.Tensor, temperature: float, top_p: float) -> torch.Tensor:
+    probs = torch.softmax(logits.float() / temperature, dim=-1)
+    if top_p < 1.0:
+        sorted_probs, order = torch.sort(probs, descending=True, dim=-1)
+        outside = sorted_probs.cumsum(dim=-1) - sorted_probs > top_p
+        sorted_probs[outside] = 0.0
+        probs = torch.zeros_like(probs).scatter(-1, order, sorted_probs)
+        probs = probs / probs.sum(dim=-1, keepdim=True)
+    return probs
+
+
+class _Model:
+    """Model z cache klucz/wartość dla jednej sekwencji; cached = liczba tokenów w cache"""
+
+    def __init__(self, model):
+        self.model = model
+        self.past = None
+        self.cached = 0
+
+    def forward(self, tokens: List[int]) -> torch.Tensor:
+        """Logity dla tokenów spoza cache (tokens to cała sekwencja)"""
+        new = torch.tensor([tokens[self.cached:]], dtype=torch.long)
+        out = self.model(input_ids=new, past_key_values=self.past, use_cache=True)
+        if not isinstance(out.past_key_values, tuple):
+            # Nowsze transformers zwracają obiekt Cache - _crop obsługuje tylko krotki
+            raise TypeError(f"Dekodowanie spekulatywne wymaga cache klucz/wartość w formacie krotek, "
+                            f"model zwrócił {type(out.past_key_values).__name__}")
+        self.past = out.past_key_values
+        self.cached = len(tokens)
+        return out.logits[0]
+
+    def rewind(self, length: int) -> None:
+        if length < self.cached:
+            self.past = _crop(self.past, length)
+            self.cached = length
+
+
+def _draft(draft: _Model, tokens: List[int], k: int, temperature: float,
+           top_p: float) -> Tuple[List[int], List[torch.Tensor]]:
+    proposed, probs = [], []
+    for _ in range(k):
+        logits = draft.forward(tokens + proposed)[-1]
+        if temperature > 0:
+            q = _probs(logits, temperature, top_p)
+            token = int(torch.multinomial(q, 1))
+            probs.append(q)
+        else:
+            token = int(logits.argmax())
+        proposed.append(token)
+    return proposed, probs
+
+
+def _verify(logits: torch.Tensor, proposed: List[int], draft_probs: List[torch.Tensor],
+            temperature: float, top_p: float) -> List[int]:
+    """Zaakceptowany prefiks szkicu + jeden token modelu docelowego (poprawka albo token dodatkowy).
+
+    Zachłannie: token szkicu przechodzi, gdy jest argmaxem modelu docelowego - wynik
+    odpowiada generate() bez szkicu. Przy próbkowaniu token x przechodzi
+    z prawdopodobieństwem min(1, p(x)/q(x)), a po odrzuceniu losowany jest z
+    max(0, p - q) - rozkład wyniku jest taki sam jak próbkowanie z samego modelu docelowego.
+    """
+    accepted = []
+    for i, token in enumerate(proposed):
+        if temperature > 0:
+            p = _probs(logits[i], temperature, top_p)
+            q = draft_probs[i]
+            if torch.rand(()) < p[token] / q[token]:
+                accepted.append(token)
+                continue
+            residual = torch.clamp(p - q, min=0)
+            total = residual.sum()
+            accepted.append(int(torch.multinomial(residual / total if total > 0 else p, 1)))
+            return accepted
+        target_token = int(logits[i].argmax())
+        accepted.append(target_token)
+        if target_token != token:
+            return accepted
+    last = logits[len(proposed)]
+    accepted.append(int(torch.multinomial(_probs(last, temperature, top_p), 1)) if temperature > 0
+                    else int(last.argmax()))
+    return accepted
+
+
+def speculative_tokens(model, draft_model, input_ids: List[int], max_new_tokens: int, num_draft_tokens: int = 4,
+                       temperature: float = 0.0, top_p: float = 1.0, eos_token_id: Optional[int] = None,
+                       stats: Optional[SpeculativeStats] = None,
+                       cancel: Optional[threading.Event] = None) -> Iterator[List[int]]:
+    """Nowe tokeny porcjami - po każdym przebiegu weryfikacji modelu docelowego.
+
+    Model szkicowy proponuje num_draft_tokens tokenów autoregresywnie, a model
+    docelowy ocenia je wszystkie w jednym przebiegu (jak prompt), więc na jeden
+    kosztowny przebieg przypada od 1 do num_draft_tokens + 1 tokenów. Po
+    odrzuceniu części szkicu cache obu modeli jest przycinany do zaakceptowanego
+    prefiksu. Jedna sekwencja (batch 1); modele z cache w formacie krotek
+    [batch, głowy, sekwencja, wymiar] (GPT-2, Llama, Mistral).
+    """
+    target, draft = _Model(model), _Model(draft_model)
+    tokens = list(input_ids)
+    generated = 0
+    with torch.no_grad():
+        # Cache obejmuje wszystko poza ostatnim tokenem - ten idzie do przebiegu razem ze szkicem
+        if len(tokens) > 1:
+            target.forward(tokens[:-1])
+            draft.forward(tokens[:-1])
+        while generated < max_new_tokens:
+            if cancel is not None and cancel.is_set():
+                return
+            k = min(num_draft_tokens, max_new_tokens - generated - 1)
+            proposed, draft_probs = _draft(draft, tokens, k, temperature, top_p)
+            start = target.cached
+            logits = target.forward(tokens + proposed)[len(tokens) - 1 - start:]
+            accepted = _verify(logits, proposed, draft_probs, temperature, top_p)
+            matched = len(accepted) - 1
+            target.rewind(len(tokens) + matched)
+            draft.rewind(len(tokens) + matched)
+            if eos_token_id is not None and eos_token_id in accepted:
+                accepted = accepted[:accepted.index(eos_token_id) + 1]
+            accepted = accepted[:max_new_tokens - generated]
+            if stats is not None:
+                stats.record(len(proposed), matched, len(accepted))
+            tokens.extend(accepted)
+            generated += len(accepted)
+            yield accepted
+            if eos_token_id is not None and accepted[-1] == eos_token_id:
+                return
+
+
+def speculative_stream(model, draft_model, tokenizer, prompt: str, max_new_tokens: int, **kwargs) -> Iterator[str]:
+    """Fragmenty tekstu (bez promptu) z speculative_tokens"""
+    input_ids = tokenizer(prompt)["input_ids"]
+    generated: List[int] = []
+    emitted = ""
+    for chunk in speculative_tokens(model, draft_model, input_ids, max_new_tokens,
+                                    eos_token_id=tokenizer.eos_token_id, **kwargs):
+        generated.extend(chunk)
+        text = tokenizer.decode(generated, skip_special_tokens=True)
+        # Niedokończony znak wielobajtowy czeka na kolejne tokeny
+        if text.endswith("\ufffd"):
+            continue
+        if len(text) > len(emitted):
+            yield text[len(emitted):]
+            emitted = text
@@ -0,0 +1,282 @@
+# llm-orchestrator/status_store.py
+import base64
+import queue
+import sqlite3
+import sys
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS form_status (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        form_url TEXT,
+        notify_email TEXT,
+        status_code INTEGER,
+        details TEXT,
+        ts DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+# Kolejne migracje schematu; numer wersji trzymany w PRAGMA user_version.
+# Indeksy kończą się na ts, a rowid (id) jest dołączany do każdego indeksu
+# automatycznie, więc sortowanie (ts, id) przy paginacji nie wymaga sortowania.
+INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_form_status_ts ON form_status (ts)",
+    "CREATE INDEX IF NOT EXISTS idx_form_status_url_ts ON form_status (form_url, ts)",
+    "CREATE INDEX IF NOT EXISTS idx_form_status_email_ts ON form_status (notify_email, ts)",
+    "CREATE INDEX IF NOT EXISTS idx_form_status_code_ts ON form_status (status_code, ts)",
+    # Indeksy pokrywające dla agregatów (domena, godzina, kod statusu)
+    "CREATE INDEX IF NOT EXISTS idx_form_status_domain_ts ON form_status (domain, ts, status_code)",
+    "CREATE INDEX IF NOT EXISTS idx_form_status_ts_domain ON form_status (ts, domain, status_code)",
+]
+SCHEMA_VERSION = 1
+BACKFILL_BATCH = 10000
+
+_STOP = object()
+
+
+def url_domain(form_url: Optional[str]) -> Optional[str]:
+    """Domena z adresu formularza (bez portu i prefiksu www.)"""
+    if not form_url:
+        return None
+    host = urlparse(form_url if "//" in form_url else f"//{form_url}").hostname or ""
+    return host[4:] if host.startswith("www.") else host or None
+
+
+def normalize_ts(value: Optional[str]) -> Optional[str]:
+    """Zamienia znacznik czasu ISO 8601 na format kolumny ts (UTC, 'YYYY-MM-DD HH:MM:SS')"""
+    if not value:
+        return None
+    dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def encode_cursor(ts: str, row_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{ts}|{row_id}".encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[str, int]:
+    ts, row_id = base64.urlsafe_b64decode(cursor.encode()).decode().rsplit("|", 1)
+    return ts, int(row_id)
+
+
+def migrate(conn: sqlite3.Connection) -> int:
+    """Doprowadza bazę form_status do bieżącej wersji schematu; zwraca wersję"""
+    conn.execute(SCHEMA)
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version < 1:
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(form_status)")]
+        if "domain" not in columns:
+            conn.execute("ALTER TABLE form_status ADD COLUMN domain TEXT")
+        # Uzupełnianie domeny paczkami, żeby nie trzymać długiej blokady na dużych plikach
+        last_id = 0
+        while True:
+            rows = conn.execute(
+                "SELECT id, form_url FROM form_status WHERE id > ? ORDER BY id LIMIT ?",
+                (last_id, BACKFILL_BATCH)
+            ).fetchall()
+            if not rows:
+                break
+            with conn:
+                conn.executemany(
+                    "UPDATE form_status SET domain = ? WHERE id = ?",
+                    [(url_domain(url), row_id) for row_id, url in rows]
+                )
+            last_id = rows[-1][0]
+        for ddl in INDEXES:
+            conn.execute(ddl)
+        conn.execute("ANALYZE form_status")
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        conn.commit()
+    return SCHEMA_VERSION
+
+
+class StatusStore:
+    """Zapis statusów formularzy do SQLite przez jedno długożyjące połączenie.
+
+    Baza działa w trybie WAL, schemat tworzony jest raz przy starcie, a wiersze
+    trafiają do kolejki, z której wątek zapisujący zatwierdza je paczkami
+    (group commit) - jedna transakcja na wiele zgłoszeń. Odczyty idą przez
+    osobne połączenia per wątek, więc nie czekają na zapis.
+    """
+
+    def __init__(self, db_path: str, batch_size: int = 200, flush_interval: float = 0.05):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue" = queue.Queue()
+        self._readers = threading.local()
+
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # W trybie WAL synchronous=NORMAL jest bezpieczne przy awarii procesu
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        migrate(self._conn)
+
+        self._writer = threading.Thread(target=self._write_loop, name="status-writer", daemon=True)
+        self._writer.start()
+
+    def record(self, form_url: str, notify_email: Optional[str], status_code: int, details: str) -> None:
+        """Dodaje wiersz do kolejki zapisu (nie blokuje wywołującego)"""
+        self._queue.put((form_url, notify_email, status_code, details, url_domain(form_url)))
+
+    def flush(self) -> None:
+        """Czeka, aż wszystkie zakolejkowane wiersze zostaną zapisane"""
+        self._queue.join()
+
+    def close(self) -> None:
+        """Zapisuje zaległe wiersze, zatrzymuje wątek i zamyka połączenie"""
+        self._queue.put(_STOP)
+        self._writer.join()
+        self._conn.close()
+
+    def get(self, status_id: int) -> Optional[Dict[str, Any]]:
+        """Pojedynczy wpis po id"""
+        row = self._reader().execute(
+            "SELECT id, form_url, notify_email, status_code, details, ts, domain FROM form_status WHERE id = ?",
+            (status_id,)
+        ).fetchone()
+        return self._row_to_dict(row) if row else None
+
+    def query(
+        self,
+        form_url: Optional[str] = None,
+        notify_email: Optional[str] = None,
+        domain: Optional[str] = None,
+        status_code: Optional[int] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Historia statusów od najnowszych, z paginacją po kluczu (ts, id).
+
+        Zwraca (wiersze, kursor następnej strony lub None).
+        """
+        where, params = [], []
+        for column, value in (("form_url", form_url), ("notify_email", notify_email),
+                              ("domain", domain), ("status_code", status_code)):
+            if value is not None:
+                where.append(f"{column} = ?")
+                params.append(value)
+        if since:
+            where.append("ts >= ?")
+            params.append(normalize_ts(since))
+        if until:
+            where.append("ts < ?")
+            params.append(normalize_ts(until))
+        if cursor:
+            cursor_ts, cursor_id = decode_cursor(cursor)
+            where.append("(ts, id) < (?, ?)")
+            params.extend([cursor_ts, cursor_id])
+
+        sql = "SELECT id, form_url, notify_email, status_code, details, ts, domain FROM form_status"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY ts DESC, id DESC LIMIT ?"
+        params.append(limit + 1)
+
+        rows = self._reader().execute(sql, params).fetchall()
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1][5], rows[-1][0])
+        return [self._row_to_dict(row) for row in rows], next_cursor
+
+    def stats(
+        self,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        domain: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """Liczba zgłoszeń i odsetek sukcesów (kody 2xx) per domena per godzina"""
+        where, params = [], []
+        if domain:
+            where.append("domain = ?")
+            params.append(domain)
+        if since:
+            where.append("ts >= ?")
+            params.append(normalize_ts(since))
+        if until:
+            where.append("ts < ?")
+            params.append(normalize_ts(until))
+
+        sql = (
+            "SELECT domain, substr(ts, 1, 13) || ':00:00' AS hour, COUNT(*) AS total, "
+            "SUM(CASE WHEN status_code BETWEEN 200 AND 299 THEN 1 ELSE 0 END) AS succeeded "
+            "FROM form_status"
+        )
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " GROUP BY domain, hour ORDER BY hour DESC, domain"
+
+        return [
+            {
+                "domain": row[0],
+                "hour": row[1],
+                "total": row[2],
+                "succeeded": row[3],
+                "success_rate": round(row[3] / row[2], 4) if row[2] else None,
+            }
+            for row in self._reader().execute(sql, params)
+        ]
+
+    def _reader(self) -> sqlite3.Connection:
+        conn = getattr(self._readers, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True)
+            self._readers.conn = conn
+        return conn
+
+    @staticmethod
+    def _row_to_dict(row) -> Dict[str, Any]:
+        return {
+            "id": row[0],
+            "form_url": row[1],
+            "notify_email": row[2],
+            "status_code": row[3],
+            "details": row[4],
+            "ts": row[5],
+            "domain": row[6],
+        }
+
+    def _write_loop(self) -> None:
+        while True:
+            item = self._queue.get()
+            batch = [item]
+            # Zbierz wszystko, co przyszło w międzyczasie, aż do batch_size
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get(timeout=self.flush_interval))
+                except queue.Empty:
+                    break
+
+            stop = _STOP in batch
+            rows = [row for row in batch if row is not _STOP]
+            try:
+                if rows:
+                    with self._conn:
+                        self._conn.executemany(
+                            "INSERT INTO form_status (form_url, notify_email, status_code, details, domain) "
+                            "VALUES (?, ?, ?, ?, ?)", rows
+                        )
+            except sqlite3.Error as e:
+                print(f"Błąd zapisu statusów formularzy: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+            if stop:
+                return
+
+
+if __name__ == "__main__":
+    # Migracja istniejącego pliku bez uruchamiania API:
+    #   python status_store.py /app/form_status.db
+    path = sys.argv[1] if len(sys.argv) > 1 else "form_status.db"
+    connection = sqlite3.connect(path)
+    print(f"{path}: schemat w wersji {migrate(connection)}")
+    connection.close()
@@ -0,0 +1,348 @@
+# llm-orchestrator/structured_output.py
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+_DIGITS = "0123456789"
+_MAX_NUMBER = 16  # znaków liczby
+_ESCAPES = '"\\/bfnrt'
+_HEX = "0123456789abcdefABCDEF"
+_ESC = -1  # w ramce napisu: po odwróconym ukośniku; liczba dodatnia - cyfry \uXXXX do wczytania
+
+# Ramki stosu parsera (krotki - stan kopiuje się bez kosztu przy sprawdzaniu kandydatów)
+_VALUE, _OBJ, _OBJKEY, _KEY, _COLON, _ARR, _STR, _NUM, _LIT = range(9)
+# W tych miejscach token może zaczynać się jedną spacją (np. ' "' po dwukropku)
+_SPACE_BEFORE = (_VALUE, _OBJ, _OBJKEY, _COLON, _ARR)
+
+
+class _Node:
+    """Skompilowany fragment schematu JSON"""
+
+    __slots__ = ("kind", "props", "required", "items", "min_items", "max_items", "enum", "max_length", "min_chars")
+
+    def __init__(self, schema: Dict[str, Any]):
+        self.enum = tuple(schema["enum"]) if "enum" in schema else None
+        self.kind = "string" if self.enum is not None else schema.get("type")
+        if self.enum is not None and not all(isinstance(value, str) for value in self.enum):
+            raise ValueError("enum obsługuje tylko wartości tekstowe")
+        if self.kind not in ("object", "array", "string", "integer", "number", "boolean", "null"):
+            raise ValueError(f"Nieobsługiwany typ w schemacie: {self.kind}")
+        self.props = [(name, _Node(sub)) for name, sub in schema.get("properties", {}).items()]
+        self.required = set(schema.get("required", []))
+        self.items = _Node(schema["items"]) if self.kind == "array" else None
+        self.min_items = schema.get("minItems", 0)
+        self.max_items = schema.get("maxItems", 64)
+        self.max_length = schema.get("maxLength")
+        self.min_chars = self._min_chars()
+
+    def _min_chars(self) -> int:
+        """Długość najkrótszej wartości zgodnej ze schematem"""
+        if self.kind == "object":
+            return 1 + self.tail(0, True)
+        if self.kind == "array":
+            return 2 + self.min_items * self.items.min_chars + max(0, self.min_items - 1)
+        if self.kind == "string":
+            return 2 + (min(len(value) for value in self.enum) if self.enum else 0)
+        return {"boolean": 4, "null": 4}.get(self.kind, 1)
+
+    def member_chars(self, index: int) -> int:
+        """"nazwa":wartość - najkrótsza para klucz-wartość właściwości index"""
+        name, sub = self.props[index]
+        return len(name) + 3 + sub.min_chars
+
+    def tail(self, pos: int, first: bool) -> int:
+        """Najmniej znaków do domknięcia obiektu od właściwości pos (wymagane pary, przecinki i '}')"""
+        chars = 1
+        for index in range(pos, len(self.props)):
+            if self.props[index][0] in self.required:
+                chars += self.member_chars(index) + (0 if first else 1)
+                first = False
+        return chars
+
+    def keys_from(self, pos: int) -> List[Tuple[int, str]]:
+        """Klucze mogące wystąpić jako następne: właściwości w kolejności schematu, bez pomijania wymaganych"""
+        keys = []
+        for index in range(pos, len(self.props)):
+            keys.append((index, self.props[index][0]))
+            if self.props[index][0] in self.required:
+                break
+        return keys
+
+    def can_close(self, pos: int) -> bool:
+        return not any(name in self.required for name, _ in self.props[pos:])
+
+
+def _step(stack: tuple, ch: str) -> Optional[tuple]:
+    """Stan po znaku ch albo None, gdy znak nie pasuje do schematu; pusty stos = gotowy dokument"""
+    if not stack:
+        return None
+    frame, rest = stack[-1], stack[:-1]
+    kind = frame[0]
+    if kind == _VALUE:
+        node = frame[1]
+        if node.kind == "object":
+            return rest + ((_OBJ, node, 0, True),) if ch == "{" else None
+        if node.kind == "array":
+            return rest + ((_ARR, node, 0, False),) if ch == "[" else None
+        if node.kind == "string":
+            return rest + ((_STR, node, "", 0),) if ch == '"' else None
+        if node.kind in ("integer", "number"):
+            return rest + ((_NUM, node, ch),) if ch == "-" or ch in _DIGITS else None
+        literal = {"t": "rue", "f": "alse"} if node.kind == "boolean" else {"n": "ull"}
+        return rest + ((_LIT, literal[ch]),) if ch in literal else None
+    if kind == _OBJ:
+        _, node, pos, first = frame
+        if ch == "}" and node.can_close(pos):
+            return rest
+        if ch == ('"' if first else ",") and node.keys_from(pos):
+            return rest + ((_KEY, node, pos, ""),) if first else rest + ((_OBJKEY, node, pos),)
+        return None
+    if kind == _OBJKEY:
+        return rest + ((_KEY, frame[1], frame[2], ""),) if ch == '"' else None
+    if kind == _KEY:
+        _, node, pos, buf = frame
+        keys = node.keys_from(pos)
+        if ch == '"':
+            for index, name in keys:
+                if name == buf:
+                    return rest + ((_COLON, node, index),)
+            return None
+        buf += ch
+        return rest + ((_KEY, node, pos, buf),) if any(name.startswith(buf) for _, name in keys) else None
+    if kind == _COLON:
+        _, node, index = frame
+        return rest + ((_OBJ, node, index + 1, False), (_VALUE, node.props[index][1])) if ch == ":" else None
+    if kind == _ARR:
+        _, node, count, after = frame
+        if ch == "]" and count >= node.min_items:
+            return rest
+        if count >= node.max_items:
+            return None
+        if after:
+            return rest + ((_ARR, node, count + 1, True), (_VALUE, node.items)) if ch == "," else None
+        return _step(rest + ((_ARR, node, 1, True), (_VALUE, node.items)), ch)
+    if kind == _STR:
+        _, node, buf, escaped = frame
+        if escaped == _ESC:
+            if ch == "u":
+                return rest + ((_STR, node, buf + ch, 4),)
+            return rest + ((_STR, node, buf + ch, 0),) if ch in _ESCAPES else None
+        if escaped:
+            return rest + ((_STR, node, buf, escaped - 1),) if ch in _HEX else None
+        if ch == '"':
+            return rest if node.enum is None or buf in node.enum else None
+        if ord(ch) < 0x20 or (node.max_length is not None and len(buf) >= node.max_length):
+            return None
+        if node.enum is not None:
+            return rest + ((_STR, node, buf + ch, 0),) if any(v.startswith(buf + ch) for v in node.enum) else None
+        return rest + ((_STR, node, buf, _ESC),) if ch == "\\" else rest + ((_STR, node, buf + ch, 0),)
+    if kind == _NUM:
+        _, node, buf = frame
+        if ch in _DIGITS:
+            leading_zero = buf.lstrip("-") == "0"
+            return rest + ((_NUM, node, buf + ch),) if not leading_zero and len(buf) < _MAX_NUMBER else None
+        # Po kropce musi zmieścić się jeszcze cyfra - inaczej stan bez wyjścia
+        if ch == "." and node.kind == "number" and "." not in buf and buf[-1] in _DIGITS \
+                and len(buf) < _MAX_NUMBER - 1:
+            return rest + ((_NUM, node, buf + ch),)
+        # Liczba kończy się na pierwszym znaku spoza niej - ten znak należy już do rodzica
+        return _step(rest, ch) if buf[-1] in _DIGITS else None
+    if kind == _LIT:
+        remaining = frame[1]
+        if ch != remaining[0]:
+            return None
+        return rest + ((_LIT, remaining[1:]),) if len(remaining) > 1 else rest
+    return None
+
+
+def _feed(stack: tuple, text: str) -> Optional[tuple]:
+    if text.startswith(" ") and stack and stack[-1][0] in _SPACE_BEFORE:
+        text = text[1:]
+        if not text or text[0].isspace():
+            return None
+    for ch in text:
+        stack = _step(stack, ch)
+        if stack is None:
+            return None
+    return stack
+
+
+def _closing(stack: tuple) -> int:
+    """Najmniej znaków potrzebnych do domknięcia dokumentu ze stanu stack"""
+    chars = 0
+    for frame in stack:
+        kind = frame[0]
+        if kind == _VALUE:
+            chars += frame[1].min_chars
+        elif kind == _OBJ:
+            chars += frame[1].tail(frame[2], frame[3])
+        elif kind in (_OBJKEY, _KEY):
+            node, pos = frame[1], frame[2]
+            typed = frame[3] if kind == _KEY else None
+            chars += min(node.member_chars(index) - (1 + len(typed) if typed is not None else 0)
+                         + node.tail(index + 1, False)
+                         for index, name in node.keys_from(pos) if typed is None or name.startswith(typed))
+        elif kind == _COLON:
+            node, index = frame[1], frame[2]
+            chars += 1 + node.props[index][1].min_chars + node.tail(index + 1, False)
+        elif kind == _ARR:
+            _, node, count, after = frame
+            missing = max(0, node.min_items - count)
+            chars += 1 + missing * (node.items.min_chars + 1) - (1 if missing and not after else 0)
+        elif kind == _STR:
+            _, node, buf, escaped = frame
+            if escaped:
+                chars += 1 + (1 if escaped == _ESC else escaped)
+            elif node.enum is not None:
+                chars += 1 + min(len(value) - len(buf) for value in node.enum if value.startswith(buf))
+            else:
+                chars += 1
+        elif kind == _NUM:
+            chars += 0 if frame[2][-1] in _DIGITS else 1
+        elif kind == _LIT:
+            chars += len(frame[1])
+    return chars
+
+
+class JsonSchemaConstraint:
+    """Dopuszczalne następne tokeny, tak by wygenerowany tekst był dokumentem JSON zgodnym ze schematem.
+
+    Obsługiwany podzbiór JSON Schema: object (properties, required - klucze
+    w kolejności schematu, bez dodatkowych), array (items, minItems, maxItems),
+    string (enum, maxLength), integer, number, boolean, null. JSON jest zwarty
+    (bez białych znaków poza pojedynczą spacją na początku tokenu). Gotowy
+    dokument dopuszcza już tylko token końca (eos_token_id).
+
+    Z max_tokens dopuszczane są tylko tokeny, po których dokument da się
+    jeszcze domknąć w pozostałych tokenach (licząc po jednym znaku na token),
+    więc przy kończącym się limicie model domyka napisy, tablice i obiekty
+    zamiast urwać dokument w połowie.
+    """
+
+    def __init__(self, schema: Dict[str, Any], token_text: Callable[[int], Optional[str]], eos_token_id: int,
+                 max_tokens: Optional[int] = None):
+        self.state: Optional[tuple] = ((_VALUE, _Node(schema)),)
+        self.token_text = token_text
+        self.eos_token_id = eos_token_id
+        self.remaining = max_tokens
+
+    @property
+    def done(self) -> bool:
+        return self.state == ()
+
+    def advance(self, token_id: int) -> None:
+        """Uwzględnia token wybrany w poprzednim kroku"""
+        if self.remaining is not None:
+            self.remaining -= 1
+        if token_id == self.eos_token_id or self.state is None:
+            return
+        text = self.token_text(token_id)
+        self.state = _feed(self.state, text) if text else None
+
+    def allowed(self, candidates: Iterable[int], limit: int) -> List[int]:
+        """Najwyżej limit dopuszczalnych tokenów spośród kandydatów (w ich kolejności)"""
+        if self.state is None or self.done:
+            return [self.eos_token_id]
+        valid = []
+        for token_id in candidates:
+            if token_id == self.eos_token_id:
+                continue
+            text = self.token_text(token_id)
+            if text and self._fits(_feed(self.state, text)):
+                valid.append(token_id)
+                if len(valid) >= limit:
+                    break
+        return valid
+
+    def _fits(self, state: Optional[tuple]) -> bool:
+        # Po tym tokenie zostaje remaining - 1 tokenów na domknięcie
+        return state is not None and (self.remaining is None or _closing(state) < self.remaining)
+
+
+def tokenizer_token_text(tokenizer) -> Callable[[int], Optional[str]]:
+    """Tekst tokenu transformers ze spacją wiodącą (None dla tokenów specjalnych i fragmentów UTF-8)"""
+    anchor = tokenizer.encode("a", add_special_tokens=False)[-1]
+    anchor_text = tokenizer.decode([anchor], clean_up_tokenization_spaces=False)
+    special = set(tokenizer.all_special_ids)
+    texts: Dict[int, Optional[str]] = {}
+
+    def token_text(token_id: int) -> Optional[str]:
+        if token_id not in texts:
+            # Dekodowanie po tokenie-kotwicy zachowuje spację wiodącą (SentencePiece usuwa ją na początku tekstu)
+            text = tokenizer.decode([anchor, token_id], clean_up_tokenization_spaces=False)
+            ok = token_id not in special and text.startswith(anchor_text) and "\ufffd" not in text
+            texts[token_id] = text[len(anchor_text):] if ok else None
+        return texts[token_id]
+
+    return token_text
+
+
+def llama_token_text(llm) -> Callable[[int], Optional[str]]:
+    """Tekst tokenu llama.cpp (None dla fragmentów znaków wielobajtowych)"""
+    texts: Dict[int, Optional[str]] = {}
+
+    def token_text(token_id: int) -> Optional[str]:
+        if token_id not in texts:
+            try:
+                texts[token_id] = llm.detokenize([token_id]).decode("utf-8")
+            except UnicodeDecodeError:
+                texts[token_id] = None
+        return texts[token_id]
+
+    return token_text
+
+
+class _Processor:
+    """Wspólna część procesorów logitów: śledzenie wygenerowanych tokenów i wybór kandydatów"""
+
+    def __init__(self, constraint: JsonSchemaConstraint, scan: int = 64):
+        self.constraint = constraint
+        self.scan = scan
+        self.consumed: Optional[int] = None
+
+    def _allowed(self, input_ids: List[int], ranked: Callable[[int], List[int]]) -> List[int]:
+        if self.consumed is None:
+            self.consumed = len(input_ids)  # wszystko przed pierwszym wywołaniem to prompt
+        for token_id in input_ids[self.consumed:]:
+            self.constraint.advance(token_id)
+        self.consumed = len(input_ids)
+        # Zwykle pasuje któryś z najbardziej prawdopodobnych tokenów; pełny słownik tylko, gdy żaden
+        allowed = self.constraint.allowed(ranked(self.scan), self.scan)
+        if not allowed:
+            allowed = self.constraint.allowed(ranked(0)[self.scan:], 1)
+        return allowed or [self.constraint.eos_token_id]
+
+
+class JsonLogitsProcessor(_Processor):
+    """Procesor logitów dla model.generate() (transformers, batch 1)"""
+
+    def __call__(self, input_ids, scores):
+        row = scores[0]
+
+        def ranked(count: int) -> List[int]:
+            if count:
+                return row.topk(min(count, row.shape[-1])).indices.tolist()
+            return row.argsort(descending=True).tolist()
+
+        allowed = self._allowed(input_ids[0].tolist(), ranked)
+        masked = scores.new_full(scores.shape, float("-inf"))
+        masked[0, allowed] = row[allowed]
+        return masked
+
+
+class LlamaJsonLogitsProcessor(_Processor):
+    """Procesor logitów dla llama-cpp-python >= 0.2 (logits_processor(input_ids, scores) na tablicach numpy:
+    identyfikatory intc całej sekwencji z promptem, wyniki float32 dla słownika)"""
+
+    def __call__(self, input_ids, scores):
+        import numpy as np
+        scores = np.asarray(scores)
+
+        def ranked(count: int) -> List[int]:
+            if count and count < scores.shape[-1]:
+                top = np.argpartition(-scores, count)[:count]
+                return top[np.argsort(-scores[top])].tolist()
+            return np.argsort(-scores).tolist()
+
+        allowed = self._allowed(np.asarray(input_ids).tolist(), ranked)
+        masked = np.full_like(scores, -np.inf)
+        masked[allowed] = scores[allowed]
+        return masked
@@ -0,0 +1,132 @@
+# llm-orchestrator/token_matcher.py
+import html
+import re
+from functools import lru_cache
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+# Nazwane zestawy wzorców. Każdy zaczyna się od klasy znaków (bez asercji na początku i bez
+# (?i) na pierwszym znaku), dzięki czemu re potrafi szybko przeskakiwać tekst także w połączonej
+# alternatywie; flagi tylko lokalne (?i:...), bo globalnych nie da się łączyć. Zestaw zwraca
+# grupę nazwaną token, jeśli ją ma, inaczej całe dopasowanie.
+PRESETS: Dict[str, str] = {
+    "otp6": r"\d(?<!\d\d)\d{5}(?!\d)",
+    "otp4_8": r"\d(?<!\d\d)\d{3,7}(?!\d)",
+    # 6-10 wielkich liter i cyfr, co najmniej jedna litera i jedna cyfra
+    "alnum_code": r"(?:\d(?=[A-Z0-9]{0,8}[A-Z])|[A-Z](?=[A-Z0-9]{0,8}\d))(?<!\w[A-Z0-9])[A-Z0-9]{5,9}\b",
+    "magic_link": r"https?://[^\s\"'<>]*?(?i:token|verify|verification|confirm|activate|magic|login|auth)[^\s\"'<>]*",
+    # Portale rekrutacyjne obsługiwane przez formularze
+    "linkedin": r"[Ll](?i:inkedin)[\s\S]{0,200}?(?i:code|kod)\D{0,30}(?P<token>\d{6})(?!\d)",
+    "pracuj": r"[Pp](?i:racuj\.pl)[\s\S]{0,200}?(?i:kod)\D{0,30}(?P<token>\d{4,8})(?!\d)",
+    "stepstone": r"[Ss](?i:tepstone)[\s\S]{0,200}?(?i:code|kod)\D{0,30}(?P<token>\d{4,8})(?!\d)",
+    "indeed": r"[Ii](?i:ndeed)[\s\S]{0,200}?(?i:code|kod)\D{0,30}(?P<token>\d{6})(?!\d)",
+}
+DEFAULT_PATTERNS: Tuple[str, ...] = ("otp6",)
+
+_HTML_DROP = re.compile(r"<(script|style|head)\b[^>]*>.*?</\1\s*>", re.IGNORECASE | re.DOTALL)
+_HTML_HREF = re.compile(r"<a\b[^>]*?\bhref\s*=\s*[\"']([^\"']+)[\"'][^>]*>", re.IGNORECASE)
+_HTML_BREAK = re.compile(r"<(?:br|/p|/div|/tr|/li|/h\d)\b[^>]*>", re.IGNORECASE)
+_HTML_TAG = re.compile(r"<[^>]+>")
+_SPACES = re.compile(r"[ \t\r\f\v\xa0]+")
+# Odwołania wstecz (\1, (?P=nazwa)) zmieniają znaczenie po połączeniu wzorców - numery grup się przesuwają
+_BACKREF = re.compile(r"\\[1-9]|\(\?P=")
+
+
+class TokenMatch(NamedTuple):
+    token: str
+    pattern: str
+    start: int
+
+
+@lru_cache(maxsize=256)
+def compile_pattern(pattern: str) -> "re.Pattern[str]":
+    """Skompilowany wzorzec (nazwa zestawu lub regex) z pamięci podręcznej LRU"""
+    return re.compile(PRESETS.get(pattern, pattern))
+
+
+def html_to_text(source: str) -> str:
+    """Tani tekst z HTML: bez skryptów i stylów, adresy linków zachowane, encje zdekodowane"""
+    text = _HTML_DROP.sub(" ", source)
+    text = _HTML_HREF.sub(lambda m: f" {m.group(1)} ", text)
+    text = _HTML_BREAK.sub("\n", text)
+    text = _HTML_TAG.sub(" ", text)
+    return _SPACES.sub(" ", html.unescape(text))
+
+
+def _token(name: str, match: "re.Match[str]") -> str:
+    # Grupa token tylko w zestawach - własny regex zawsze zwraca całe dopasowanie, niezależnie od grup
+    if name in PRESETS and "token" in match.re.groupindex:
+        return match.group("token")
+    return match.group(0)
+
+
+def _combinable(compiled: "re.Pattern[str]") -> bool:
+    """Czy wzorzec może być częścią alternatywy: bez odwołań wstecz i bez flag globalnych ((?i) itp.)"""
+    return not _BACKREF.search(compiled.pattern) and not compiled.flags & ~re.UNICODE
+
+
+class MultiPatternMatcher:
+    """Dopasowuje wiele wzorców jednym przejściem przez tekst.
+
+    Wzorce są łączone w alternatywę (?:...)|(?:...); wygrywa dopasowanie
+    najwcześniej w tekście, a przy tej samej pozycji - wzorzec podany
+    wcześniej. Alternatywy nie są opakowane w grupy nazwane (to spowalnia re
+    o ok. 40%) - który wzorzec trafił, ustalamy już tylko w miejscu trafienia.
+    Wzorce z odwołaniami wstecz lub flagami globalnymi oraz takie, których nie
+    da się połączyć (np. powtórzone nazwy grup), są sprawdzane po kolei -
+    wynik jest zawsze taki sam jak przy osobnym re.search każdego wzorca.
+    """
+
+    def __init__(self, patterns: Sequence[str]):
+        self.patterns = tuple(patterns) or DEFAULT_PATTERNS
+        self._compiled = [compile_pattern(p) for p in self.patterns]
+        self._combined: Optional["re.Pattern[str]"] = None
+        if len(self._compiled) > 1 and all(_combinable(c) for c in self._compiled):
+            # Grupa token zestawów jest potrzebna tylko przy ponownym dopasowaniu pojedynczego wzorca
+            sources = [c.pattern.replace("(?P<token>", "(?:") if name in PRESETS else c.pattern
+                       for name, c in zip(self.patterns, self._compiled)]
+            try:
+                self._combined = re.compile("|".join(f"(?:{source})" for source in sources))
+            except re.error:
+                self._combined = None
+
+    def search(self, text: str) -> Optional[TokenMatch]:
+        if self._combined is not None:
+            hit = self._combined.search(text)
+            if hit is None:
+                return None
+            for name, compiled in zip(self.patterns, self._compiled):
+                match = compiled.match(text, hit.start())
+                if match:
+                    return TokenMatch(_token(name, match), name, match.start())
+        return self._search_each(text)
+
+    def _search_each(self, text: str) -> Optional[TokenMatch]:
+        best = None
+        for name, compiled in zip(self.patterns, self._compiled):
+            match = compiled.search(text)
+            if match and (best is None or match.start() < best.start):
+                best = TokenMatch(_token(name, match), name, match.start())
+        return best
+
+
+@lru_cache(maxsize=128)
+def get_matcher(patterns: Tuple[str, ...]) -> MultiPatternMatcher:
+    return MultiPatternMatcher(patterns)
+
+
+def resolve_patterns(token_regex: Optional[str] = None,
+                     patterns: Union[None, str, Iterable[str]] = None) -> Tuple[str, ...]:
+    """Lista wzorców z parametrów żądania: własny regex i/lub nazwy zestawów"""
+    if isinstance(patterns, str):
+        patterns = [p.strip() for p in patterns.split(",") if p.strip()]
+    resolved: List[str] = list(patterns or [])
+    if token_regex:
+        resolved.insert(0, token_regex)
+    return tuple(resolved) or DEFAULT_PATTERNS
+
+
+def find_token(text: str, token_regex: Optional[str] = None,
+               patterns: Union[None, str, Iterable[str]] = None) -> Optional[str]:
+    """Pierwszy token w tekście według własnego regexu i/lub nazwanych zestawów"""
+    found = get_matcher(resolve_patterns(token_regex, patterns)).search(text)
+    return found.token if found else None
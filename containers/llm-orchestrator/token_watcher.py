@@ -0,0 +1,332 @@
+# llm-orchestrator/token_watcher.py
+import email
+import imaplib
+import itertools
+import os
+import socket
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+from email_utils import message_subject
+from imap_fetch import iter_message_texts
+from imap_pool import IMAPPool, SessionKey, get_imap_pool
+from token_matcher import get_matcher
+
+# W Pythonie 3.9 socket.timeout nie dziedziczy po TimeoutError (od 3.10 to ten sam wyjątek)
+SOCKET_TIMEOUTS = (socket.timeout, TimeoutError)
+
+class WatchedMessage:
+    def __init__(self, seq: int, uid: bytes, subject: str, sender: str, body: str):
+        self.seq = seq
+        self.uid = uid
+        self.subject = subject
+        self.sender = sender
+        self.body = body
+        self.received_at = time.time()
+        self.consumed = False
+
+
+# Dopasowanie tokenu do wiadomości: wiadomość -> token albo None
+TokenMatcher = Callable[[WatchedMessage], Optional[str]]
+
+
+def message_matcher(patterns: Tuple[str, ...], search_subject: Optional[str] = None,
+                    search_from: Optional[str] = None) -> TokenMatcher:
+    """Dopasowanie zgodne z /get-email-token: filtry tematu i nadawcy (jak SEARCH w IMAP) i wzorce tokenu"""
+    matcher = get_matcher(patterns)
+
+    def match(msg: WatchedMessage) -> Optional[str]:
+        if search_subject and search_subject.lower() not in msg.subject.lower():
+            return None
+        if search_from and search_from.lower() not in msg.sender.lower():
+            return None
+        found = matcher.search(msg.body)
+        return found.token if found else None
+
+    return match
+
+
+class MailboxWatcher:
+    """Wątek utrzymujący połączenie IMAP IDLE z jedną skrzynką.
+
+    Serwer sam zgłasza nowe wiadomości (EXISTS); watcher pobiera wtedy
+    temat i początek części tekstowej wiadomości o UID większym niż ostatnio
+    widziany (BODY.PEEK, bez oznaczania jako przeczytane) i budzi oczekujących w wait_for_token().
+    Co `idle_timeout` sekund IDLE jest odnawiane (DONE i ponowne IDLE w tej
+    samej sesji), bo serwery i NAT-y zrywają długo milczące sesje; nowe
+    połączenie z logowaniem powstaje tylko po błędzie.
+    """
+
+    def __init__(self, server: str, user: str, password: str, mailbox: str = "INBOX",
+                 idle_timeout: float = 600.0, timeout: float = 30.0, keep_messages: int = 50):
+        self.server = server
+        self.user = user
+        self.password = password
+        self.mailbox = mailbox
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self.last_used = time.monotonic()
+        self.ready = threading.Event()
+        self._attempted = threading.Event()
+        self.error: Optional[str] = None
+        self._messages: Deque[WatchedMessage] = deque(maxlen=keep_messages)
+        self._seq = itertools.count(1)
+        self._last_seq = 0
+        self._next_uid: Optional[int] = None
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._imap: Optional[imaplib.IMAP4] = None
+        self._tags = itertools.count(1)
+        self._thread = threading.Thread(target=self._run, name=f"imap-idle-{user}", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        imap = self._imap
+        if imap is not None:
+            # Odblokowuje readline() czekające na odpowiedź IDLE
+            try:
+                imap.shutdown()
+            except OSError:
+                pass
+
+    def wait_ready(self, timeout: float) -> bool:
+        """Czeka na pierwszą próbę połączenia; True, gdy watcher nasłuchuje"""
+        self._attempted.wait(timeout)
+        return self.ready.is_set()
+
+    @property
+    def stopped(self) -> bool:
+        return self._stop.is_set()
+
+    @property
+    def last_seq(self) -> int:
+        with self._cond:
+            return self._last_seq
+
+    def wait_for_token(self, after_seq: int, matcher: TokenMatcher, timeout: float) -> Optional[Tuple[str, bytes]]:
+        """Czeka na wiadomość nowszą niż after_seq z pasującym tokenem; zwraca (token, uid)"""
+        self.last_used = time.monotonic()
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                for msg in self._messages:
+                    if msg.seq <= after_seq or msg.consumed:
+                        continue
+                    token = matcher(msg)
+                    if token:
+                        msg.consumed = True
+                        return token, msg.uid
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self._stop.is_set():
+                    return None
+                self._cond.wait(remaining)
+
+    def stats(self) -> Dict:
+        return {
+            "server": self.server,
+            "user": self.user,
+            "mailbox": self.mailbox,
+            "ready": self.ready.is_set(),
+            "error": self.error,
+            "messages_seen": self.last_seq,
+            "idle_for": round(time.monotonic() - self.last_used, 1),
+        }
+
+    def _run(self) -> None:
+        retry_delay = 1.0
+        while not self._stop.is_set():
+            try:
+                self._imap = self._connect()
+                retry_delay = 1.0
+                self.error = None
+                self.ready.set()
+                self._attempted.set()
+                while not self._stop.is_set():
+                    self._fetch_new()
+                    self._idle()
+            except (imaplib.IMAP4.error, OSError) as e:
+                if self._stop.is_set():
+                    break
+                # Przekroczenie czasu (brak odpowiedzi serwera) kończy się tylko ponownym połączeniem
+                if not isinstance(e, SOCKET_TIMEOUTS):
+                    self.error = str(e)
+                    print(f"IMAP IDLE {self.user}/{self.mailbox}: {e}")
+                if not self.ready.is_set() and not isinstance(e, (imaplib.IMAP4.abort, OSError)):
+                    # Odrzucone logowanie lub SELECT - ponawianie nic nie da
+                    self._stop.set()
+            finally:
+                self._attempted.set()
+                imap, self._imap = self._imap, None
+                if imap is not None:
+                    try:
+                        imap.shutdown()
+                    except OSError:
+                        pass
+            if self.error:
+                self._stop.wait(retry_delay)
+                retry_delay = min(retry_delay * 2, 60.0)
+        with self._cond:
+            self._cond.notify_all()
+
+    def _connect(self) -> imaplib.IMAP4:
+        imap = imaplib.IMAP4_SSL(self.server, timeout=self.timeout)
+        imap.login(self.user, self.password)
+        status, data = imap.select(self.mailbox, readonly=True)
+        if status != "OK":
+            raise imaplib.IMAP4.error(f"SELECT {self.mailbox} failed: {data}")
+        if self._next_uid is None:
+            # Punkt odniesienia: interesują nas tylko wiadomości, które przyjdą od teraz
+            _, uidnext = imap.response("UIDNEXT")
+            if uidnext and uidnext[0]:
+                self._next_uid = int(uidnext[0])
+            else:
+                _, data = imap.uid("SEARCH", None, "ALL")
+                uids = [int(u) for u in data[0].split()] if data and data[0] else []
+                self._next_uid = max(uids, default=0) + 1
+        return imap
+
+    def _fetch_new(self) -> None:
+        imap = self._imap
+        status, data = imap.uid("SEARCH", None, f"UID {self._next_uid}:*")
+        if status != "OK" or not data or not data[0]:
+            return
+        # "n:*" zwraca też ostatnią wiadomość, gdy nie ma nowszych niż n
+        uids = sorted(int(u) for u in data[0].split() if int(u) >= self._next_uid)
+        max_bytes = int(os.getenv("TOKEN_FETCH_BYTES", "16384"))
+        for uid, body in iter_message_texts(imap, [str(u).encode() for u in uids], max_bytes=max_bytes):
+            subject, sender = self._fetch_headers(uid)
+            with self._cond:
+                seq = next(self._seq)
+                self._messages.append(WatchedMessage(seq, uid, subject, sender, body))
+                self._last_seq = seq
+                self._cond.notify_all()
+        if uids:
+            self._next_uid = uids[-1] + 1
+
+    def _fetch_headers(self, uid: bytes) -> Tuple[str, str]:
+        """(temat, nadawca) wiadomości"""
+        status, data = self._imap.uid("FETCH", uid.decode(), "(BODY.PEEK[HEADER.FIELDS (SUBJECT FROM)])")
+        if status != "OK" or not data or not isinstance(data[0], tuple):
+            return "", ""
+        headers = email.message_from_bytes(data[0][1])
+        return message_subject(headers), headers.get("From", "")
+
+    def _idle(self) -> None:
+        """Jedna runda IDLE (RFC 2177) - kończy się, gdy serwer zgłosi nowe wiadomości albo po idle_timeout.
+
+        Po idle_timeout zegar wysyła DONE, a serwer kończy IDLE zwykłą odpowiedzią,
+        więc gniazdo nadaje się do dalszej pracy. Brak odpowiedzi przez
+        idle_timeout + timeout oznacza zerwane połączenie (socket.timeout).
+        """
+        imap = self._imap
+        tag = f"W{next(self._tags)}".encode()
+        imap.send(tag + b" IDLE\r\n")
+        line = imap.readline()
+        if not line.startswith(b"+"):
+            raise imaplib.IMAP4.error(f"IDLE not supported: {line!r}")
+        sent = threading.Lock()
+
+        def done() -> None:
+            # DONE tylko raz - wysyła go zegar albo wątek watchera po EXISTS
+            if sent.acquire(blocking=False):
+                try:
+                    imap.send(b"DONE\r\n")
+                except OSError:
+                    pass  # gniazdo zamknięte przez stop() - readline() zgłosi koniec połączenia
+
+        timer = threading.Timer(self.idle_timeout, done)
+        timer.daemon = True
+        imap.sock.settimeout(self.idle_timeout + self.timeout)
+        timer.start()
+        try:
+            while True:
+                line = self._readline(imap)
+                if line.startswith(tag):
+                    return  # odnowienie po idle_timeout
+                if line.startswith(b"*") and line.rstrip().upper().endswith(b"EXISTS"):
+                    break
+            done()
+            while not self._readline(imap).startswith(tag):
+                pass
+        finally:
+            timer.cancel()
+            imap.sock.settimeout(self.timeout)
+
+    @staticmethod
+    def _readline(imap: imaplib.IMAP4) -> bytes:
+        line = imap.readline()
+        if not line:
+            raise imaplib.IMAP4.abort("IMAP connection closed")
+        return line
+
+
+class TokenWatcherRegistry:
+    """Rejestr watcherów IDLE, jeden na (serwer, użytkownik, skrzynka).
+
+    Watcher nieużywany dłużej niż `ttl` sekund jest zatrzymywany.
+    """
+
+    def __init__(self, max_watchers: int = 50, ttl: float = 1800.0, idle_timeout: float = 600.0,
+                 pool: Optional[IMAPPool] = None):
+        self.max_watchers = max_watchers
+        self.ttl = ttl
+        self.idle_timeout = idle_timeout
+        self.pool = pool
+        self._watchers: Dict[SessionKey, MailboxWatcher] = {}
+        self._lock = threading.Lock()
+
+    def watch(self, server: str, user: str, password: str, mailbox: str = "INBOX") -> MailboxWatcher:
+        """Zwraca działający watcher skrzynki, uruchamiając go w razie potrzeby"""
+        key = IMAPPool.make_key(server, user, password, mailbox)
+        self._expire()
+        with self._lock:
+            watcher = self._watchers.get(key)
+            if watcher is None or watcher.stopped:
+                self._watchers.pop(key, None)
+                if len(self._watchers) >= self.max_watchers:
+                    raise RuntimeError(f"Osiągnięto limit {self.max_watchers} obserwowanych skrzynek")
+                watcher = MailboxWatcher(server, user, password, mailbox, idle_timeout=self.idle_timeout)
+                self._watchers[key] = watcher
+                watcher.start()
+        watcher.last_used = time.monotonic()
+        return watcher
+
+    def unwatch(self, server: str, user: str, password: str, mailbox: str = "INBOX") -> bool:
+        key = IMAPPool.make_key(server, user, password, mailbox)
+        with self._lock:
+            watcher = self._watchers.pop(key, None)
+        if watcher is None:
+            return False
+        watcher.stop()
+        return True
+
+    def mark_seen(self, watcher: MailboxWatcher, uid: bytes) -> None:
+        """Oznacza wiadomość jako przeczytaną - tak jak jednorazowe /get-email-token"""
+        pool = self.pool or get_imap_pool()
+        pool.run(watcher.server, watcher.user, watcher.password, watcher.mailbox,
+                 lambda imap: imap.uid("STORE", uid, "+FLAGS", "(\\Seen)"))
+
+    def stats(self) -> List[Dict]:
+        with self._lock:
+            return [w.stats() for w in self._watchers.values()]
+
+    def _expire(self) -> None:
+        now = time.monotonic()
+        with self._lock:
+            expired = [k for k, w in self._watchers.items() if now - w.last_used > self.ttl]
+            stopped = [self._watchers.pop(k) for k in expired]
+        for watcher in stopped:
+            watcher.stop()
+
+
+def registry_from_env() -> TokenWatcherRegistry:
+    return TokenWatcherRegistry(
+        max_watchers=int(os.getenv("TOKEN_WATCH_MAX", "50")),
+        ttl=float(os.getenv("TOKEN_WATCH_TTL", "1800")),
+        idle_timeout=float(os.getenv("IMAP_IDLE_TIMEOUT", "600"))
+    )
@@ -14,7 +14,7 @@ def fill_form_with_autofiller(form_url, cv_path, upload_files):
     """Wywołuje API coBoarding do wypełnienia formularza z uploadem plików"""
     try:
         response = requests.post(
-            "http://llm-orchestrator:5000/fill-form",
+            "http://llm-orchestrator:5000/fill-form?wait=true",
             json={
                 "form_url": form_url,
                 "cv_path": cv_path,
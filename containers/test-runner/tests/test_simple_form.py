@@ -15,7 +15,7 @@ def fill_form_with_coboarder(form_url, cv_path):
     """Wywołuje API coBoarding do wypełnienia formularza"""
     try:
         response = requests.post(
-            "http://llm-orchestrator:5000/fill-form",
+            "http://llm-orchestrator:5000/fill-form?wait=true",
             json={
                 "form_url": form_url,
                 "cv_path": cv_path
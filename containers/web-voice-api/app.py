@@ -5,7 +5,7 @@ import json
 import uuid
 import time
 import logging
-import requests
+from http_client import ServiceClient
 import speech_recognition as sr
 from pydub import AudioSegment
 import io
@@ -28,6 +28,9 @@ os.makedirs(AUDIO_DIR, exist_ok=True)
 # Adres API LLM Orchestrator
 LLM_API_URL = "http://llm-orchestrator:5000"
 
+# Współdzielony klient HTTP (pula keep-alive, ponowienia, bezpiecznik)
+llm_client = ServiceClient(LLM_API_URL, name="llm-orchestrator", pool_size=10, timeout=10)
+
 # Podstawowe komendy głosowe i ich mapowanie na akcje
 VOICE_COMMANDS = {
     "wypełnij formularz": "fill_form",
@@ -125,8 +128,8 @@ def process_audio():
         execution_result = None
         if command_detected and command_action:
             try:
-                response = requests.post(
-                    f"{LLM_API_URL}/execute_command",
+                response = llm_client.post(
+                    "/execute_command",
                     json={
                         "action": command_action,
                         "params": command_params
@@ -215,8 +218,8 @@ def execute_command():
 
         # Przekazanie komendy do API LLM
         try:
-            response = requests.post(
-                f"{LLM_API_URL}/execute_command",
+            response = llm_client.post(
+                "/execute_command",
                 json={
                     "action": command,
                     "params": params
@@ -7,11 +7,11 @@ def test_fill_simple_form():
         "form_url": "http://localhost:8090/forms/simple-form.html",
         "cv_path": "/volumes/cv/example_cv.html"
     }
-    r = requests.post("http://localhost:5000/fill-form", json=payload, timeout=30)
+    r = requests.post("http://localhost:5000/fill-form?wait=true", json=payload, timeout=120)
     assert r.status_code == 200
     data = r.json()
     assert data.get("status") == "success"
-    assert "filled_form_url" in data
+    assert "details" in data
 
 @pytest.mark.parametrize("form_url", [
     "http://localhost:8090/forms/complex-form.html",
@@ -22,8 +22,8 @@ def test_fill_other_forms(form_url):
         "form_url": form_url,
         "cv_path": "/volumes/cv/example_cv.html"
     }
-    r = requests.post("http://localhost:5000/fill-form", json=payload, timeout=60)
+    r = requests.post("http://localhost:5000/fill-form?wait=true", json=payload, timeout=120)
     assert r.status_code == 200
     data = r.json()
     assert data.get("status") == "success"
-    assert "filled_form_url" in data
+    assert "details" in data
@@ -16,8 +16,8 @@ def test_file_upload_form():
             "cover_letter": letter_path
         }
     }
-    r = requests.post("http://localhost:5000/fill-form", json=payload, timeout=60)
+    r = requests.post("http://localhost:5000/fill-form?wait=true", json=payload, timeout=120)
     assert r.status_code == 200
     data = r.json()
     assert data.get("status") == "success"
-    assert "filled_form_url" in data
+    assert "details" in data
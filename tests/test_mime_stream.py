@@ -0,0 +1,33 @@
+import os
+import re
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "containers", "llm-orchestrator"))
+
+from mime_stream import EncodedAttachmentCache, StreamingMessage  # noqa: E402
+
+BARE_LF = re.compile(rb"(?<!\r)\n")
+
+
+def test_long_subject_has_no_bare_lf(tmp_path):
+    attachment = tmp_path / "cv.pdf"
+    attachment.write_bytes(os.urandom(5000))
+    subject = "Podsumowanie zgłoszenia: https://example.com/" + "oferta/" * 40 + "?utm_source=newsletter"
+    msg = StreamingMessage("from@example.com", "to@example.com", subject, "Status: 200\nSzczegóły: ok",
+                           [str(attachment)], cache=EncodedAttachmentCache(str(tmp_path / "cache")))
+    data = b"".join(msg.iter_chunks())
+    assert b"Subject: =?utf-8?" in data
+    assert BARE_LF.search(data) is None
+    header = data.split(b"\r\n\r\n", 1)[0]
+    assert all(len(line) <= 998 for line in header.split(b"\r\n"))
+
+
+def test_digest_cache_is_bounded(tmp_path):
+    cache = EncodedAttachmentCache(str(tmp_path / "cache"), max_digests=2)
+    for i in range(4):
+        path = tmp_path / f"cv{i}.pdf"
+        path.write_bytes(b"cv %d" % i)
+        b"".join(cache.iter_encoded(str(path)))
+    b"".join(cache.iter_encoded(str(tmp_path / "cv3.pdf")))
+    assert len(cache._digests) == 2
+    assert cache.stats == {"hits": 1, "misses": 4}
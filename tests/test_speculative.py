@@ -0,0 +1,58 @@
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+torch = pytest.importorskip("torch")
+transformers = pytest.importorskip("transformers")
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "containers", "llm-orchestrator"))
+
+from speculative import SpeculativeStats, speculative_tokens  # noqa: E402
+
+VOCAB = 64
+PROMPT = [5, 17, 3, 42, 8, 11]
+
+
+def tiny_gpt2(seed, n_layer):
+    """Losowy mały GPT-2 (float64, by różnice zaokrągleń nie zmieniały argmax)"""
+    torch.manual_seed(seed)
+    config = transformers.GPT2Config(vocab_size=VOCAB, n_positions=128, n_embd=32, n_layer=n_layer, n_head=2,
+                                     bos_token_id=0, eos_token_id=VOCAB + 1)
+    return transformers.GPT2LMHeadModel(config).double().eval()
+
+
+def generate(model, prompt, max_new_tokens):
+    with torch.no_grad():
+        output = model.generate(torch.tensor([prompt]), attention_mask=torch.ones(1, len(prompt), dtype=torch.long),
+                                max_new_tokens=max_new_tokens, do_sample=False, pad_token_id=0)
+    return output[0, len(prompt):].tolist()
+
+
+@pytest.mark.parametrize("num_draft_tokens", [1, 3, 5])
+def test_greedy_matches_generate(num_draft_tokens):
+    target, draft = tiny_gpt2(0, 2), tiny_gpt2(1, 1)
+    stats = SpeculativeStats("target", "draft")
+    tokens = [token for chunk in speculative_tokens(target, draft, PROMPT, 24, num_draft_tokens=num_draft_tokens,
+                                                    stats=stats)
+              for token in chunk]
+    assert tokens == generate(target, PROMPT, 24)
+    assert stats.snapshot()["tokens_per_pass"] >= 1
+
+
+def test_same_model_as_draft_accepts_everything():
+    target = tiny_gpt2(0, 2)
+    stats = SpeculativeStats("target", "target")
+    tokens = [token for chunk in speculative_tokens(target, target, PROMPT, 20, num_draft_tokens=4, stats=stats)
+              for token in chunk]
+    assert tokens == generate(target, PROMPT, 20)
+    assert stats.snapshot()["acceptance_rate"] == 1.0
+
+
+def test_non_tuple_cache_is_rejected():
+    def model(input_ids, past_key_values=None, use_cache=True):
+        return SimpleNamespace(logits=torch.zeros(1, input_ids.shape[1], VOCAB), past_key_values=object())
+
+    with pytest.raises(TypeError, match="krotek"):
+        next(speculative_tokens(model, model, PROMPT, 4))
@@ -0,0 +1,174 @@
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "containers", "llm-orchestrator"))
+
+from pipeline_generator import PIPELINE_SCHEMA  # noqa: E402
+from structured_output import JsonSchemaConstraint, LlamaJsonLogitsProcessor  # noqa: E402
+
+# Słownik testowy: pojedyncze znaki ASCII i kilka tokenów wieloznakowych jak w prawdziwych tokenizerach
+VOCAB = [chr(c) for c in range(32, 127)] + ["ą", "ł", '{"', '":"', '","', '"}', ' "', "name", "steps", "type",
+                                           "action", "navigation", "https://", "aaaa", "\\u00"]
+EOS = len(VOCAB)
+
+SCALARS = {
+    "type": "object",
+    "properties": {
+        "n": {"type": "number"},
+        "i": {"type": "integer"},
+        "b": {"type": "boolean"},
+        "z": {"type": "null"},
+    },
+    "required": ["n", "i", "b", "z"],
+}
+
+
+def token_text(token_id):
+    return VOCAB[token_id] if token_id < len(VOCAB) else None
+
+
+def feed(schema, text):
+    """Ograniczenie po wczytaniu tekstu znak po znaku"""
+    chars = list(text)
+    constraint = JsonSchemaConstraint(schema, chars.__getitem__, -1)
+    for index in range(len(chars)):
+        constraint.advance(index)
+    return constraint
+
+
+def generate(schema, rank, max_tokens=None):
+    """Dekodowanie zachłanne: rank(tekst) zwraca tokeny od najbardziej prawdopodobnego"""
+    constraint = JsonSchemaConstraint(schema, token_text, EOS, max_tokens)
+    text, used = "", 0
+    while max_tokens is None or used < max_tokens:
+        allowed = constraint.allowed(rank(text), 1)
+        token = allowed[0] if allowed else EOS
+        used += 1
+        if token == EOS:
+            break
+        constraint.advance(token)
+        text += VOCAB[token]
+    return text, used
+
+
+def validate(schema, value):
+    """Sprawdza wartość względem podzbioru JSON Schema obsługiwanego przez structured_output"""
+    if "enum" in schema:
+        assert value in schema["enum"]
+        return
+    kind = schema["type"]
+    if kind == "object":
+        assert isinstance(value, dict)
+        assert set(schema["required"]) <= set(value) <= set(schema["properties"])
+        for name, item in value.items():
+            validate(schema["properties"][name], item)
+    elif kind == "array":
+        assert schema.get("minItems", 0) <= len(value) <= schema.get("maxItems", 64)
+        for item in value:
+            validate(schema["items"], item)
+    elif kind == "string":
+        assert isinstance(value, str) and len(value) <= schema.get("maxLength", len(value))
+
+
+def pipeline(**fields):
+    return dict({"name": "Pipeline pracuj.pl", "steps": [{"type": "navigation", "action": "open"}]}, **fields)
+
+
+@pytest.mark.parametrize("document", [
+    pipeline(),
+    pipeline(steps=[{"type": "navigation", "action": "open", "url": "https://www.pracuj.pl/praca?q=python"},
+                    {"type": "form_filling", "action": "fill", "selector": "#email", "value": "jan@example.com"},
+                    {"type": "upload", "action": "cv", "selector": "input[type=file]"},
+                    {"type": "submit", "action": "send"}]),
+    pipeline(name="Zgłoszenie \"A\" \\ kopia\nłódź\t/"),
+    pipeline(name="Zgłoszenie – łódź ✓"),
+])
+@pytest.mark.parametrize("ensure_ascii", [False, True])
+def test_accepts_valid_pipelines(document, ensure_ascii):
+    text = json.dumps(document, separators=(",", ":"), ensure_ascii=ensure_ascii)
+    assert feed(PIPELINE_SCHEMA, text).done
+
+
+def test_accepts_unicode_escape():
+    assert feed({"type": "object", "properties": {"a": {"type": "string"}}, "required": ["a"]},
+                '{"a":"\\u0041\\uD83D\\ude00"}').done
+
+
+@pytest.mark.parametrize("text", [
+    '{"n":-1.5,"i":42,"b":true,"z":null}',
+    '{"n":0,"i":-7,"b":false,"z":null}',
+])
+def test_accepts_scalars(text):
+    assert feed(SCALARS, text).done
+
+
+@pytest.mark.parametrize("text", [
+    '{"name":"x"}',
+    '{"name":"x","steps":[]}',
+    '{"name":"x","steps":[{"type":"jump","action":"a"}]}',
+    '{"steps":[{"type":"wait","action":"a"}],"name":"x"}',
+    '{"name":"x","steps":[{"type":"wait","action":"a","extra":"b"}]}',
+    '{"name":"x","steps":[{"action":"a","type":"wait"}]}',
+    '{"name":1,"steps":[{"type":"wait","action":"a"}]}',
+    '{"name":"' + "x" * 81 + '","steps":[{"type":"wait","action":"a"}]}',
+    '{"name":"x","steps":[' + ",".join(['{"type":"wait","action":"a"}'] * 11) + "]}",
+    '{"name":"\\x","steps":[{"type":"wait","action":"a"}]}',
+    '{"name":"\\u00G1","steps":[{"type":"wait","action":"a"}]}',
+    '{"name":"a\nb","steps":[{"type":"wait","action":"a"}]}',
+    '{"name":"x","steps":[{"type":"wait","action":"a"}]',
+    '{"name":"x","steps":[{"type":"wait","action":"a"}]}}',
+])
+def test_rejects_invalid_pipelines(text):
+    assert not feed(PIPELINE_SCHEMA, text).done
+
+
+@pytest.mark.parametrize("text", [
+    '{"n":1.,"i":1,"b":true,"z":null}',
+    '{"n":1,"i":1.5,"b":true,"z":null}',
+    '{"n":01,"i":1,"b":true,"z":null}',
+    '{"n":1,"i":1,"b":yes,"z":null}',
+    '{"n":1,"i":1,"b":true,"z":nul}',
+])
+def test_rejects_invalid_scalars(text):
+    assert not feed(SCALARS, text).done
+
+
+def test_pipeline_round_trip():
+    document = pipeline(name="Pipeline dla łódź.pracuj.pl",
+                        steps=[{"type": "navigation", "action": "open", "url": "https://www.pracuj.pl/"},
+                               {"type": "click", "action": "apply", "selector": "button.apply"}])
+    target = json.dumps(document, separators=(",", ":"), ensure_ascii=True)
+
+    def rank(text):
+        # Model "chce" napisać target: najpierw najdłuższy token pasujący do dalszej części
+        rest = target[len(text):]
+        return sorted(range(len(VOCAB)), key=lambda t: (not rest.startswith(VOCAB[t]), -len(VOCAB[t])))
+
+    text, _ = generate(PIPELINE_SCHEMA, rank)
+    assert text == target
+    assert json.loads(text) == document
+
+
+@pytest.mark.parametrize("max_tokens", [60, 120, 300, 512])
+def test_document_is_closed_within_token_budget(max_tokens):
+    # Model, który zawsze woli pisać dalej (długie napisy, kolejne kroki) zamiast domykać dokument
+    preferred = [VOCAB.index(t) for t in ("aaaa", "a", '","', ",", '":"', '{"', "type", "action")]
+    ranking = preferred + [t for t in range(len(VOCAB)) if t not in preferred]
+    text, used = generate(PIPELINE_SCHEMA, lambda _: ranking, max_tokens)
+    assert used <= max_tokens
+    validate(PIPELINE_SCHEMA, json.loads(text))
+
+
+def test_llama_processor_masks_scores():
+    np = pytest.importorskip("numpy")
+    constraint = JsonSchemaConstraint(SCALARS, token_text, EOS, 32)
+    processor = LlamaJsonLogitsProcessor(constraint)
+    prompt = np.array([1, 2, 3], dtype=np.intc)
+    scores = np.zeros(len(VOCAB) + 1, dtype=np.single)
+    scores[VOCAB.index("a")] = 5.0
+    masked = processor(prompt, scores)
+    assert masked.dtype == np.single
+    assert int(np.argmax(masked)) in (VOCAB.index("{"), VOCAB.index('{"'))
@@ -0,0 +1,85 @@
+import os
+import re
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "containers", "llm-orchestrator"))
+
+from token_matcher import DEFAULT_PATTERNS, PRESETS, MultiPatternMatcher, find_token, get_matcher  # noqa: E402
+
+MESSAGES = [
+    "Twój kod weryfikacyjny: 482913",
+    "Your code is 1234, valid for 10 minutes",
+    "Numer zamówienia 1234567890, kod 55123",
+    "LinkedIn: your verification code is 739201. Do not share it.",
+    "Witaj! Pracuj.pl przesyła kod: 8841 do logowania",
+    "StepStone security code - 20481234",
+    "Indeed code 665544 (order 123456)",
+    "Activate: https://example.com/account/verify?token=AbC123 thanks",
+    "Kod aktywacyjny: X7K9P2QZ",
+    "pin 777777",
+    "tel. 600 700 800, kod 123456",
+    "brak tokenu w tej wiadomości",
+    "",
+]
+
+PRESET_SETS = [
+    DEFAULT_PATTERNS,
+    tuple(PRESETS),
+    ("linkedin", "pracuj", "stepstone", "indeed", "otp6"),
+    ("magic_link", "alnum_code", "otp4_8"),
+]
+
+USER_SETS = [
+    (r"(\d)\1{5}",),
+    ("linkedin", r"(\d)\1{5}"),
+    (r"kod\D*(\d+)", "otp6"),
+    (r"(?P<num>\d{4})", "magic_link"),
+    ("(?i)KOD", "otp6"),
+    (r"(?P<d>\d)(?P=d)", "otp4_8"),
+    (r"(a)|(\d{6})", "linkedin"),
+]
+
+
+def reference(text, patterns):
+    """Osobny re.search każdego wzorca: najwcześniejsze dopasowanie, przy remisie wzorzec podany wcześniej"""
+    best = None
+    for name in patterns:
+        match = re.search(PRESETS.get(name, name), text)
+        if match and (best is None or match.start() < best[1]):
+            token = match.group("token") if name in PRESETS and "token" in match.re.groupindex else match.group(0)
+            best = (token, match.start())
+    return best[0] if best else None
+
+
+@pytest.mark.parametrize("patterns", PRESET_SETS + USER_SETS)
+def test_matches_separate_searches(patterns):
+    for text in MESSAGES:
+        assert find_token(text, patterns=patterns) == reference(text, patterns), text
+
+
+def test_presets_are_combined():
+    assert get_matcher(("linkedin", "pracuj", "otp6"))._combined is not None
+
+
+def test_user_regex_returns_whole_match():
+    assert find_token("pin 777777", token_regex=r"pin (\d+)") == "pin 777777"
+    assert find_token("pin 777777", token_regex=r"(\d)\1{5}") == "777777"
+
+
+def test_backreferences_and_global_flags_are_not_combined():
+    assert find_token("pin 777777", patterns=["linkedin", r"(\d)\1{5}"]) == "777777"
+    assert get_matcher(("linkedin", r"(\d)\1{5}"))._combined is None
+    assert get_matcher(("(?i)kod", "otp6"))._combined is None
+    assert find_token("KOD", patterns=["otp6", "(?i)kod"]) == "KOD"
+
+
+def test_presets_return_token_group():
+    assert find_token("LinkedIn: your code is 739201", patterns=["linkedin"]) == "739201"
+
+
+def test_falls_back_when_combined_hit_is_not_rematched():
+    matcher = MultiPatternMatcher(("linkedin", "otp6"))
+    matcher._combined = re.compile(r"\s")  # trafienie, którego żaden wzorzec nie dopasuje w tym miejscu
+    assert matcher.search("kod 482913").token == "482913"
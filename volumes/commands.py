@@ -93,8 +93,8 @@ def fill_form(url, cv_path=None):
         console.print(f"[bold red]Błąd podczas wypełniania formularza:[/bold red] {str(e)}")
 
 
-def batch_fill(file_path):
-    """Wypełnia formularze z pliku z listą URL"""
+def batch_fill(file_path, cv_path=None, parallelism=None):
+    """Wypełnia formularze z pliku z listą URL przez /fill-form/batch orchestratora"""
     try:
         if not os.path.exists(file_path):
             console.print(f"[bold red]Plik {file_path} nie istnieje[/bold red]")
@@ -105,12 +105,39 @@ def batch_fill(file_path):
 
         console.print(f"[bold green]Znaleziono {len(urls)} URL do wypełnienia[/bold green]")
 
-        for i, url in enumerate(urls):
-            console.print(f"[bold blue]Formularz {i + 1}/{len(urls)}[/bold blue]")
-            fill_form(url)
-            time.sleep(3)  # Pauza między formularzami
+        if cv_path is None:
+            cv_files = os.listdir("/volumes/cv")
+            if not cv_files:
+                console.print("[bold red]Nie znaleziono plików CV w katalogu /volumes/cv[/bold red]")
+                return
+            cv_path = f"/volumes/cv/{cv_files[0]}"
 
-        console.print("[bold green]Wszystkie formularze zostały wypełnione![/bold green]")
+        payload = {"items": urls, "cv_path": cv_path}
+        if parallelism:
+            payload["parallelism"] = parallelism
+
+        # Orchestrator wypełnia formularze równolegle (z limitem per domena)
+        # i odsyła wynik każdej pozycji jako osobną linię NDJSON
+        api_url = os.environ.get("LLM_API_URL", "http://llm-orchestrator:5000")
+        with requests.post(f"{api_url}/fill-form/batch", json=payload, stream=True, timeout=(10, None)) as response:
+            if response.status_code != 200:
+                console.print(f"[bold red]Błąd API:[/bold red] {response.text}")
+                return
+            done = 0
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                result = json.loads(line)
+                if result.get("done"):
+                    console.print(f"[bold green]Zakończono:[/bold green] {result['succeeded']} udanych, "
+                                  f"{result['failed']} nieudanych z {result['total']}")
+                    continue
+                done += 1
+                style = "green" if result["status"] == "success" else "red"
+                console.print(f"[bold blue]Formularz {done}/{len(urls)}[/bold blue] "
+                              f"[{style}]{result['status']}[/{style}] {result['form_url']}")
+                if result["status"] != "success" and result.get("message"):
+                    console.print(f"    [red]{result['message']}[/red]")
     except Exception as e:
         console.print(f"[bold red]Błąd podczas przetwarzania wsadowego:[/bold red] {str(e)}")
 
@@ -134,6 +161,8 @@ def main():
     # Komenda batch
     batch_parser = subparsers.add_parser("batch", help="Wypełnia formularze z pliku z listą URL")
     batch_parser.add_argument("file", help="Ścieżka do pliku z listą URL")
+    batch_parser.add_argument("--cv", help="Ścieżka do pliku CV (opcjonalnie)")
+    batch_parser.add_argument("--parallel", type=int, help="Liczba formularzy wypełnianych równolegle")
 
     args = parser.parse_args()
 
@@ -144,7 +173,7 @@ def main():
     elif args.command == "fill":
         fill_form(args.url, args.cv)
     elif args.command == "batch":
-        batch_fill(args.file)
+        batch_fill(args.file, args.cv, args.parallel)
     else:
         parser.print_help()
 